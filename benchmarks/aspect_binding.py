@@ -0,0 +1,108 @@
+"""
+Copyright 2017 Deepgram
+
+Microbenchmark for the per-call overhead of ``@aspect`` injection.
+
+Compares the current (precompiled) binding against the previous
+implementation, which resolved the aspect stack and inspected signatures on
+every call. Run it from the repository root:
+
+	python benchmarks/aspect_binding.py
+"""
+
+import os
+import sys
+import timeit
+from functools import wraps
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from quack.aspects import base
+from quack.aspects.base import aspect, has_self
+# pylint: enable=wrong-import-position
+
+###############################################################################
+def legacy_aspect(name):
+	""" The ``aspect`` decorator as it was before bindings were precompiled.
+	"""
+	def decorator(func):
+		""" Injects an aspect.
+		"""
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			""" Apply the aspect.
+			"""
+			try:
+				aspect_func = base._aspects[name][-1]	# pylint: disable=protected-access
+			except IndexError as error:
+				raise ValueError('No such aspect defined: {}'.format(
+					name)) from error
+			if has_self(aspect_func):
+				if not has_self(func):
+					raise ValueError('Aspect requires "self": {}'.format(name))
+				value = aspect_func(args[0])
+			else:
+				value = aspect_func()
+			kwargs[name] = value
+			return func(*args, **kwargs)
+		return wrapper
+	return decorator
+
+###############################################################################
+aspect.constant('bench_constant', 42)
+
+@aspect.dynamic()
+def bench_dynamic(self):					# pylint: disable=unused-argument
+	""" A trivial aspect that takes ``self``.
+	"""
+	return 42
+
+###############################################################################
+class Target:
+	""" Holds the functions being measured.
+	"""
+	# pylint: disable=no-self-use,unused-argument
+
+	def baseline(self, bench_constant=None, bench_dynamic=None):
+		""" No aspects at all, for reference.
+		"""
+		return bench_constant
+
+	@legacy_aspect('bench_constant')
+	@legacy_aspect('bench_dynamic')
+	def legacy(self, bench_constant=None, bench_dynamic=None):
+		""" Two aspects, resolved the old way.
+		"""
+		return bench_constant
+
+	@aspect('bench_constant')
+	@aspect('bench_dynamic')
+	def compiled(self, bench_constant=None, bench_dynamic=None):
+		""" Two aspects, resolved through compiled bindings.
+		"""
+		return bench_constant
+
+###############################################################################
+def main():
+	""" Runs the benchmark.
+	"""
+	target = Target()
+	number = 200000
+	results = {}
+	for label in ('baseline', 'legacy', 'compiled'):
+		func = getattr(target, label)
+		best = min(timeit.repeat(func, number=number, repeat=5))
+		results[label] = best / number * 1e9
+		print('{:>10}: {:8.1f} ns/call'.format(label, results[label]))
+
+	overhead_before = results['legacy'] - results['baseline']
+	overhead_after = results['compiled'] - results['baseline']
+	print('Aspect overhead: {:.1f} ns -> {:.1f} ns ({:.1f}x faster)'.format(
+		overhead_before, overhead_after, overhead_before / overhead_after))
+
+###############################################################################
+if __name__ == '__main__':
+	main()
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,90 @@
+"""
+Copyright 2017 Deepgram
+
+Benchmark for route matching with a large number of routes.
+
+Registers 1000 routes and measures how long it takes to find the handler for
+a request, using Tornado's regex routing (a linear scan over ``get_routes()``)
+and using the compiled ``RouteDispatcher`` (``get_dispatcher()``). Run it
+from the repository root:
+
+	python benchmarks/dispatch.py
+"""
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+import tornado.web
+from tornado.httputil import HTTPServerRequest
+from tornado.routing import Rule, AnyMatches
+
+from quack.routes import route, get_routes, get_dispatcher, Handler
+# pylint: enable=wrong-import-position
+
+NUM_ROUTES = 1000
+
+###############################################################################
+def register_routes():
+	""" Registers the routes, and returns a list of paths which hit them.
+	"""
+	paths = []
+	for index in range(NUM_ROUTES):
+		kind = index % 4
+		if kind == 0:
+			template = '/service{}/status'.format(index)
+			path = template
+		elif kind == 1:
+			template = '/service{}/items/<item:int>'.format(index)
+			path = '/service{}/items/1234'.format(index)
+		elif kind == 2:
+			template = '/service{}/users/<user:str>/profile'.format(index)
+			path = '/service{}/users/alice/profile'.format(index)
+		else:
+			template = '/service{}/files/<path:str>'.format(index)
+			path = '/service{}/files/a/b/c.wav'.format(index)
+		route(template)(type('Handler{}'.format(index), (Handler, ), {}))
+		paths.append(path)
+	return paths
+
+###############################################################################
+def main():
+	""" Runs the benchmark.
+	"""
+	paths = register_routes()
+	random.seed(0)
+	requests = [
+		HTTPServerRequest(method='GET', uri=random.choice(paths))
+		for _ in range(2000)
+	]
+
+	regex_app = tornado.web.Application(get_routes())
+
+	dispatcher = get_dispatcher()
+	trie_app = tornado.web.Application([Rule(AnyMatches(), dispatcher)])
+	dispatcher.application = trie_app
+
+	for label, app in (('regex', regex_app), ('dispatcher', trie_app)):
+		router = app.default_router
+		for request in requests[:10]:
+			assert router.find_handler(request).handler_class \
+				is not tornado.web.ErrorHandler
+
+		best = min(timeit.repeat(
+			lambda router=router: [
+				router.find_handler(request) for request in requests
+			],
+			number=5, repeat=3
+		))
+		print('{:>10}: {:8.2f} us/match ({} routes)'.format(
+			label, best / (5 * len(requests)) * 1e6, NUM_ROUTES))
+
+###############################################################################
+if __name__ == '__main__':
+	main()
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,399 @@
+"""
+Copyright 2017 Deepgram
+
+Load-testing benchmark suite for the request paths of a quack server.
+
+Starts a server (``create_server``) in a separate process, and drives it
+with a load generator which keeps a number of HTTP/1.1 keep-alive
+connections busy, each sending its next request as soon as the previous
+response has arrived. For each scenario, it reports the throughput and the
+p50/p99/p999 latencies. Run it from the repository root:
+
+	python benchmarks/load.py
+	python benchmarks/load.py --scenarios upload --duration 10
+	python benchmarks/load.py --output after.json --compare before.json
+
+With ``--output``, the results are saved as JSON; ``--compare`` prints the
+change against a previous run's results, to catch regressions.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import logging
+import asyncio
+import argparse
+import platform
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+NUM_ROUTES = 1000
+MODEL_SIZES = (10, 1000, 10000)
+UPLOAD_SIZES = (1024, 64*1024, 1024*1024)
+NUM_ASPECTS = 8
+
+###############################################################################
+def make_model(size):
+	""" Creates a model (a list of records) to render.
+	"""
+	return [
+		{
+			'id' : index,
+			'name' : 'item-{}'.format(index),
+			'score' : index / 7,
+			'tags' : ['a', 'b', 'c'],
+			'active' : index % 2 == 0
+		}
+		for index in range(size)
+	]
+
+###############################################################################
+def serve(port):
+	""" Runs the server which the scenarios are run against.
+	"""
+	# pylint: disable=import-outside-toplevel,unused-variable
+	from quack import aspect
+	from quack.routes import route, Handler
+	from quack.server import create_server
+
+	models = {size : make_model(size) for size in MODEL_SIZES}
+
+	###########################################################################
+	@route('/empty')
+	class Empty(Handler):
+		""" Does nothing.
+		"""
+		async def _get(self):
+			return None
+
+	###########################################################################
+	@route('/model/<size:int>')
+	class Model(Handler):
+		""" Renders a large model.
+		"""
+		async def _get(self, size):
+			return models[int(size)]
+
+	###########################################################################
+	@route('/upload')
+	class Upload(Handler):
+		""" Parses an uploaded payload.
+		"""
+		@aspect('payload')
+		async def _post(self, payload=None):
+			content_type, data = payload
+			if isinstance(data, tuple):
+				data = data[1]
+			return {'type' : content_type, 'size' : len(data)}
+
+	# Aspects of every kind, for the aspect-heavy handler.
+	names = []
+	for index in range(NUM_ASPECTS):
+		name = 'bench_aspect_{}'.format(index)
+		kind = index % 4
+		if kind == 0:
+			aspect.static(name, lambda index=index: index)
+		elif kind == 1:
+			aspect.dynamic(name)(lambda self, index=index: index)
+		elif kind == 2:
+			#######################################################################
+			async def evaluate(index=index):
+				""" An asynchronous aspect.
+				"""
+				return index
+			aspect.dynamic(name)(evaluate)
+		else:
+			aspect.instance(name)(lambda self, index=index: index)
+		names.append(name)
+
+	###########################################################################
+	async def aspects(self, **kwargs):
+		""" Returns the sum of the aspects.
+		"""
+		return {'sum' : sum(kwargs.values())}
+	for name in names:
+		aspects = aspect(name)(aspects)
+	route('/aspects')(type('Aspects', (Handler, ), {'_get' : aspects}))
+
+	###########################################################################
+	async def item(self, item):
+		""" Returns the item.
+		"""
+		return {'item' : item}
+	for index in range(NUM_ROUTES):
+		route('/service{}/items/<item:int>'.format(index))(
+			type('Service{}'.format(index), (Handler, ), {'_get' : item}))
+
+	# Logging every request would cost more than handling it.
+	logging.getLogger('tornado.access').disabled = True
+
+	create_server(port=port)
+	asyncio.get_event_loop().run_forever()
+
+###############################################################################
+def make_request(method, path, body=b'', headers=None):
+	""" Encodes an HTTP/1.1 request.
+	"""
+	lines = ['{} {} HTTP/1.1'.format(method, path), 'Host: localhost']
+	for name, value in (headers or {}).items():
+		lines.append('{}: {}'.format(name, value))
+	if body or method in ('POST', 'PUT'):
+		lines.append('Content-Length: {}'.format(len(body)))
+	return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+###############################################################################
+def make_multipart(size):
+	""" Encodes a ``multipart/form-data`` body with a single file.
+	"""
+	boundary = 'benchmark-boundary'
+	body = (
+		'--{0}\r\n'
+		'Content-Disposition: form-data; name="file"; filename="a.wav"\r\n'
+		'Content-Type: audio/wav\r\n\r\n'
+	).format(boundary).encode('latin-1') + os.urandom(size) + \
+		'\r\n--{}--\r\n'.format(boundary).encode('latin-1')
+	return body, 'multipart/form-data; boundary={}'.format(boundary)
+
+###############################################################################
+def get_scenarios():
+	""" Returns the scenarios, as a list of (name, requests) pairs. Each
+		connection cycles through its scenario's requests.
+	"""
+	scenarios = [('empty', [make_request('GET', '/empty')])]
+
+	for size in MODEL_SIZES:
+		scenarios.append(('model/{}'.format(size),
+			[make_request('GET', '/model/{}'.format(size))]))
+
+	for size in UPLOAD_SIZES:
+		label = '{}k'.format(size // 1024)
+		document = json.dumps({
+			'data' : 'x' * max(0, size - 12)
+		}).encode('utf-8')
+		scenarios.append(('upload/json/{}'.format(label), [
+			make_request('POST', '/upload', document,
+				{'Content-Type' : 'application/json'})
+		]))
+		scenarios.append(('upload/audio/{}'.format(label), [
+			make_request('POST', '/upload', os.urandom(size),
+				{'Content-Type' : 'audio/wav'})
+		]))
+		body, content_type = make_multipart(size)
+		scenarios.append(('upload/multipart/{}'.format(label), [
+			make_request('POST', '/upload', body,
+				{'Content-Type' : content_type})
+		]))
+
+	scenarios.append(('aspects', [make_request('GET', '/aspects')]))
+
+	rng = random.Random(0)
+	scenarios.append(('dispatch', [
+		make_request('GET', '/service{}/items/{}'.format(
+			rng.randrange(NUM_ROUTES), rng.randrange(10000)))
+		for _ in range(1000)
+	]))
+	return scenarios
+
+###############################################################################
+async def read_response(reader):
+	""" Reads an HTTP/1.1 response, and returns its status code.
+	"""
+	head = await reader.readuntil(b'\r\n\r\n')
+	lines = head.decode('latin-1').split('\r\n')
+	status = int(lines[0].split(' ', 2)[1])
+	headers = {}
+	for line in lines[1:]:
+		if ':' in line:
+			name, value = line.split(':', 1)
+			headers[name.strip().lower()] = value.strip()
+
+	if headers.get('transfer-encoding', '').lower() == 'chunked':
+		while True:
+			size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+			await reader.readexactly(size + 2)
+			if not size:
+				break
+	else:
+		await reader.readexactly(int(headers.get('content-length', 0)))
+	return status
+
+###############################################################################
+async def drive(port, requests, offset, start, deadline, latencies, errors):
+	""" Sends requests on one connection until the deadline. Latencies of
+		requests sent after ``start`` are recorded.
+	"""
+	reader, writer = await asyncio.open_connection('127.0.0.1', port)
+	try:
+		index = offset
+		while True:
+			sent = time.perf_counter()
+			if sent >= deadline:
+				break
+			writer.write(requests[index % len(requests)])
+			index += 1
+			status = await read_response(reader)
+			if sent >= start:
+				latencies.append(time.perf_counter() - sent)
+				if status >= 400:
+					errors.append(status)
+	finally:
+		writer.close()
+
+###############################################################################
+def percentile(values, fraction):
+	""" Returns a percentile of a sorted list.
+	"""
+	if not values:
+		return None
+	return values[min(len(values) - 1, int(len(values) * fraction))]
+
+###############################################################################
+async def run_scenario(port, requests, concurrency, duration, warmup):
+	""" Runs one scenario, and returns its results.
+	"""
+	latencies = []
+	errors = []
+	start = time.perf_counter() + warmup
+	deadline = start + duration
+	await asyncio.gather(*(
+		drive(port, requests, index, start, deadline, latencies, errors)
+		for index in range(concurrency)
+	))
+	latencies.sort()
+	return {
+		'requests' : len(latencies),
+		'errors' : len(errors),
+		'requests_per_second' : len(latencies) / duration,
+		'latency_ms' : {
+			'mean' : sum(latencies) / len(latencies) * 1000 \
+				if latencies else None,
+			'p50' : percentile(latencies, 0.5) * 1000 if latencies else None,
+			'p99' : percentile(latencies, 0.99) * 1000 if latencies else None,
+			'p999' : percentile(latencies, 0.999) * 1000 \
+				if latencies else None
+		}
+	}
+
+###############################################################################
+def start_server():
+	""" Starts the server process, and returns it and its port once it is
+		accepting connections.
+	"""
+	with socket.socket() as sock:
+		sock.bind(('127.0.0.1', 0))
+		port = sock.getsockname()[1]
+	process = subprocess.Popen([sys.executable, __file__, '--serve', str(port)])
+	deadline = time.monotonic() + 30
+	while time.monotonic() < deadline:
+		if process.poll() is not None:
+			raise RuntimeError('The server exited.')
+		try:
+			socket.create_connection(('127.0.0.1', port), timeout=1).close()
+			return process, port
+		except OSError:
+			time.sleep(0.05)
+	process.terminate()
+	raise RuntimeError('The server did not start.')
+
+###############################################################################
+def compare(results, baseline):
+	""" Prints the change in each scenario's results against a previous run.
+	"""
+	print()
+	print('{:<24} {:>12} {:>12} {:>12}'.format('vs. baseline', 'req/s',
+		'p50', 'p99'))
+	for name, result in results['scenarios'].items():
+		before = baseline.get('scenarios', {}).get(name)
+		if before is None:
+			continue
+
+		#######################################################################
+		def change(new, old):
+			""" Formats a relative change.
+			"""
+			if not new or not old:
+				return 'n/a'
+			return '{:+.1%}'.format(new / old - 1)
+
+		print('{:<24} {:>12} {:>12} {:>12}'.format(name,
+			change(result['requests_per_second'],
+				before['requests_per_second']),
+			change(result['latency_ms']['p50'], before['latency_ms']['p50']),
+			change(result['latency_ms']['p99'], before['latency_ms']['p99'])))
+
+###############################################################################
+def parse_args():
+	""" Parses the command-line arguments.
+	"""
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1],
+		formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--duration', type=float, default=5.0,
+		help='How long to measure each scenario for, in seconds.')
+	parser.add_argument('--warmup', type=float, default=1.0,
+		help='How long to run each scenario before measuring, in seconds.')
+	parser.add_argument('--concurrency', type=int, default=32,
+		help='The number of concurrent connections.')
+	parser.add_argument('--scenarios', nargs='*',
+		help='Only run the scenarios whose names start with one of these.')
+	parser.add_argument('--output', help='Save the results to this JSON file.')
+	parser.add_argument('--compare',
+		help='Compare the results with those in this JSON file.')
+	parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+	return parser.parse_args()
+
+###############################################################################
+def main():
+	""" Runs the benchmark suite.
+	"""
+	args = parse_args()
+	if args.serve:
+		serve(args.serve)
+		return
+
+	scenarios = [
+		(name, requests) for name, requests in get_scenarios()
+		if not args.scenarios or name.startswith(tuple(args.scenarios))
+	]
+	results = {
+		'timestamp' : time.time(),
+		'python' : platform.python_version(),
+		'platform' : platform.platform(),
+		'concurrency' : args.concurrency,
+		'duration' : args.duration,
+		'scenarios' : {}
+	}
+
+	process, port = start_server()
+	loop = asyncio.new_event_loop()
+	try:
+		print('{:<24} {:>10} {:>8} {:>9} {:>9} {:>9}'.format('scenario',
+			'req/s', 'errors', 'p50 ms', 'p99 ms', 'p999 ms'))
+		for name, requests in scenarios:
+			result = loop.run_until_complete(run_scenario(port, requests,
+				args.concurrency, args.duration, args.warmup))
+			results['scenarios'][name] = result
+			latency = result['latency_ms']
+			print('{:<24} {:>10.0f} {:>8} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+				name, result['requests_per_second'], result['errors'],
+				latency['p50'] or 0, latency['p99'] or 0, latency['p999'] or 0))
+	finally:
+		loop.close()
+		process.terminate()
+		process.wait()
+
+	if args.output:
+		with open(args.output, 'w') as fh:
+			json.dump(results, fh, indent=4, sort_keys=True)
+	if args.compare:
+		with open(args.compare) as fh:
+			compare(results, json.load(fh))
+
+###############################################################################
+if __name__ == '__main__':
+	main()
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,119 @@
+"""
+Copyright 2017 Deepgram
+
+Benchmark for cold-start latency.
+
+Measures, in fresh interpreters, how long ``import quack`` takes (over the
+time to start Python at all), and how long it takes from launching a server
+process until it has answered its first request. Run it from the repository
+root:
+
+	python benchmarks/startup.py
+"""
+
+import os
+import sys
+import time
+import socket
+import statistics
+import subprocess
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RUNS = 10
+
+SERVER = '''
+import asyncio
+from quack import route, Handler, create_server
+
+@route('/ping')
+class Ping(Handler):
+	async def _get(self):
+		return {{'result' : 'pong'}}
+
+create_server(port={port})
+asyncio.get_event_loop().run_forever()
+'''
+
+###############################################################################
+def get_environment():
+	""" Returns the environment for the child processes.
+	"""
+	environment = dict(os.environ)
+	environment['PYTHONPATH'] = os.pathsep.join(
+		filter(None, (ROOT, environment.get('PYTHONPATH'))))
+	return environment
+
+###############################################################################
+def time_command(code):
+	""" Returns how long it takes to run a Python snippet in a new
+		interpreter, in seconds.
+	"""
+	start = time.perf_counter()
+	subprocess.check_call([sys.executable, '-c', code], env=get_environment())
+	return time.perf_counter() - start
+
+###############################################################################
+def get_free_port():
+	""" Returns a TCP port which is not in use.
+	"""
+	with socket.socket() as sock:
+		sock.bind(('127.0.0.1', 0))
+		return sock.getsockname()[1]
+
+###############################################################################
+def time_first_request(timeout=30):
+	""" Returns how long it takes from starting a server process until it has
+		answered its first request, in seconds.
+	"""
+	port = get_free_port()
+	url = 'http://127.0.0.1:{}/ping'.format(port)
+	start = time.perf_counter()
+	process = subprocess.Popen([sys.executable, '-c', SERVER.format(port=port)],
+		env=get_environment(), stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL)
+	try:
+		while time.perf_counter() - start < timeout:
+			try:
+				with urllib.request.urlopen(url, timeout=1) as response:
+					response.read()
+				return time.perf_counter() - start
+			except OSError as error:
+				if process.poll() is not None:
+					raise RuntimeError('The server exited.') from error
+				time.sleep(0.001)
+		raise RuntimeError('The server did not start.')
+	finally:
+		process.terminate()
+		process.wait()
+
+###############################################################################
+def report(label, samples):
+	""" Prints the median and range of a set of timings.
+	"""
+	print('{:<28} median {:8.1f} ms  (min {:.1f}, max {:.1f})'.format(
+		label, statistics.median(samples) * 1000, min(samples) * 1000,
+		max(samples) * 1000))
+
+###############################################################################
+def main():
+	""" Runs the benchmark.
+	"""
+	baseline = [time_command('pass') for _ in range(RUNS)]
+	imports = [time_command('import quack') for _ in range(RUNS)]
+	full = [time_command('import quack; quack.create_server')
+		for _ in range(RUNS)]
+	first = [time_first_request() for _ in range(RUNS)]
+
+	report('python -c pass', baseline)
+	report('import quack', imports)
+	report('import quack (+ server)', full)
+	report('time to first request', first)
+	print('import quack overhead: {:.1f} ms'.format(
+		(statistics.median(imports) - statistics.median(baseline)) * 1000))
+
+###############################################################################
+if __name__ == '__main__':
+	main()
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
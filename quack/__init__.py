@@ -18,11 +18,75 @@ logging.TRACE = TRACE_LEVEL
 logging.Logger.trace = _trace
 
 # pylint: disable=wrong-import-position,wildcard-import
+import importlib
+
 from .version import __version__
+from . import exceptions as _exceptions
 from .exceptions import *
 from .aspects import aspect
-from .routes import route, get_routes, Handler
-from .server import create_server
 # pylint: enable=wrong-import-position,wildcard-import
 
+# The rest of the public API, which is imported from its module on first use,
+# so that importing the package stays cheap (in particular, it does not
+# import Tornado).
+_LAZY_NAMES = {
+	'CredentialStore' : '.aspects.basic_auth',
+	'PBKDF2CredentialStore' : '.aspects.basic_auth',
+	'route' : '.routes',
+	'get_routes' : '.routes',
+	'get_dispatcher' : '.routes',
+	'Handler' : '.routes',
+	'ResponseCache' : '.routes',
+	'cache_response' : '.routes',
+	'SingleFlight' : '.routes',
+	'ConcurrencyLimiter' : '.admission',
+	'RateLimiter' : '.ratelimit',
+	'offload' : '.executors',
+	'Batcher' : '.batching',
+	'batched' : '.batching',
+	'Profiler' : '.profiling',
+	'LoopMonitor' : '.loopmonitor',
+	'create_server' : '.server'
+}
+
+# Submodules which can be used as attributes of the package without being
+# imported first.
+_LAZY_MODULES = ('admission', 'batching', 'cache', 'compression', 'headers',
+	'executors', 'loopmonitor', 'metrics', 'profiling', 'ratelimit',
+	'routes', 'server', 'workers')
+
+__all__ = sorted(
+	[name for name in vars(_exceptions) if not name.startswith('_')
+		and isinstance(getattr(_exceptions, name), type)
+		and issubclass(getattr(_exceptions, name), _exceptions.HttpException)]
+	+ ['aspect'] + list(_LAZY_NAMES)
+)
+
+###############################################################################
+def __getattr__(name):
+	""" Imports the lazily-loaded parts of the public API.
+	"""
+	if name not in _LAZY_NAMES and name not in _LAZY_MODULES:
+		raise AttributeError('module {!r} has no attribute {!r}'.format(
+			__name__, name))
+	# An AttributeError raised while importing the module would be reported
+	# as if the package had no such attribute, hiding the actual error.
+	try:
+		if name in _LAZY_NAMES:
+			value = getattr(importlib.import_module(_LAZY_NAMES[name],
+				__name__), name)
+		else:
+			value = importlib.import_module('.' + name, __name__)
+	except AttributeError as error:
+		raise ImportError('Failed to import {}.{}: {}'.format(__name__, name,
+			error), name=__name__) from error
+	globals()[name] = value
+	return value
+
+###############################################################################
+def __dir__():
+	""" Lists the package's attributes, including those not yet imported.
+	"""
+	return sorted(set(globals()) | set(_LAZY_NAMES) | set(_LAZY_MODULES))
+
 ### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
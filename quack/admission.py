@@ -0,0 +1,172 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+
+from .exceptions import Http503ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+###############################################################################
+class ConcurrencyLimiter:
+	""" Limits how many requests are handled at once.
+
+		Up to ``limit`` requests run concurrently. Further requests wait, in
+		arrival order, in a queue of up to ``queue_size`` requests, for at
+		most ``queue_timeout`` seconds. Requests which find the queue full,
+		or which time out while waiting, are shed immediately with a 503 and
+		a ``Retry-After`` header, so that under overload the requests which
+		are admitted still complete quickly.
+
+		If ``target_latency`` is given, the limit adapts to the observed
+		latency (the time between a request being admitted and it
+		finishing): it grows slowly while requests finish within the target,
+		and shrinks by ``backoff`` (at most once per ``target_latency``
+		seconds) when they do not, always staying between ``min_limit`` and
+		``limit``.
+
+		Use it as the ``concurrency_limit`` route option, or set a global
+		limit with the ``max_concurrency`` option of ``create_server``.
+	"""
+
+	###########################################################################
+	def __init__(self, limit, queue_size=None, queue_timeout=1.0,
+		retry_after=1, target_latency=None, min_limit=1, backoff=0.9):
+		""" Creates a new limiter.
+
+			Arguments
+			---------
+
+			limit: int. The maximum number of concurrent requests.
+			queue_size: int (default: None). The maximum number of requests
+				waiting to be admitted. Defaults to ``limit``.
+			queue_timeout: float (default: 1.0). How long, in seconds, a
+				request may wait to be admitted. If None, requests wait for as
+				long as it takes.
+			retry_after: int (default: 1). The ``Retry-After`` value, in
+				seconds, sent with shed requests.
+			target_latency: float (default: None). If given, the latency, in
+				seconds, that the adaptive limit aims for.
+			min_limit: int (default: 1). The lowest that the adaptive limit
+				can go.
+			backoff: float (default: 0.9). The factor by which the adaptive
+				limit shrinks when the target latency is exceeded.
+		"""
+		super().__init__()
+		if limit < 1:
+			raise ValueError('Invalid concurrency limit: {}'.format(limit))
+		self.max_limit = limit
+		self.limit = float(limit)
+		self.queue_size = limit if queue_size is None else queue_size
+		self.queue_timeout = queue_timeout
+		self.retry_after = retry_after
+		self.target_latency = target_latency
+		self.min_limit = max(1, min(min_limit, limit))
+		self.backoff = backoff
+		self.active = 0
+		self.shed = 0
+		self._waiters = deque()
+		self._last_backoff = 0.0
+
+	###########################################################################
+	@property
+	def queued(self):
+		""" The number of requests waiting to be admitted.
+		"""
+		return len(self._waiters)
+
+	###########################################################################
+	def _reject(self, reason):
+		""" Returns the exception with which a request is shed.
+		"""
+		self.shed += 1
+		logger.debug('Shedding request: %s', reason)
+		return Http503ServiceUnavailable(
+			{'result' : 'failure', 'reason' : reason},
+			headers={'Retry-After' : str(self.retry_after)}
+		)
+
+	###########################################################################
+	def _expire(self, waiter):
+		""" Sheds a request which has waited too long.
+		"""
+		if waiter.done():
+			return
+		try:
+			self._waiters.remove(waiter)
+		except ValueError:
+			pass
+		waiter.set_exception(self._reject('Timed out waiting to be admitted.'))
+
+	###########################################################################
+	async def acquire(self):
+		""" Waits until a request may proceed. Raises an
+			``Http503ServiceUnavailable`` exception if the request is shed.
+		"""
+		if self.active < math.floor(self.limit) and not self._waiters:
+			self.active += 1
+			return
+		if len(self._waiters) >= self.queue_size:
+			raise self._reject('Too many requests.')
+
+		loop = asyncio.get_event_loop()
+		waiter = loop.create_future()
+		self._waiters.append(waiter)
+		timer = None
+		if self.queue_timeout is not None:
+			timer = loop.call_later(self.queue_timeout, self._expire, waiter)
+		try:
+			await waiter
+		except asyncio.CancelledError:
+			# If the slot was granted just before the cancellation, hand it on.
+			if waiter.done() and not waiter.cancelled() and \
+					waiter.exception() is None:
+				self.release()
+			else:
+				try:
+					self._waiters.remove(waiter)
+				except ValueError:
+					pass
+			raise
+		finally:
+			if timer is not None:
+				timer.cancel()
+
+	###########################################################################
+	def release(self, latency=None):
+		""" Marks a request as finished, admitting the next waiting request if
+			there is room.
+
+			Arguments
+			---------
+
+			latency: float (default: None). How long the request took since
+				it was admitted, in seconds, for adapting the limit.
+		"""
+		self.active -= 1
+		if latency is not None and self.target_latency is not None:
+			self._adapt(latency)
+		while self._waiters and self.active < math.floor(self.limit):
+			waiter = self._waiters.popleft()
+			if not waiter.done():
+				self.active += 1
+				waiter.set_result(None)
+
+	###########################################################################
+	def _adapt(self, latency):
+		""" Adjusts the limit according to a request's latency.
+		"""
+		if latency > self.target_latency:
+			now = time.monotonic()
+			if now - self._last_backoff >= self.target_latency:
+				self._last_backoff = now
+				self.limit = max(float(self.min_limit), self.limit * self.backoff)
+		else:
+			self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -2,9 +2,13 @@
 Copyright 2017 Deepgram
 """
 
-from .base import aspect
-from . import model
-from . import basic_auth
-from . import payload
+from .base import aspect, register_lazy_aspects
+
+# The built-in aspects are defined when they are first used.
+register_lazy_aspects(__name__ + '.model',
+	('model_renderers', 'model_renderer'))
+register_lazy_aspects(__name__ + '.basic_auth',
+	('basic_auth_headers', 'credential_store', 'verified_user'))
+register_lazy_aspects(__name__ + '.payload', ('payload', ))
 
 ### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
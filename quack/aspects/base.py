@@ -2,29 +2,127 @@
 Copyright 2017 Deepgram
 """
 
+import time
+import asyncio
+import importlib
 import inspect
+import weakref
 from contextlib import contextmanager
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from functools import wraps
 import logging
 
+from ..cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
 _aspects = defaultdict(list)					# pylint: disable=invalid-name
+_version = 0									# pylint: disable=invalid-name
 UNDEFINED = object()
 
+# The aspects that each provider depends on, as declared with ``depends=``.
+_dependencies = weakref.WeakKeyDictionary()		# pylint: disable=invalid-name
+
+# Maps each function returned by ``@aspect`` to the (target, names) it
+# injects, so that stacked ``@aspect`` decorators can be merged.
+_injectors = weakref.WeakKeyDictionary()		# pylint: disable=invalid-name
+
+# Called as ``_timer(name, seconds)`` after each aspect evaluation, if set.
+_timer = None									# pylint: disable=invalid-name
+
+# Maps the names of aspects which have not been defined yet to the modules
+# which define them, to be imported when they are first needed.
+_lazy_modules = {}								# pylint: disable=invalid-name
+
 ###############################################################################
 def push_aspect(name, func):
 	""" Adds a new aspect to the aspect stack.
 	"""
+	global _version								# pylint: disable=global-statement
 	_aspects[name].append(func)
+	_version += 1
 	return func
 
 ###############################################################################
 def pop_aspect(name):
 	""" Removes an aspect from the aspect stack.
 	"""
+	global _version								# pylint: disable=global-statement
 	_aspects[name].pop()
+	_version += 1
+
+###############################################################################
+def register_lazy_aspects(module, names):
+	""" Declares that importing ``module`` (an absolute module name) defines
+		the aspects ``names``. The module is only imported once one of them
+		is first needed.
+	"""
+	for name in names:
+		_lazy_modules[name] = module
+
+###############################################################################
+def _load_lazy_aspects(name):
+	""" Imports the module which defines an aspect, if it has been
+		registered with ``register_lazy_aspects``.
+
+		Aspects which were pushed before the module was imported (such as
+		overrides of its defaults) stay on top of the ones it defines.
+	"""
+	global _version								# pylint: disable=global-statement
+	module = _lazy_modules.get(name)
+	if module is None:
+		return
+	for key in [key for key, value in _lazy_modules.items() if value == module]:
+		del _lazy_modules[key]
+
+	before = {key : len(stack) for key, stack in _aspects.items() if stack}
+	importlib.import_module(module)
+	for key, size in before.items():
+		stack = _aspects[key]
+		if len(stack) > size:
+			stack[:] = stack[size:] + stack[:size]
+	_version += 1
+
+###############################################################################
+def set_aspect_timer(timer):
+	""" Sets a function to be called as ``timer(name, seconds)`` each time an
+		aspect has been evaluated, with the aspect's name and how long it took
+		(for asynchronous aspects, including the time spent waiting). If
+		``timer`` is None, aspects are no longer timed, and cost nothing
+		extra.
+	"""
+	global _timer, _version						# pylint: disable=global-statement
+	_timer = timer
+	# Force every binding to be recompiled with (or without) timing.
+	_version += 1
+
+###############################################################################
+def _timed(name, provider, is_async, timer):
+	""" Wraps an aspect provider so that its evaluations are timed.
+	"""
+	if is_async:
+		#######################################################################
+		@wraps(provider)
+		async def timed(*args, **kwargs):
+			""" Times an asynchronous aspect.
+			"""
+			start = time.perf_counter()
+			try:
+				return await provider(*args, **kwargs)
+			finally:
+				timer(name, time.perf_counter() - start)
+	else:
+		#######################################################################
+		@wraps(provider)
+		def timed(*args, **kwargs):
+			""" Times a synchronous aspect.
+			"""
+			start = time.perf_counter()
+			try:
+				return provider(*args, **kwargs)
+			finally:
+				timer(name, time.perf_counter() - start)
+	return timed
 
 ###############################################################################
 def has_self(func):
@@ -32,38 +130,272 @@ def has_self(func):
 	"""
 	return 'self' in inspect.signature(func).parameters
 
+###############################################################################
+def requires_self(func):
+	""" Returns True if the function takes 'self' as an argument, without a
+		default value.
+	"""
+	parameter = inspect.signature(func).parameters.get('self')
+	return parameter is not None and \
+		parameter.default is inspect.Parameter.empty
+
+###############################################################################
+def _set_dependencies(func, depends):
+	""" Records the aspects that an aspect provider depends on.
+	"""
+	if isinstance(depends, str):
+		depends = (depends, )
+	depends = tuple(depends or ())
+	if depends:
+		_dependencies[func] = depends
+	return func
+
+###############################################################################
+# One step of a compiled binding: how to evaluate a single aspect.
+_Step = namedtuple('_Step', ('name', 'provider', 'pass_self', 'depends',
+	'is_async'))
+
+###############################################################################
+def is_aspect_step(value):
+	""" Returns True if ``value`` is a step of a compiled binding, that is,
+		the ``step`` being evaluated by the aspect resolution functions. Used
+		to tell which aspect a stack frame belongs to.
+	"""
+	return isinstance(value, _Step)
+
+###############################################################################
+class _Binding:						# pylint: disable=too-few-public-methods
+	""" The aspect providers that a decorated function resolves its aspects
+		to.
+
+		Resolving an aspect means looking at the top of its stack and
+		inspecting the signature of the provider found there, which is far
+		too slow to do on every call. Instead, the result is compiled into a
+		plan: every aspect that is needed (including the dependencies of the
+		requested aspects), in dependency order. The plan is only recomputed
+		when the aspect stacks have changed since (that is, when ``_version``
+		has moved on).
+	"""
+
+	__slots__ = ('names', 'func_has_self', 'func_is_async', 'version',
+		'plan', 'async_steps')
+
+	###########################################################################
+	def __init__(self, names, func_has_self, func_is_async):
+		""" Creates a new, unbound binding.
+		"""
+		self.names = names
+		self.func_has_self = func_has_self
+		self.func_is_async = func_is_async
+		self.version = None
+		self.plan = ()
+		self.async_steps = 0
+
+	###########################################################################
+	def _step(self, name):
+		""" Resolves a single aspect against the current aspect stack.
+		"""
+		if not _aspects[name] and name in _lazy_modules:
+			_load_lazy_aspects(name)
+		try:
+			provider = _aspects[name][-1]
+		except IndexError as error:
+			raise ValueError('No such aspect defined: {}'.format(
+				name)) from error
+		pass_self = has_self(provider)
+		if pass_self and not self.func_has_self:
+			if requires_self(provider):
+				raise ValueError('Aspect requires "self": {}'.format(name))
+			pass_self = False
+		is_async = inspect.iscoroutinefunction(provider)
+		if is_async and not self.func_is_async:
+			raise ValueError('Asynchronous aspect cannot be injected into a '
+				'synchronous function: {}'.format(name))
+		depends = _dependencies.get(provider, ())
+		if _timer is not None:
+			provider = _timed(name, provider, is_async, _timer)
+		return _Step(name, provider, pass_self, depends, is_async)
+
+	###########################################################################
+	def bind(self):
+		""" Compiles the plan against the current aspect stacks.
+		"""
+		plan = []
+		visiting = set()
+		done = set()
+
+		#######################################################################
+		def visit(name):
+			""" Adds an aspect to the plan after its dependencies.
+			"""
+			if name in done:
+				return
+			if name in visiting:
+				raise ValueError('Circular aspect dependency: {}'.format(name))
+			visiting.add(name)
+			step = self._step(name)
+			for dependency in step.depends:
+				visit(dependency)
+			visiting.discard(name)
+			done.add(name)
+			plan.append(step)
+
+		for name in self.names:
+			visit(name)
+
+		self.plan = tuple(plan)
+		self.async_steps = sum(1 for step in plan if step.is_async)
+		self.version = _version
+
+###############################################################################
+def _call(step, instance, values):
+	""" Calls an aspect provider.
+	"""
+	kwargs = {name : values[name] for name in step.depends}
+	if step.pass_self:
+		return step.provider(instance, **kwargs)
+	return step.provider(**kwargs)
+
+###############################################################################
+def _resolve(plan, instance):
+	""" Evaluates a plan of synchronous aspects.
+	"""
+	values = {}
+	for step in plan:
+		if step.depends:
+			values[step.name] = _call(step, instance, values)
+		elif step.pass_self:
+			values[step.name] = step.provider(instance)
+		else:
+			values[step.name] = step.provider()
+	return values
+
+###############################################################################
+async def _resolve_serial(plan, instance):
+	""" Evaluates a plan with at most one asynchronous aspect, where there is
+		nothing to gain from concurrency.
+	"""
+	values = {}
+	for step in plan:
+		value = _call(step, instance, values)
+		if step.is_async:
+			value = await value
+		values[step.name] = value
+	return values
+
+###############################################################################
+async def _resolve_concurrent(plan, instance):
+	""" Evaluates a plan as a dependency graph: each aspect starts as soon as
+		the aspects it depends on are available, so independent asynchronous
+		aspects run concurrently.
+	"""
+	values = {}
+	tasks = {}
+
+	###########################################################################
+	async def evaluate(step):
+		""" Evaluates one aspect once its dependencies are ready.
+		"""
+		for name in step.depends:
+			if name in tasks:
+				await tasks[name]
+		value = _call(step, instance, values)
+		if step.is_async:
+			value = await value
+		values[step.name] = value
+
+	try:
+		for step in plan:
+			if step.is_async or any(name in tasks for name in step.depends):
+				tasks[step.name] = asyncio.ensure_future(evaluate(step))
+			else:
+				values[step.name] = _call(step, instance, values)
+		await asyncio.gather(*tasks.values())
+	finally:
+		# If anything failed, the other aspects are no longer needed.
+		for task in tasks.values():
+			task.cancel()
+	return values
+
 ###############################################################################
 def aspect(name):
 	""" Injects an aspect into a function.
+
+		Stacked ``@aspect`` decorators are merged, so that all of the aspects
+		of a function are resolved together. If the function is a coroutine
+		function, its aspects may be asynchronous, and independent ones are
+		evaluated concurrently.
 	"""
 	###########################################################################
 	def decorator(func):
 		""" Injects an aspect.
 		"""
-		#######################################################################
-		@wraps(func)
-		def wrapper(*args, **kwargs):
-			""" Apply the aspect.
-			"""
-			try:
-				aspect_func = _aspects[name][-1]
-			except IndexError:
-				raise ValueError('No such aspect defined: {}'.format(name))
-			if has_self(aspect_func):
-				if not has_self(func):
-					raise ValueError('Aspect requires "self": {}'.format(name))
-				value = aspect_func(args[0])
-			else:
-				value = aspect_func()
-			kwargs[name] = value
-			return func(*args, **kwargs)
+		target, names = _injectors.get(func, (func, ()))
+		names = (name, ) + names
+		binding = _Binding(names, has_self(target),
+			inspect.iscoroutinefunction(target))
+
+		if binding.func_is_async:
+			###################################################################
+			@wraps(target)
+			async def wrapper(*args, **kwargs):
+				""" Apply the aspects.
+				"""
+				if binding.version != _version:
+					binding.bind()
+				instance = args[0] if binding.func_has_self else None
+				if binding.async_steps > 1:
+					values = await _resolve_concurrent(binding.plan, instance)
+				elif binding.async_steps:
+					values = await _resolve_serial(binding.plan, instance)
+				else:
+					values = _resolve(binding.plan, instance)
+				for key in names:
+					kwargs[key] = values[key]
+				return await target(*args, **kwargs)
+		else:
+			###################################################################
+			@wraps(target)
+			def wrapper(*args, **kwargs):
+				""" Apply the aspects.
+				"""
+				if binding.version != _version:
+					binding.bind()
+				values = _resolve(binding.plan,
+					args[0] if binding.func_has_self else None)
+				for key in names:
+					kwargs[key] = values[key]
+				return target(*args, **kwargs)
+
+		_injectors[wrapper] = (target, names)
 		return wrapper
 	return decorator
 
 ###############################################################################
-def _dynamic(name=None):
+def injected_aspects(func):
+	""" Returns the names of the aspects that ``@aspect`` injects into a
+		function, or an empty tuple if it has none.
+	"""
+	return _injectors.get(func, (func, ()))[1]
+
+###############################################################################
+def _dynamic(name=None, depends=None):
 	""" Defines an aspect that is evaluated every time the decorated function
 		is called.
+
+		Arguments
+		---------
+
+		name: str (default: None). The name of the aspect. Defaults to the
+			name of the decorated function.
+		depends: list of str (default: None). Other aspects that this aspect
+			depends on. Their values are passed to the decorated function as
+			keyword arguments.
+
+		The decorated function may be a coroutine function, in which case the
+		aspect can only be injected into coroutine functions. If it takes
+		"self", it can only be injected into methods, unless "self" has a
+		default value, which it gets when injected into other functions.
 	"""
 	if not isinstance(name, (type(None), str)):
 		if callable(name):
@@ -76,6 +408,7 @@ def _dynamic(name=None):
 	def decorator(func):
 		""" The aspect registration decorator.
 		"""
+		_set_dependencies(func, depends)
 		return push_aspect(name or func.__name__, func)
 	return decorator
 aspect.dynamic = _dynamic
@@ -86,14 +419,20 @@ def _context(name, func):
 	""" Context manager for temporarily modifying the behavior of an aspect.
 	"""
 	push_aspect(name, func)
-	yield
-	pop_aspect(name)
+	try:
+		yield
+	finally:
+		pop_aspect(name)
 aspect.context = _context
 
 ###############################################################################
-def _static(name=None, value_func=UNDEFINED):
+def _static(name=None, value_func=UNDEFINED, depends=None):
 	""" Defines an aspect that is lazily evaluated only once, when it is first
 		used.
+
+		If the decorated function is a coroutine function, concurrent first
+		uses share a single evaluation, and a failed evaluation is retried
+		the next time the aspect is used.
 	"""
 	if not isinstance(name, (type(None), str)):
 		if callable(name):
@@ -106,28 +445,103 @@ def _static(name=None, value_func=UNDEFINED):
 	def decorator(func):
 		""" The aspect registration decorator.
 		"""
-		if has_self(func):
+		if inspect.iscoroutinefunction(func):
 			###################################################################
-			def evaluate(self):
-				""" Function wrapper for lazily evaluating the aspect.
+			@wraps(func)
+			async def evaluate(*args, **kwargs):
+				""" Coroutine wrapper for lazily evaluating the aspect.
 				"""
 				if not hasattr(evaluate, 'value'):
-					evaluate.value = func(self)
+					if not hasattr(evaluate, 'future'):
+						evaluate.future = asyncio.ensure_future(
+							func(*args, **kwargs))
+					future = evaluate.future
+					try:
+						evaluate.value = await asyncio.shield(future)
+					finally:
+						if future.done() and \
+								getattr(evaluate, 'future', None) is future:
+							del evaluate.future
 				return evaluate.value
 		else:
 			###################################################################
-			def evaluate():
+			@wraps(func)
+			def evaluate(*args, **kwargs):
 				""" Function wrapper for lazily evaluating the aspect.
 				"""
 				if not hasattr(evaluate, 'value'):
-					evaluate.value = func()
+					evaluate.value = func(*args, **kwargs)
 				return evaluate.value
+		evaluate.is_static = True
+		_set_dependencies(evaluate, depends)
 		return push_aspect(name or func.__name__, evaluate)
 	if value_func is not UNDEFINED:
 		return decorator(value_func)
 	return decorator
 aspect.static = _static
 
+###############################################################################
+def _needs_self(names):
+	""" Returns True if any of the aspects, or their dependencies, requires
+		"self".
+	"""
+	binding = _Binding(names, True, True)
+	binding.bind()
+	return any(step.pass_self for step in binding.plan)
+
+###############################################################################
+async def _warmup(names=None, concurrent=True):
+	""" Evaluates static aspects ahead of their first use, so that requests
+		do not have to wait for them (for example, for a model to load).
+		Their dependencies are evaluated too. Returns the names of the
+		aspects which were evaluated.
+
+		Arguments
+		---------
+
+		names: list of str (default: None). The aspects to evaluate. If None,
+			every static aspect which is currently defined, except for those
+			which require "self" (directly or through their dependencies).
+		concurrent: bool (default: True). Whether independent asynchronous
+			aspects are evaluated concurrently, or one at a time.
+
+		``create_server(warmup=...)`` calls this before it starts accepting
+		connections. To call it directly, run it on the event loop:
+
+		.. code-block:: python
+
+			asyncio.get_event_loop().run_until_complete(
+				aspect.warmup(['model']))
+	"""
+	if names is None:
+		names = [
+			name for name, stack in list(_aspects.items())
+			if stack and getattr(stack[-1], 'is_static', False) and \
+				not _needs_self((name, ))
+		]
+	names = tuple(names)
+	if not names:
+		return names
+
+	# Bind as if for a method, so that aspects which require "self" are
+	# reported here rather than as a binding error.
+	binding = _Binding(names, True, True)
+	binding.bind()
+	for step in binding.plan:
+		if step.pass_self:
+			raise ValueError('Cannot warm up an aspect which requires "self": '
+				'{}'.format(step.name))
+
+	start = time.perf_counter()
+	if concurrent:
+		await _resolve_concurrent(binding.plan, None)
+	else:
+		await _resolve_serial(binding.plan, None)
+	logger.info('Warmed up %d aspect(s) in %.3f seconds.', len(names),
+		time.perf_counter() - start)
+	return names
+aspect.warmup = _warmup
+
 ###############################################################################
 def _constant(name, value):
 	""" Defines an aspect that is a single value.
@@ -137,7 +551,7 @@ aspect.constant = _constant
 
 ###############################################################################
 # pylint: disable=protected-access
-def _instance(name=None):
+def _instance(name=None, depends=None):
 	""" Defines an aspect that is lazily evaluated only once per class
 		instance, when it is first used by that instance.
 	"""
@@ -153,23 +567,177 @@ def _instance(name=None):
 		""" The aspect registration decorator.
 		"""
 		func_name = name or func.__name__
+		func_has_self = has_self(func)
 
-		#######################################################################
-		@wraps(func)
-		def modified_func(self):
-			""" Function wrapper for lazily evaluating the aspect.
-			"""
-			if not hasattr(self, '_aspects_values'):
-				self._aspects_values = {}
-			if func_name not in self._aspects_values:
-				value = func(self) if has_self(func) else func()
-				self._aspects_values[func_name] = value
-			return self._aspects_values[func_name]
+		if inspect.iscoroutinefunction(func):
+			###################################################################
+			@wraps(func)
+			async def modified_func(self, **kwargs):
+				""" Coroutine wrapper for lazily evaluating the aspect.
+				"""
+				if not hasattr(self, '_aspects_values'):
+					self._aspects_values = {}
+				if func_name not in self._aspects_values:
+					value = func(self, **kwargs) if func_has_self \
+						else func(**kwargs)
+					self._aspects_values[func_name] = \
+						asyncio.ensure_future(value)
+				future = self._aspects_values[func_name]
+				try:
+					return await asyncio.shield(future)
+				except Exception:
+					if self._aspects_values.get(func_name) is future:
+						del self._aspects_values[func_name]
+					raise
+		else:
+			###################################################################
+			@wraps(func)
+			def modified_func(self, **kwargs):
+				""" Function wrapper for lazily evaluating the aspect.
+				"""
+				if not hasattr(self, '_aspects_values'):
+					self._aspects_values = {}
+				if func_name not in self._aspects_values:
+					value = func(self, **kwargs) if func_has_self \
+						else func(**kwargs)
+					self._aspects_values[func_name] = value
+				return self._aspects_values[func_name]
 
+		# The wrapper always needs "self", whatever ``func`` takes.
+		modified_func.__signature__ = inspect.signature(modified_func,
+			follow_wrapped=False)
+		_set_dependencies(modified_func, depends)
 		return push_aspect(func_name, modified_func)
 	return decorator
 # pylint: enable=protected-access
 
 aspect.instance = _instance
 
+###############################################################################
+def _cached(name=None, maxsize=128, ttl=None, key=None, depends=None):
+	""" Defines an aspect whose values are cached by key, for up to ``ttl``
+		seconds, in a least-recently-used cache of up to ``maxsize`` entries.
+
+		Arguments
+		---------
+
+		name: str (default: None). The name of the aspect. Defaults to the
+			name of the decorated function.
+		maxsize: int (default: 128). The maximum number of cached values.
+		ttl: float (default: None). How long values remain valid for, in
+			seconds. If None, values only leave the cache when evicted.
+		key: callable (default: None). Called with the handler instance
+			(``self``) to compute the cache key, e.g.,
+			``key=lambda self: self.request.headers.get('Authorization')``.
+			If None, the key is the tuple of the values of the aspects in
+			``depends`` (which must then be hashable).
+		depends: list of str (default: None). Other aspects that this aspect
+			depends on, as for ``aspect.dynamic``.
+
+		Example:
+
+		.. code-block:: python
+
+			@aspect.cached(ttl=60, maxsize=10000, depends=['basic_auth_headers'])
+			async def permissions(basic_auth_headers=None):
+				return await fetch_permissions(basic_auth_headers[0])
+
+		If the decorated function is a coroutine function, concurrent misses
+		for the same key share a single evaluation. Failed evaluations are
+		not cached.
+
+		The returned function has a ``cache`` attribute (an ``LRUCache``)
+		exposing the hit/miss/eviction/expiration counters, and a
+		``coalesced`` attribute counting the misses that joined an evaluation
+		already in flight.
+	"""
+	if not isinstance(name, (type(None), str)):
+		if callable(name):
+			raise ValueError('Invalid use of @aspect decorator. It looks like '
+				'you may have forgotten that this is a decorator function, so '
+				'you need to call the decorator with parentheses, like this: '
+				'@aspect.cached().')
+		raise ValueError('Invalid value for aspect name: {}'.format(name))
+	if isinstance(depends, str):
+		depends = (depends, )
+	depends = tuple(depends or ())
+	###########################################################################
+	def decorator(func):
+		""" The aspect registration decorator.
+		"""
+		cache = LRUCache(maxsize=maxsize, ttl=ttl)
+		func_has_self = has_self(func)
+		needs_self = func_has_self or key is not None
+
+		#######################################################################
+		def get_key(args, kwargs):
+			""" Computes the cache key for a call.
+			"""
+			if key is not None:
+				return key(args[0])
+			return tuple(kwargs[dependency] for dependency in depends)
+
+		#######################################################################
+		def call(args, kwargs):
+			""" Calls the decorated function.
+			"""
+			if func_has_self:
+				return func(args[0], **kwargs)
+			return func(**kwargs)
+
+		if inspect.iscoroutinefunction(func):
+			pending = {}
+
+			###################################################################
+			@wraps(func)
+			async def evaluate(*args, **kwargs):
+				""" Coroutine wrapper for the cached aspect.
+				"""
+				cache_key = get_key(args, kwargs)
+				value = cache.get(cache_key, UNDEFINED)
+				if value is not UNDEFINED:
+					return value
+
+				future = pending.get(cache_key)
+				if future is None:
+					future = asyncio.ensure_future(call(args, kwargs))
+					pending[cache_key] = future
+					future.add_done_callback(
+						lambda done: loaded(cache_key, done))
+				else:
+					evaluate.coalesced += 1
+				return await asyncio.shield(future)
+
+			###################################################################
+			def loaded(cache_key, future):
+				""" Caches the result of an evaluation.
+				"""
+				pending.pop(cache_key, None)
+				if not future.cancelled() and future.exception() is None:
+					cache.set(cache_key, future.result())
+		else:
+			###################################################################
+			@wraps(func)
+			def evaluate(*args, **kwargs):
+				""" Function wrapper for the cached aspect.
+				"""
+				cache_key = get_key(args, kwargs)
+				value = cache.get(cache_key, UNDEFINED)
+				if value is UNDEFINED:
+					value = call(args, kwargs)
+					cache.set(cache_key, value)
+				return value
+
+		parameters = [inspect.Parameter('kwargs', inspect.Parameter.VAR_KEYWORD)]
+		if needs_self:
+			parameters.insert(0, inspect.Parameter('self',
+				inspect.Parameter.POSITIONAL_OR_KEYWORD))
+		evaluate.__signature__ = inspect.Signature(parameters)
+		evaluate.cache = cache
+		evaluate.coalesced = 0
+		_set_dependencies(evaluate, depends)
+		return push_aspect(name or func.__name__, evaluate)
+	return decorator
+aspect.cached = _cached
+
 ### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -2,11 +2,22 @@
 Copyright 2017 Deepgram
 """
 
+import os
+import hmac
 import base64
+import asyncio
 import binascii
+import hashlib
+import inspect
+import logging
+from abc import ABCMeta, abstractmethod
 
+from ..cache import LRUCache
+from ..executors import run_in_executor
 from . import aspect
 
+logger = logging.getLogger(__name__)
+
 ###############################################################################
 @aspect.dynamic()
 def basic_auth_headers(self):
@@ -35,4 +46,171 @@ def basic_auth_headers(self):
 
 	return (username, password)
 
+###############################################################################
+class CredentialStore(metaclass=ABCMeta):
+	""" Base class for the stores which ``verified_user`` checks credentials
+		against. Subclasses must implement ``verify``.
+
+		Successful verifications are remembered for ``cache_ttl`` seconds, so
+		that repeated requests with the same credentials skip the (typically
+		slow) check. The cache is keyed by the username and an HMAC digest of
+		the password under a random per-process key; plaintext passwords are
+		never stored.
+
+		Install a store by overriding the ``credential_store`` aspect:
+
+		.. code-block:: python
+
+			aspect.constant('credential_store', PBKDF2CredentialStore({
+				'alice' : PBKDF2CredentialStore.hash_password('secret')
+			}))
+	"""
+
+	###########################################################################
+	def __init__(self, cache_size=1024, cache_ttl=60, executor='thread'):
+		""" Creates a new credential store.
+
+			Arguments
+			---------
+
+			cache_size: int (default: 1024). The maximum number of verified
+				credentials to remember.
+			cache_ttl: float (default: 60). How long, in seconds, verified
+				credentials are remembered for. If 0, nothing is cached.
+			executor: str or Executor (default: 'thread'). Where to run a
+				synchronous ``verify``, as for ``quack.executors``.
+		"""
+		super().__init__()
+		self.executor = executor
+		self.cache_ttl = cache_ttl
+		self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+		self._secret = os.urandom(32)
+		self._pending = {}
+
+	###########################################################################
+	@abstractmethod
+	def verify(self, username, password):
+		""" Checks a username and password.
+
+			Returns the user (any value other than None or False, such as a
+			user record), or None if the credentials are not valid. If this is
+			a regular function, it is run in ``executor`` (by default, the
+			managed thread pool), so it may block. It may also be a coroutine
+			function.
+		"""
+
+	###########################################################################
+	def _digest(self, username, password):
+		""" Returns the cache key for a pair of credentials.
+		"""
+		return (username, hmac.new(self._secret, password.encode('utf-8'),
+			hashlib.sha256).digest())
+
+	###########################################################################
+	async def _verify(self, username, password):
+		""" Calls ``verify``, off the event loop if it is synchronous.
+		"""
+		if inspect.iscoroutinefunction(self.verify):
+			user = await self.verify(username, password)
+		else:
+			user = await run_in_executor(self.executor, self.verify,
+				username, password)
+		if user is True:
+			user = username
+		return user or None
+
+	###########################################################################
+	async def authenticate(self, username, password):
+		""" Returns the user for a pair of credentials, or None if they are not
+			valid. Concurrent checks of the same credentials share one call
+			to ``verify``.
+		"""
+		key = self._digest(username, password)
+		user = self.cache.get(key)
+		if user is not None:
+			return user
+
+		future = self._pending.get(key)
+		if future is None:
+			future = asyncio.ensure_future(self._verify(username, password))
+			self._pending[key] = future
+			future.add_done_callback(lambda _: self._pending.pop(key, None))
+		user = await asyncio.shield(future)
+
+		if user is None:
+			logger.debug('Failed to verify user: %s', username)
+		elif self.cache_ttl:
+			self.cache.set(key, user)
+		return user
+
+###############################################################################
+class PBKDF2CredentialStore(CredentialStore):
+	""" Credential store which checks passwords against PBKDF2-SHA256 hashes.
+	"""
+
+	###########################################################################
+	def __init__(self, users, **kwargs):
+		""" Creates a new credential store.
+
+			Arguments
+			---------
+
+			users: dict. Maps usernames to password hashes created with
+				``hash_password``.
+			kwargs: As for ``CredentialStore``.
+		"""
+		super().__init__(**kwargs)
+		self.users = users
+
+	###########################################################################
+	@staticmethod
+	def hash_password(password, iterations=100000, salt=None):
+		""" Hashes a password, returning a string of the form
+			``pbkdf2_sha256$<iterations>$<salt>$<hash>``.
+		"""
+		salt = salt or base64.b64encode(os.urandom(16)).decode('ascii')
+		digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'),
+			salt.encode('ascii'), iterations)
+		return 'pbkdf2_sha256${}${}${}'.format(iterations, salt,
+			base64.b64encode(digest).decode('ascii'))
+
+	###########################################################################
+	def verify(self, username, password):
+		""" Checks a username and password.
+		"""
+		encoded = self.users.get(username)
+		if not encoded:
+			return None
+		try:
+			algorithm, iterations, salt, _ = encoded.split('$', 3)
+			iterations = int(iterations)
+		except ValueError:
+			logger.error('Malformed password hash for user: %s', username)
+			return None
+		if algorithm != 'pbkdf2_sha256':
+			logger.error('Unsupported password hash for user: %s', username)
+			return None
+		expected = self.hash_password(password, iterations, salt)
+		if hmac.compare_digest(expected.encode('ascii'),
+				encoded.encode('ascii')):
+			return username
+		return None
+
+aspect.constant('credential_store', None)
+
+###############################################################################
+@aspect.dynamic(depends=['basic_auth_headers', 'credential_store'])
+async def verified_user(basic_auth_headers=None, credential_store=None):
+	""" An aspect which verifies the basic authentication credentials against
+		the ``credential_store`` aspect (a ``CredentialStore``), and is the
+		user that the store returns, or None if the credentials are missing
+		or invalid.
+	"""
+	if basic_auth_headers is None:
+		return None
+	if credential_store is None:
+		raise ValueError('The "verified_user" aspect requires a credential '
+			'store. Override the "credential_store" aspect to provide one.')
+	return (await credential_store.authenticate(*basic_auth_headers))
+
 ### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
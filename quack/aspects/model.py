@@ -5,13 +5,51 @@ Copyright 2017 Deepgram
 import datetime
 import json
 
+from ..cache import LRUCache
+from ..headers import parse_qualities
 from . import aspect
 
+# pylint: disable=invalid-name
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+try:
+	import msgpack
+except ImportError:
+	msgpack = None
+
+try:
+	import cbor2
+except ImportError:
+	cbor2 = None
+# pylint: enable=invalid-name
+
+###############################################################################
+def _default(value):
+	""" Custom serializer for handling ``datetime`` types.
+	"""
+	if isinstance(value, datetime.datetime):
+		return str(value)
+	raise ValueError('Cannot render unknown JSON type: {}'.format(
+		type(value)))
+
 ###############################################################################
 class JSONRenderer:					# pylint: disable=too-few-public-methods
 	""" Class which renders JSON blobs.
+
+		Compact output uses ``orjson`` when it is installed, and the standard
+		library otherwise (or for anything ``orjson`` cannot encode). Either
+		way, it has no spaces after ``,`` and ``:``, unlike the output of
+		``json.dumps`` with its default settings, which earlier versions
+		sent. With ``orjson``, non-finite floats (which JSON cannot
+		represent) are rendered as ``null``, rather than as ``NaN`` or
+		``Infinity``.
 	"""
 
+	content_type = 'application/json'
+
 	###########################################################################
 	def __init__(self, pretty):
 		""" Creates a new JSON renderer.
@@ -23,33 +61,166 @@ class JSONRenderer:					# pylint: disable=too-few-public-methods
 		"""
 		super().__init__()
 		self.pretty = pretty
+		self._kwargs = {
+			'default' : self._handler
+		}
+		if self.pretty:
+			self._kwargs.update({
+				'sort_keys' : True,
+				'indent' : 4,
+				'separators' : (',', ': ')
+			})
+		else:
+			self._kwargs['separators'] = (',', ':')
+		self._fast = orjson is not None and not pretty
 
 	###########################################################################
 	@staticmethod
 	def _handler(value):
 		""" Custom JSON serializer for handling ``datetime`` types.
 		"""
-		if isinstance(value, datetime.datetime):
-			return str(value)
-		raise ValueError('Cannot render unknown JSON type: {}'.format(
-			type(value)))
+		return _default(value)
 
 	###########################################################################
 	def render(self, data):
-		""" Renders JSON-serializable data.
+		""" Renders JSON-serializable data, as ``str`` or UTF-8 ``bytes``.
 		"""
-		kwargs = {
-			'default' : self._handler
-		}
-		if self.pretty:
-			kwargs.update({
-				'sort_keys' : True,
-				'indent' : 4,
-				'separators' : (',', ': ')
-			})
-		return json.dumps(data, **kwargs)
+		if self._fast:
+			try:
+				return orjson.dumps(data, default=_default,
+					option=orjson.OPT_PASSTHROUGH_DATETIME | \
+						orjson.OPT_NON_STR_KEYS)
+			except TypeError:
+				pass
+		return json.dumps(data, **self._kwargs)
 
 ###############################################################################
-aspect.constant('model_renderer', JSONRenderer(pretty=False))
+class MessagePackRenderer:			# pylint: disable=too-few-public-methods
+	""" Class which renders MessagePack blobs. Requires ``msgpack``.
+	"""
+
+	content_type = 'application/msgpack'
+
+	###########################################################################
+	def render(self, data):					# pylint: disable=no-self-use
+		""" Renders serializable data.
+		"""
+		return msgpack.packb(data, default=_default, use_bin_type=True)
+
+###############################################################################
+class CBORRenderer:					# pylint: disable=too-few-public-methods
+	""" Class which renders CBOR blobs. Requires ``cbor2``.
+
+		Datetimes are encoded natively; naive ones are assumed to be UTC.
+	"""
+
+	content_type = 'application/cbor'
+
+	###########################################################################
+	def render(self, data):					# pylint: disable=no-self-use
+		""" Renders serializable data.
+		"""
+		return cbor2.dumps(data, timezone=datetime.timezone.utc,
+			default=lambda encoder, value: encoder.encode(_default(value)))
+
+###############################################################################
+class RendererRegistry:
+	""" Chooses a renderer for each response based on its ``Accept`` header.
+	"""
+
+	###########################################################################
+	def __init__(self):
+		""" Creates a new, empty registry.
+		"""
+		super().__init__()
+		self._renderers = []
+		self.default = None
+		self._negotiated = LRUCache(maxsize=256)
+
+	###########################################################################
+	def register(self, renderer, content_types=None, default=False):
+		""" Registers a renderer.
+
+			Arguments
+			---------
+
+			renderer: object. Has a ``render(data)`` method and a
+				``content_type`` attribute.
+			content_types: list of str (default: None). The media types that
+				the renderer should be chosen for. Defaults to
+				``[renderer.content_type]``.
+			default: bool (default: False). Whether this renderer should be
+				used when the client expresses no usable preference. The first
+				renderer registered is the default until another claims it.
+		"""
+		for content_type in content_types or [renderer.content_type]:
+			self._renderers.append((content_type.lower(), renderer))
+		if default or self.default is None:
+			self.default = renderer
+		self._negotiated.clear()
+		return renderer
+
+	###########################################################################
+	def _choose(self, accept):
+		""" Chooses the best renderer for an ``Accept`` header.
+		"""
+		ranges = parse_qualities(accept)
+		best = None
+		best_quality = 0.0
+		for content_type, renderer in self._renderers:
+			major = content_type.split('/', 1)[0]
+			quality = None
+			precision = -1
+			for media_type, value in ranges:
+				if media_type == content_type:
+					match = 2
+				elif media_type == major + '/*':
+					match = 1
+				elif media_type == '*/*':
+					match = 0
+				else:
+					continue
+				if match > precision:
+					precision, quality = match, value
+			if quality is not None and quality > best_quality:
+				best, best_quality = renderer, quality
+		return best or self.default
+
+	###########################################################################
+	def negotiate(self, accept):
+		""" Returns the renderer to use for an ``Accept`` header. If the header
+			is missing, or nothing it accepts is available, the default
+			renderer is returned.
+		"""
+		if not accept:
+			return self.default
+		renderer = self._negotiated.get(accept)
+		if renderer is None:
+			renderer = self._choose(accept)
+			self._negotiated.set(accept, renderer)
+		return renderer
+
+###############################################################################
+renderers = RendererRegistry()					# pylint: disable=invalid-name
+renderers.register(JSONRenderer(pretty=False))
+if msgpack is not None:
+	renderers.register(MessagePackRenderer(),
+		['application/msgpack', 'application/x-msgpack'])
+if cbor2 is not None:
+	renderers.register(CBORRenderer())
+
+aspect.constant('model_renderers', renderers)
+
+###############################################################################
+@aspect.dynamic(depends=['model_renderers'])
+def model_renderer(self=None, model_renderers=None):
+	""" An aspect which picks the renderer for the response according to the
+		request's ``Accept`` header. Outside of request handler methods, it is
+		the default renderer.
+	"""
+	request = getattr(self, 'request', None)
+	if request is None:
+		return model_renderers.default
+	return model_renderers.negotiate(request.headers.get('Accept'))
 
 ### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
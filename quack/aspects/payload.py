@@ -1,52 +1,225 @@
-import re
 import json
 import logging
 
 from ..exceptions import Http400BadRequest
 from . import aspect
 
+# pylint: disable=invalid-name
+try:
+	import orjson
+except ImportError:
+	orjson = None
+# pylint: enable=invalid-name
+
 logger = logging.getLogger(__name__)
 
+###############################################################################
+def _loads(body):
+	""" Parses JSON straight from bytes, without decoding it to text first.
+	"""
+	if orjson is not None:
+		try:
+			return orjson.loads(body)
+		except orjson.JSONDecodeError:
+			# The standard library is more lenient (e.g., about NaN).
+			pass
+	return json.loads(body)
+
+###############################################################################
 def decode_json(body, strict=False, content_type=None):
 	try:
-		data = json.loads(body.decode('utf-8'))
+		data = _loads(body)
 		return 'application/json', data
-	except (UnicodeDecodeError, json.decoder.JSONDecodeError):
+	except (UnicodeDecodeError, ValueError) as error:
 		if strict:
 			raise Http400BadRequest({
 				'result' : 'failure',
 				'reason' : 'Bad JSON submitted.'
-			})
+			}) from error
 		return content_type, body
 
-@aspect.dynamic()
+###############################################################################
+def _parse_binary(request):
+	""" Binary bodies are passed through as they are.
+	"""
+	return request.body
+
+###############################################################################
+def _parse_multipart(request):
+	""" Multipart bodies must contain exactly one file.
+	"""
+	if len(request.files) != 1:
+		raise Http400BadRequest
+
+	file_info = list(request.files.items())[0][1][0]
+	return (file_info['filename'], file_info['body'])
+
+###############################################################################
+def _parse_json(request):
+	""" JSON bodies must be valid.
+	"""
+	return decode_json(request.body, strict=True)[1]
+
+###############################################################################
+# The (content type, parser) for each media type, and for each major type,
+# which are looked up in that order. A content type of None means the media
+# type from the request. Other bodies are parsed as JSON if possible.
+_PARSERS = {
+	'application/octet-stream' : ('application/octet-stream', _parse_binary),
+	'multipart/form-data' : ('multipart/form-data', _parse_multipart),
+	'application/json' : ('application/json', _parse_json)
+}
+_MAJOR_PARSERS = {
+	'audio' : (None, _parse_binary),
+	'video' : (None, _parse_binary)
+}
+
+###############################################################################
+class Payload:
+	""" The body of a request, parsed on first use.
+
+		For compatibility, it behaves like the ``(content_type, data)`` tuple
+		that the ``payload`` aspect has always provided, so that
+		``content_type, data = payload`` still works. Unpacking it, or reading
+		``data``, parses the body (at most once). ``raw`` and ``view`` never
+		do, and neither does ``content_type``, except for content types which
+		are only treated as JSON if the body turns out to be JSON.
+	"""
+
+	__slots__ = ('request', 'header', '_content_type', '_parser', '_data',
+		'_parsed', '_streamed')
+
+	###########################################################################
+	def __init__(self, request, header, stream=None):
+		""" Creates a new payload.
+
+			Arguments
+			---------
+
+			request: HTTPServerRequest. The request.
+			header: str. The request's ``Content-Type`` header.
+			stream: object (default: None). The body, if it is being streamed
+				(a ``BodyStream`` or a ``MultipartForm``).
+		"""
+		self.request = request
+		self.header = header
+		self._data = stream
+		self._streamed = self._parsed = stream is not None
+		self._parser = None
+
+		media_type = header.split(';', 1)[0].strip().lower()
+		entry = _PARSERS.get(media_type) or \
+			_MAJOR_PARSERS.get(media_type.split('/', 1)[0])
+		if stream is not None and media_type != 'multipart/form-data' \
+				and media_type != 'application/octet-stream':
+			entry = (None, None)
+		if entry is None:
+			self._content_type = None
+		else:
+			self._content_type, self._parser = entry
+			if self._content_type is None:
+				self._content_type = header.split(';')[0]
+
+	###########################################################################
+	def _parse(self):
+		""" Parses the body, unless it has already been parsed.
+		"""
+		if self._parsed:
+			return
+		if self._parser is None:
+			self._content_type, self._data = decode_json(self.request.body,
+				strict=False, content_type=self.header)
+		else:
+			self._data = self._parser(self.request)
+		self._parsed = True
+
+	###########################################################################
+	@property
+	def content_type(self):
+		""" The content type of the payload.
+		"""
+		if self._content_type is None:
+			self._parse()
+		return self._content_type
+
+	###########################################################################
+	@property
+	def data(self):
+		""" The parsed payload: decoded JSON, the body as ``bytes``, a
+			(filename, body) tuple for a file upload, or the ``BodyStream``
+			or ``MultipartForm`` of a streamed body.
+		"""
+		self._parse()
+		return self._data
+
+	###########################################################################
+	@property
+	def raw(self):
+		""" The unparsed body, as ``bytes``, or None if it is streamed.
+		"""
+		return None if self._streamed else self.request.body
+
+	###########################################################################
+	@property
+	def view(self):
+		""" A ``memoryview`` of the unparsed body, which can be sliced without
+			copying, or None if it is streamed.
+		"""
+		body = self.raw
+		return None if body is None else memoryview(body)
+
+	###########################################################################
+	def __iter__(self):
+		""" Iterates over (content_type, data), as a tuple would.
+		"""
+		return iter((self.content_type, self.data))
+
+	###########################################################################
+	def __len__(self):
+		""" Returns 2, the length of (content_type, data).
+		"""
+		return 2
+
+	###########################################################################
+	def __getitem__(self, index):
+		""" Indexes (content_type, data), as a tuple would.
+		"""
+		return (self.content_type, self.data)[index]
+
+	###########################################################################
+	def __eq__(self, other):
+		""" Compares (content_type, data) with a tuple or another payload.
+		"""
+		if isinstance(other, (tuple, Payload)):
+			return tuple(self) == tuple(other)
+		return NotImplemented
+
+	__hash__ = None
+
+	###########################################################################
+	def __repr__(self):
+		""" Returns a representation of the payload.
+		"""
+		return 'Payload({!r})'.format(self.header)
+
+###############################################################################
+@aspect.instance()
 def payload(self):
+	""" An aspect which is the request's ``Payload``, or None if the request
+		has no ``Content-Type``. It is created once per request, and parses
+		the body only when it is first used.
+	"""
 	assert hasattr(self, 'request')
 
-	if 'Content-Type' not in self.request.headers:
+	content_type = self.request.headers.get('Content-Type')
+	if content_type is None:
 		return None
 
-	content_type = self.request.headers['Content-Type']
-	body = self.request.body
-
-	assert isinstance(body, bytes)
-
-	if 'application/octet-stream' in content_type:
-		return 'application/octet-stream', body
-	elif re.match(r'audio/.*', content_type):
-		return content_type.split(';')[0], body
-	elif re.match(r'video/.*', content_type):
-		return content_type.split(';')[0], body
-	elif 'multipart/form-data' in content_type:
-		if len(self.request.files) != 1:
-			raise Http400BadRequest
-
-		file_info = list(self.request.files.items())[0][1][0]
-		return 'multipart/form-data', (file_info['filename'], file_info['body'])
-	elif 'application/json' in content_type:
-		return decode_json(body, strict=True)
-	else:
-		# Just try to decode json
-		return decode_json(body, strict=False, content_type=content_type)
+	stream = getattr(self, '_body_stream', None)
+	if stream is None and getattr(self, '_multipart', None) is not None:
+		stream = self._multipart.form			# pylint: disable=protected-access
+	if stream is None:
+		assert isinstance(self.request.body, bytes)
+	return Payload(self.request, content_type, stream)
 
 ### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,224 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import time
+import asyncio
+import inspect
+import logging
+from collections import deque
+from functools import update_wrapper
+
+from . import metrics
+from .executors import run_in_executor
+
+logger = logging.getLogger(__name__)
+
+# pylint: disable=invalid-name
+batch_size = metrics.registry.histogram('quack_batch_size',
+	'Number of items in each batch.', ('batcher', ),
+	(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+batch_queue_wait = metrics.registry.histogram(
+	'quack_batch_queue_wait_seconds',
+	'Time that items wait before their batch starts.', ('batcher', ))
+batch_duration = metrics.registry.histogram('quack_batch_duration_seconds',
+	'Time taken to process each batch.', ('batcher', ))
+# pylint: enable=invalid-name
+
+###############################################################################
+class Batcher:
+	""" Collects items submitted by concurrent requests into batches, and
+		processes each batch with a single call.
+
+		A batch is started once ``max_batch_size`` items are waiting, or once
+		the first of them has waited ``max_wait_ms``, whichever comes first.
+		While ``max_concurrency`` batches are already running, items keep
+		accumulating, so batches grow with the load. Each caller gets its own
+		item's result (or exception) back.
+
+		The batch function takes a list of items and returns a list of
+		results, in the same order. Returning an exception instance as a
+		result fails just that item; raising an exception fails the whole
+		batch.
+
+		Use ``@batched`` to create one:
+
+		.. code-block:: python
+
+			@batched(max_batch_size=64, max_wait_ms=10, executor='thread')
+			def transcribe(clips):
+				return model.predict(clips)
+
+			@route('/transcribe')
+			class Transcribe(Handler):
+				@aspect('payload')
+				async def _post(self, payload=None):
+					return {'text' : await transcribe(payload.raw)}
+
+		When metrics are enabled (see ``quack.metrics``), batch sizes, queue
+		waits and batch durations are recorded, labeled with the batcher's
+		name.
+	"""
+
+	###########################################################################
+	def __init__(self, func, max_batch_size=32, max_wait_ms=5.0,
+		executor=None, max_concurrency=1, name=None):
+		""" Creates a new batcher.
+
+			Arguments
+			---------
+
+			func: callable. The batch function. It may be a coroutine
+				function.
+			max_batch_size: int (default: 32). The largest batch.
+			max_wait_ms: float (default: 5.0). The longest, in milliseconds,
+				that an item waits for its batch to fill up.
+			executor: str or Executor (default: None). If given, a regular
+				batch function is run in this executor (see
+				``quack.executors``) instead of on the event loop.
+			max_concurrency: int (default: 1). The number of batches which
+				may be processed at once.
+			name: str (default: None). The name used in metrics. Defaults to
+				the name of ``func``.
+		"""
+		super().__init__()
+		if max_batch_size < 1:
+			raise ValueError('Invalid batch size: {}'.format(max_batch_size))
+		self.func = func
+		self.max_batch_size = max_batch_size
+		self.max_wait = max_wait_ms / 1000
+		self.executor = executor
+		self.max_concurrency = max_concurrency
+		self.name = name or getattr(func, '__qualname__', repr(func))
+		self.batches = 0
+		self.items = 0
+		self._is_async = inspect.iscoroutinefunction(func)
+		self._pending = deque()
+		self._timer = None
+		self._running = 0
+
+	###########################################################################
+	@property
+	def queued(self):
+		""" The number of items waiting for a batch.
+		"""
+		return len(self._pending)
+
+	###########################################################################
+	async def submit(self, item):
+		""" Adds an item to the next batch, and returns its result.
+		"""
+		loop = asyncio.get_event_loop()
+		future = loop.create_future()
+		self._pending.append((item, future, time.monotonic()))
+		if len(self._pending) >= self.max_batch_size:
+			self._flush()
+		elif self._timer is None:
+			self._timer = loop.call_later(self.max_wait, self._flush)
+		return (await future)
+
+	__call__ = submit
+
+	###########################################################################
+	def _flush(self):
+		""" Starts a batch with the waiting items, if a batch may start.
+		"""
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+
+		while self._pending and self._running < self.max_concurrency:
+			batch = []
+			while self._pending and len(batch) < self.max_batch_size:
+				entry = self._pending.popleft()
+				# Skip the items of requests which have gone away.
+				if not entry[1].done():
+					batch.append(entry)
+			if not batch:
+				continue
+			self._running += 1
+			asyncio.ensure_future(self._run(batch))
+			if len(self._pending) < self.max_batch_size:
+				break
+
+		if self._pending and self._timer is None and \
+				self._running < self.max_concurrency:
+			wait = self._pending[0][2] + self.max_wait - time.monotonic()
+			self._timer = asyncio.get_event_loop().call_later(
+				max(0, wait), self._flush)
+
+	###########################################################################
+	async def _call(self, items):
+		""" Calls the batch function.
+		"""
+		if self._is_async:
+			return (await self.func(items))
+		if self.executor is not None:
+			return (await run_in_executor(self.executor, self.func, items))
+		return self.func(items)
+
+	###########################################################################
+	async def _run(self, batch):
+		""" Processes a batch, and hands the results out.
+		"""
+		start = time.monotonic()
+		self.batches += 1
+		self.items += len(batch)
+		if metrics.is_enabled():
+			labels = (self.name, )
+			batch_size.observe(labels, len(batch))
+			for _, _, enqueued in batch:
+				batch_queue_wait.observe(labels, start - enqueued)
+
+		try:
+			results = await self._call([item for item, _, _ in batch])
+			results = list(results)
+			if len(results) != len(batch):
+				raise ValueError('Batch function returned {} results for {} '
+					'items.'.format(len(results), len(batch)))
+		except asyncio.CancelledError:
+			# Without this, the callers would wait for their results forever.
+			for _, future, _ in batch:
+				future.cancel()
+			raise
+		except Exception as exception:				# pylint: disable=broad-except
+			logger.exception('Batch failed: %s', self.name)
+			for _, future, _ in batch:
+				if not future.done():
+					future.set_exception(exception)
+		else:
+			for (_, future, _), result in zip(batch, results):
+				if future.done():
+					continue
+				if isinstance(result, BaseException):
+					future.set_exception(result)
+				else:
+					future.set_result(result)
+		finally:
+			if metrics.is_enabled():
+				batch_duration.observe((self.name, ), time.monotonic() - start)
+			self._running -= 1
+			# Items that arrived while this batch ran have waited long enough.
+			if self._pending:
+				self._flush()
+
+###############################################################################
+def batched(max_batch_size=32, max_wait_ms=5.0, executor=None,
+	max_concurrency=1, name=None):
+	""" Decorator which turns a batch function into a ``Batcher``. Calling
+		(and awaiting) the result with a single item submits it to the next
+		batch and returns its result. Takes the same arguments as
+		``Batcher``.
+	"""
+	###########################################################################
+	def decorator(func):
+		""" Creates the batcher.
+		"""
+		batcher = Batcher(func, max_batch_size=max_batch_size,
+			max_wait_ms=max_wait_ms, executor=executor,
+			max_concurrency=max_concurrency, name=name)
+		update_wrapper(batcher, func)
+		return batcher
+	return decorator
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,128 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import time
+from collections import OrderedDict
+
+###############################################################################
+class LRUCache:
+	""" A size-bounded cache which evicts the least-recently-used entry when
+		it is full, and whose entries can optionally expire.
+
+		Lookups and insertions are O(1). The cache keeps counters of its
+		hits, misses, evictions (entries dropped to make room) and expirations
+		(entries dropped because they were too old).
+	"""
+
+	###########################################################################
+	def __init__(self, maxsize=128, ttl=None, clock=time.monotonic):
+		""" Creates a new cache.
+
+			Arguments
+			---------
+
+			maxsize: int (default: 128). The maximum number of entries. If
+				None, the cache is unbounded.
+			ttl: float (default: None). The default number of seconds that
+				entries remain valid for. If None, entries never expire.
+			clock: callable (default: time.monotonic). Returns the current
+				time, in seconds.
+		"""
+		super().__init__()
+		if maxsize is not None and maxsize < 1:
+			raise ValueError('Invalid cache size: {}'.format(maxsize))
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.clock = clock
+		self._data = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+
+	###########################################################################
+	def get(self, key, default=None):
+		""" Returns the value cached for ``key``, or ``default`` if there is
+			no valid entry.
+		"""
+		try:
+			expires, value = self._data[key]
+		except KeyError:
+			self.misses += 1
+			return default
+		if expires is not None and expires <= self.clock():
+			del self._data[key]
+			self.expirations += 1
+			self.misses += 1
+			return default
+		self._data.move_to_end(key)
+		self.hits += 1
+		return value
+
+	###########################################################################
+	def set(self, key, value, ttl=None):
+		""" Caches ``value`` under ``key``, evicting the least-recently-used
+			entry if the cache is full.
+
+			Arguments
+			---------
+
+			ttl: float (default: None). Overrides the cache's default TTL for
+				this entry.
+		"""
+		ttl = self.ttl if ttl is None else ttl
+		expires = None if ttl is None else self.clock() + ttl
+		if key in self._data:
+			self._data.move_to_end(key)
+		self._data[key] = (expires, value)
+		if self.maxsize is not None and len(self._data) > self.maxsize:
+			self._data.popitem(last=False)
+			self.evictions += 1
+
+	###########################################################################
+	def pop(self, key, default=None):
+		""" Removes an entry, returning its value.
+		"""
+		try:
+			return self._data.pop(key)[1]
+		except KeyError:
+			return default
+
+	###########################################################################
+	def clear(self):
+		""" Removes all entries.
+		"""
+		self._data.clear()
+
+	###########################################################################
+	def stats(self):
+		""" Returns the cache counters as a dictionary.
+		"""
+		return {
+			'size' : len(self._data),
+			'hits' : self.hits,
+			'misses' : self.misses,
+			'evictions' : self.evictions,
+			'expirations' : self.expirations
+		}
+
+	###########################################################################
+	def __len__(self):
+		""" Returns the number of entries, including any that have expired
+			but have not been dropped yet.
+		"""
+		return len(self._data)
+
+	###########################################################################
+	def __contains__(self, key):
+		""" Returns True if there is an entry for ``key``, without affecting
+			its recency or the counters.
+		"""
+		try:
+			expires, _ = self._data[key]
+		except KeyError:
+			return False
+		return expires is None or expires > self.clock()
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,218 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import zlib
+
+from tornado.web import OutputTransform
+
+from .headers import parse_qualities, add_vary
+
+# pylint: disable=invalid-name
+try:
+	import brotli
+except ImportError:
+	brotli = None
+# pylint: enable=invalid-name
+
+###############################################################################
+# Content types which are already compressed, and so are never re-compressed.
+UNCOMPRESSIBLE_CONTENT_TYPES = ('audio/', 'video/', 'image/',
+	'application/zip', 'application/gzip', 'application/x-gzip',
+	'application/x-bzip2', 'application/x-xz', 'application/x-7z-compressed',
+	'application/octet-stream', 'font/woff')
+
+# Exceptions to ``UNCOMPRESSIBLE_CONTENT_TYPES``.
+COMPRESSIBLE_CONTENT_TYPES = ('image/svg+xml', )
+
+# Supported encodings, most preferred first.
+ENCODINGS = ('br', 'gzip', 'deflate')
+
+###############################################################################
+def is_compressible_content_type(content_type):
+	""" Returns True if responses with the given content type are worth
+		compressing.
+	"""
+	content_type = (content_type or '').split(';', 1)[0].strip().lower()
+	if not content_type:
+		return False
+	if content_type in COMPRESSIBLE_CONTENT_TYPES:
+		return True
+	return not content_type.startswith(UNCOMPRESSIBLE_CONTENT_TYPES)
+
+###############################################################################
+def choose_encoding(accept_encoding, encodings=ENCODINGS):
+	""" Chooses the content encoding for a response.
+
+		Arguments
+		---------
+
+		accept_encoding: str. The request's ``Accept-Encoding`` header.
+		encodings: list of str (default: ENCODINGS). The encodings available,
+			most preferred first. Among those the client accepts equally, the
+			earliest is chosen.
+
+		Returns the encoding, or None if the response should not be encoded.
+	"""
+	if not accept_encoding:
+		return None
+
+	qualities = dict(parse_qualities(accept_encoding))
+
+	best = None
+	best_quality = 0.0
+	for encoding in encodings:
+		quality = qualities.get(encoding, qualities.get('*', 0.0))
+		if quality > best_quality:
+			best, best_quality = encoding, quality
+	return best
+
+###############################################################################
+class _ZlibCompressor:				# pylint: disable=too-few-public-methods
+	""" Incremental gzip or deflate compressor.
+	"""
+
+	###########################################################################
+	def __init__(self, wbits, level):
+		""" Creates a new compressor.
+		"""
+		super().__init__()
+		self._compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+	###########################################################################
+	def compress(self, chunk, finishing):
+		""" Compresses a chunk. Unless this is the last chunk, the output is
+			flushed, so that the client can decode everything sent so far.
+		"""
+		return self._compressor.compress(chunk) + self._compressor.flush(
+			zlib.Z_FINISH if finishing else zlib.Z_SYNC_FLUSH)
+
+###############################################################################
+class _BrotliCompressor:			# pylint: disable=too-few-public-methods
+	""" Incremental brotli compressor.
+	"""
+
+	###########################################################################
+	def __init__(self, quality):
+		""" Creates a new compressor.
+		"""
+		super().__init__()
+		self._compressor = brotli.Compressor(quality=quality)
+
+	###########################################################################
+	def compress(self, chunk, finishing):
+		""" Compresses a chunk. Unless this is the last chunk, the output is
+			flushed, so that the client can decode everything sent so far.
+		"""
+		output = self._compressor.process(chunk)
+		if finishing:
+			return output + self._compressor.finish()
+		return output + self._compressor.flush()
+
+###############################################################################
+class CompressionTransform(OutputTransform):
+	""" Tornado output transform which compresses responses with brotli
+		(if the ``brotli`` package is installed), gzip or deflate, as
+		negotiated with the client's ``Accept-Encoding`` header.
+
+		Responses are left alone if they are already encoded, if their
+		content type is already compressed (``UNCOMPRESSIBLE_CONTENT_TYPES``),
+		or if they are written in one piece that is smaller than
+		``min_size``. Responses written in several chunks, such as streamed
+		responses, are compressed incrementally, flushing the compressor after
+		each chunk so that no data is held back from the client.
+
+		Use ``compression_transform`` to configure one for an application, or
+		the ``compress_response`` option of ``create_server``.
+	"""
+
+	level = 6
+	brotli_quality = 4
+	min_size = 1024
+
+	###########################################################################
+	def __init__(self, request):
+		""" Creates the transform for a request.
+		"""
+		super().__init__(request)
+		self._encoding = choose_encoding(
+			request.headers.get('Accept-Encoding'),
+			ENCODINGS if brotli is not None else ENCODINGS[1:]
+		)
+		self._compressor = None
+
+	###########################################################################
+	def _create_compressor(self):
+		""" Creates the compressor for the negotiated encoding.
+		"""
+		if self._encoding == 'br':
+			return _BrotliCompressor(self.brotli_quality)
+		if self._encoding == 'gzip':
+			return _ZlibCompressor(16 + zlib.MAX_WBITS, self.level)
+		return _ZlibCompressor(zlib.MAX_WBITS, self.level)
+
+	###########################################################################
+	def transform_first_chunk(self, status_code, headers, chunk, finishing):
+		""" Decides whether to compress the response, and compresses the first
+			chunk if so.
+		"""
+		if status_code in (204, 304) or 'Content-Encoding' in headers or \
+				not is_compressible_content_type(headers.get('Content-Type')):
+			return status_code, headers, chunk
+
+		add_vary(headers, 'Accept-Encoding')
+
+		if self._encoding is None or (finishing and len(chunk) < self.min_size):
+			return status_code, headers, chunk
+
+		self._compressor = self._create_compressor()
+		headers['Content-Encoding'] = self._encoding
+		chunk = self.transform_chunk(chunk, finishing)
+		if 'Content-Length' in headers:
+			if finishing:
+				headers['Content-Length'] = str(len(chunk))
+			else:
+				del headers['Content-Length']
+
+		# The encoded body is a different representation from the one that
+		# a strong ETag describes.
+		etag = headers.get('Etag')
+		if etag and not etag.startswith('W/'):
+			headers['Etag'] = 'W/' + etag
+
+		return status_code, headers, chunk
+
+	###########################################################################
+	def transform_chunk(self, chunk, finishing):
+		""" Compresses a subsequent chunk of the response.
+		"""
+		if self._compressor is None:
+			return chunk
+		return self._compressor.compress(chunk, finishing)
+
+###############################################################################
+def compression_transform(level=6, brotli_quality=4, min_size=1024):
+	""" Creates a ``CompressionTransform`` class with the given settings,
+		suitable for the ``transforms`` argument of a Tornado application.
+
+		Arguments
+		---------
+
+		level: int (default: 6). The gzip/deflate compression level, from 1
+			(fastest) to 9 (smallest).
+		brotli_quality: int (default: 4). The brotli quality, from 0
+			(fastest) to 11 (smallest).
+		min_size: int (default: 1024). Responses written in one piece that
+			are smaller than this many bytes are not compressed.
+	"""
+	if not 1 <= level <= 9:
+		raise ValueError('Compression level must be between 1 and 9.')
+	if not 0 <= brotli_quality <= 11:
+		raise ValueError('Brotli quality must be between 0 and 11.')
+	return type('CompressionTransform', (CompressionTransform, ), {
+		'level' : level,
+		'brotli_quality' : brotli_quality,
+		'min_size' : min_size
+	})
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -47,6 +47,8 @@ Http403Forbidden = make_class('Http403Forbidden', 403)
 Http404NotFound = make_class('Http404NotFound', 404)
 Http405MethodNotAllowed = make_class('Http405MethodNotAllowed', 405)
 Http409Conflict = make_class('Http409Conflict', 409)
+Http413PayloadTooLarge = make_class('Http413PayloadTooLarge', 413)
+Http429TooManyRequests = make_class('Http429TooManyRequests', 429)
 
 Http500InternalServerError = make_class('Http500InternalServerError', 500)
 Http501NotImplemented = make_class('Http501NotImplemented', 501)
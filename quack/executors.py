@@ -0,0 +1,269 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import sys
+import asyncio
+import inspect
+import importlib
+import functools
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, \
+	ProcessPoolExecutor
+
+# pylint: disable=invalid-name
+try:
+	from multiprocessing import shared_memory
+except ImportError:
+	shared_memory = None
+# pylint: enable=invalid-name
+
+logger = logging.getLogger(__name__)
+
+_executors = {}									# pylint: disable=invalid-name
+_settings = {									# pylint: disable=invalid-name
+	'thread' : None,
+	'process' : None,
+	'shared_memory_threshold' : 1024*1024
+}
+
+###############################################################################
+def configure_executors(threads=None, processes=None,
+	shared_memory_threshold=None):
+	""" Configures the managed executors. Pools which have already been
+		created are shut down, and are recreated with the new settings when
+		next needed.
+
+		Arguments
+		---------
+
+		threads: int (default: None). The size of the thread pool. If None,
+			the ``concurrent.futures`` default is used.
+		processes: int (default: None). The size of the process pool. If
+			None, one process per CPU is used.
+		shared_memory_threshold: int (default: None). Bytes-like arguments
+			at least this large are passed to process pool workers through
+			shared memory (where available) instead of being pickled. If
+			None, the current setting (initially 1 MiB) is kept.
+	"""
+	_settings['thread'] = threads
+	_settings['process'] = processes
+	if shared_memory_threshold is not None:
+		_settings['shared_memory_threshold'] = shared_memory_threshold
+	shutdown_executors(wait=False)
+
+###############################################################################
+def get_executor(kind):
+	""" Returns a managed executor, creating it if necessary.
+
+		Arguments
+		---------
+
+		kind: str or Executor. 'thread' or 'process' for the managed pools;
+			an ``Executor`` instance is returned as it is.
+	"""
+	if isinstance(kind, Executor):
+		return kind
+	executor = _executors.get(kind)
+	if executor is None:
+		if kind == 'thread':
+			executor = ThreadPoolExecutor(max_workers=_settings['thread'])
+		elif kind == 'process':
+			executor = ProcessPoolExecutor(max_workers=_settings['process'])
+		else:
+			raise ValueError('Unknown executor: {}'.format(kind))
+		logger.debug('Created %s pool.', kind)
+		_executors[kind] = executor
+	return executor
+
+###############################################################################
+def shutdown_executors(wait=True):
+	""" Shuts down the managed executors.
+	"""
+	while _executors:
+		_, executor = _executors.popitem()
+		executor.shutdown(wait=wait)
+
+###############################################################################
+class _SharedBuffer:					# pylint: disable=too-few-public-methods
+	""" Stands in for a large bytes-like argument that has been copied into
+		shared memory, so that only its name crosses the process boundary.
+	"""
+
+	__slots__ = ('name', 'size')
+
+	###########################################################################
+	def __init__(self, name, size):
+		""" Creates a new reference to a shared memory block.
+		"""
+		self.name = name
+		self.size = size
+
+	###########################################################################
+	def load(self):
+		""" Reads the buffer back out of shared memory, as ``bytes``.
+
+			This is one copy, within the worker. It is deliberate: the
+			function gets the ``bytes`` that it was called with, and keeps
+			no view of a block which the caller unlinks once it returns.
+			It still replaces pickling the value through the pool's pipe,
+			which copies it several times over.
+		"""
+		block = _attach(self.name)
+		try:
+			return bytes(block.buf[:self.size])
+		finally:
+			block.close()
+
+###############################################################################
+def _attach(name):
+	""" Opens an existing shared memory block, which the process that created
+		it remains responsible for unlinking.
+	"""
+	if sys.version_info >= (3, 13):
+		return shared_memory.SharedMemory(name=name, track=False)
+	# Before Python 3.13, attaching to a block also registers it with the
+	# resource tracker (bpo-39959). Pool workers share the resource tracker
+	# of the process which started them, which holds one entry per block, so
+	# this registers nothing new; unregistering here would instead drop the
+	# creator's entry, which it removes itself when it unlinks the block.
+	return shared_memory.SharedMemory(name=name)
+
+###############################################################################
+def _share(value, blocks):
+	""" Moves a large bytes-like value into shared memory. Returns the value
+		to pass to the worker in its place.
+	"""
+	if shared_memory is None or \
+			not isinstance(value, (bytes, bytearray, memoryview)):
+		return value
+	view = memoryview(value)
+	size = view.nbytes
+	if size < _settings['shared_memory_threshold']:
+		return value
+	if not view.c_contiguous:
+		# Only contiguous buffers can be copied into the block directly.
+		view = memoryview(view.tobytes())
+	block = shared_memory.SharedMemory(create=True, size=size)
+	blocks.append(block)
+	block.buf[:size] = view.cast('B')
+	return _SharedBuffer(block.name, size)
+
+###############################################################################
+def _release(blocks):
+	""" Frees the shared memory blocks created by ``_share``.
+	"""
+	for block in blocks:
+		block.close()
+		block.unlink()
+
+###############################################################################
+def _unshare(value):
+	""" Restores a value passed with ``_share``.
+	"""
+	if isinstance(value, _SharedBuffer):
+		return value.load()
+	return value
+
+###############################################################################
+def _invoke(module, qualname, args, kwargs):
+	""" Runs an ``@offload``-ed function in a process pool worker.
+
+		The function is looked up by name, since the decorated name refers to
+		the wrapper rather than to the function itself.
+	"""
+	func = importlib.import_module(module)
+	for name in qualname.split('.'):
+		func = getattr(func, name)
+	func = getattr(func, '__wrapped__', func)
+	args = [_unshare(arg) for arg in args]
+	kwargs = {key : _unshare(value) for key, value in kwargs.items()}
+	return func(*args, **kwargs)
+
+###############################################################################
+async def run_in_executor(kind, func, *args, **kwargs):
+	""" Runs a function in a managed executor, and returns its result.
+
+		Arguments
+		---------
+
+		kind: str or Executor. 'thread', 'process' or an ``Executor``.
+		func: callable. The function to run. For process pools, it must be
+			picklable (e.g., a module-level function).
+		args, kwargs: The arguments to call ``func`` with.
+	"""
+	executor = get_executor(kind)
+	if kwargs:
+		func = functools.partial(func, **kwargs)
+	return (await asyncio.get_event_loop().run_in_executor(
+		executor, func, *args))
+
+###############################################################################
+def offload(executor='thread'):
+	""" Decorator which makes a (blocking) function run in an executor. The
+		decorated function returns a coroutine, which must be awaited.
+
+		.. code-block:: python
+
+			@offload('process')
+			def extract_features(audio):
+				...
+
+			@route('/features')
+			class Features(Handler):
+				@aspect('payload')
+				async def _post(self, payload=None):
+					_, audio = payload
+					return (await extract_features(audio))
+
+		Arguments
+		---------
+
+		executor: str or Executor (default: 'thread'). 'thread' for the
+			managed thread pool, 'process' for the managed process pool, or
+			any ``Executor``. Functions offloaded to the process pool must be
+			defined at module level. Large bytes-like arguments are passed to
+			them through shared memory, and arrive as ``bytes``.
+	"""
+	###########################################################################
+	def decorator(func):
+		""" Wraps the function.
+		"""
+		if inspect.iscoroutinefunction(func):
+			raise ValueError('Cannot offload a coroutine function: {}'.format(
+				func.__qualname__))
+		process = executor == 'process' or \
+			isinstance(executor, ProcessPoolExecutor)
+		if process and '<locals>' in func.__qualname__:
+			raise ValueError('Functions run in a process pool must be '
+				'defined at module level: {}'.format(func.__qualname__))
+
+		#######################################################################
+		@functools.wraps(func)
+		async def wrapper(*args, **kwargs):
+			""" Runs the function in the executor.
+			"""
+			if not process:
+				return (await run_in_executor(executor, func, *args, **kwargs))
+
+			blocks = []
+			try:
+				args = [_share(arg, blocks) for arg in args]
+				kwargs = {
+					key : _share(value, blocks)
+					for key, value in kwargs.items()
+				}
+				future = get_executor(executor).submit(_invoke,
+					func.__module__, func.__qualname__, args, kwargs)
+			except:							# pylint: disable=bare-except
+				_release(blocks)
+				raise
+			# The worker may still be reading the blocks after the caller
+			# stops waiting (if it is cancelled), so they are only released
+			# once the call itself has finished.
+			future.add_done_callback(lambda _: _release(blocks))
+			return (await asyncio.wrap_future(future))
+		return wrapper
+	return decorator
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,50 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+###############################################################################
+def parse_qualities(header):
+	""" Parses a header which lists values with optional ``q`` parameters,
+		such as ``Accept`` or ``Accept-Encoding``.
+
+		Returns a list of (value, quality) pairs, in the order in which they
+		appear. Values are lower-cased; invalid qualities count as 0.
+	"""
+	result = []
+	for item in header.split(','):
+		parts = item.split(';')
+		value = parts[0].strip().lower()
+		if not value:
+			continue
+		quality = 1.0
+		for param in parts[1:]:
+			key, _, param_value = param.partition('=')
+			if key.strip() == 'q':
+				try:
+					quality = float(param_value)
+				except ValueError:
+					quality = 0.0
+		result.append((value, quality))
+	return result
+
+###############################################################################
+def add_vary(headers, name):
+	""" Adds a request header to the ``Vary`` header of a response, keeping
+		a single ``Vary`` header without duplicates.
+
+		Arguments
+		---------
+
+		headers: HTTPHeaders. The response headers.
+		name: str. The request header that the response depends on.
+	"""
+	names = [
+		value.strip() for line in headers.get_list('Vary')
+		for value in line.split(',') if value.strip()
+	]
+	if '*' not in names and \
+			name.lower() not in (value.lower() for value in names):
+		names.append(name)
+	headers['Vary'] = ', '.join(names)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,213 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+from tornado.web import RequestHandler
+
+from . import metrics
+from .aspects.base import is_aspect_step
+
+logger = logging.getLogger(__name__)
+
+# pylint: disable=invalid-name
+loop_lag = metrics.registry.histogram('quack_event_loop_lag_seconds',
+	'How late the event loop ran its heartbeat.', (),
+	(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+loop_blocks = metrics.registry.counter('quack_event_loop_blocks_total',
+	'Number of times the event loop was blocked for longer than the '
+	'threshold.', ('route', 'aspect'))
+# pylint: enable=invalid-name
+
+###############################################################################
+def attribute(frame):
+	""" Finds the route and the aspect that a stack belongs to. Returns a
+		(route, aspect) tuple, where either is an empty string if the stack
+		does not belong to one.
+
+		Arguments
+		---------
+
+		frame: frame. The innermost frame of the stack.
+	"""
+	route = aspect = ''
+	while frame is not None:
+		local_vars = frame.f_locals
+		if not aspect:
+			step = local_vars.get('step')
+			if is_aspect_step(step):
+				aspect = step.name
+		# Aspect providers may be passed the handler as "self" too, but the
+		# outermost frame with a handler is the handler's own.
+		handler = local_vars.get('self')
+		if isinstance(handler, RequestHandler):
+			route = getattr(handler, '_route_name', None) or \
+				type(handler).__name__
+		frame = frame.f_back
+	return route, aspect
+
+###############################################################################
+class LoopMonitor:
+	""" Monitors the lag of an event loop.
+
+		Every handler, aspect and callback of a server shares one event loop,
+		so anything that blocks it (a slow synchronous aspect provider, a
+		CPU-heavy handler) stalls every connection. Enable monitoring with
+		``create_server(loop_monitor=...)``.
+
+		A heartbeat is scheduled on the loop every ``interval`` seconds, and
+		how late it runs is recorded (in the ``quack_event_loop_lag_seconds``
+		histogram, when metrics are enabled). If a heartbeat is more than
+		``threshold`` seconds late, a watchdog thread captures the stack of
+		whatever is running on the loop, and logs it along with the route and
+		aspect that it belongs to (counted in
+		``quack_event_loop_blocks_total``). Once the loop recovers, how late
+		the heartbeat was is logged too.
+	"""
+
+	###########################################################################
+	def __init__(self, interval=0.1, threshold=0.25, max_depth=30):
+		""" Creates a new monitor.
+
+			Arguments
+			---------
+
+			interval: float (default: 0.1). How often, in seconds, to check
+				the lag.
+			threshold: float (default: 0.25). The lag, in seconds, beyond
+				which the loop is considered blocked.
+			max_depth: int (default: 30). The number of stack frames to log.
+		"""
+		super().__init__()
+		self.interval = interval
+		self.threshold = threshold
+		self.max_depth = max_depth
+		self.max_lag = 0.0
+		self.blocks = 0
+		self.last_block = None
+		self._loop = None
+		self._handle = None
+		self._thread = None
+		self._thread_id = None
+		self._stopped = threading.Event()
+		self._expected = None
+		self._reported = None
+
+	###########################################################################
+	def start(self, loop=None):
+		""" Starts monitoring. This must be called from the thread which runs
+			the loop.
+		"""
+		if self._thread is not None:
+			return
+		self._loop = loop or asyncio.get_event_loop()
+		self._thread_id = threading.get_ident()
+		self._stopped.clear()
+		self._schedule()
+		self._thread = threading.Thread(target=self._watch,
+			name='quack-loop-monitor', daemon=True)
+		self._thread.start()
+
+	###########################################################################
+	def stop(self):
+		""" Stops monitoring.
+		"""
+		self._stopped.set()
+		if self._handle is not None:
+			self._handle.cancel()
+			self._handle = None
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	###########################################################################
+	def _schedule(self):
+		""" Schedules the next heartbeat.
+		"""
+		self._expected = self._loop.time() + self.interval
+		self._handle = self._loop.call_at(self._expected, self._beat)
+
+	###########################################################################
+	def _beat(self):
+		""" Records how late the heartbeat ran.
+		"""
+		lag = max(0.0, self._loop.time() - self._expected)
+		self.max_lag = max(self.max_lag, lag)
+		if metrics.is_enabled():
+			loop_lag.observe((), lag)
+		if self._reported == self._expected:
+			logger.warning('Event loop recovered; the heartbeat was %.3f '
+				'seconds late (%s).', lag, self._describe(self.last_block))
+		if not self._stopped.is_set():
+			self._schedule()
+
+	###########################################################################
+	def _watch(self):
+		""" Watches the heartbeat from another thread, and captures the stack
+			of the loop while the heartbeat is overdue.
+		"""
+		while not self._stopped.wait(self.interval / 2):
+			expected = self._expected
+			if expected is None or self._reported == expected:
+				continue
+			if time.monotonic() - expected < self.threshold:
+				continue
+			frame = sys._current_frames().get(self._thread_id)	# pylint: disable=protected-access
+			if frame is None:
+				continue
+			self._reported = expected
+			self._report(frame)
+
+	###########################################################################
+	def _report(self, frame):
+		""" Logs and counts a blocked loop.
+		"""
+		route, aspect = attribute(frame)
+		stack = ''.join(traceback.format_stack(frame, limit=self.max_depth))
+		self.blocks += 1
+		self.last_block = {
+			'time' : time.time(),
+			'route' : route,
+			'aspect' : aspect,
+			'stack' : stack
+		}
+		# The metrics registry is only updated from the event loop.
+		try:
+			self._loop.call_soon_threadsafe(self._count_block, route, aspect)
+		except RuntimeError:
+			# The loop has been closed.
+			pass
+		logger.warning('Event loop blocked for more than %.3f seconds (%s). '
+			'Stack:\n%s', self.threshold, self._describe(self.last_block),
+			stack)
+
+	###########################################################################
+	@staticmethod
+	def _count_block(route, aspect):
+		""" Counts a blocked loop in the metrics, once the loop has
+			recovered.
+		"""
+		if metrics.is_enabled():
+			loop_blocks.inc((route, aspect))
+
+	###########################################################################
+	@staticmethod
+	def _describe(block):
+		""" Describes where a block happened.
+		"""
+		if block is None:
+			return 'unknown'
+		parts = []
+		if block['route']:
+			parts.append('route: {}'.format(block['route']))
+		if block['aspect']:
+			parts.append('aspect: {}'.format(block['aspect']))
+		return ', '.join(parts) or 'outside of any route'
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,350 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import time
+import asyncio
+from bisect import bisect_left
+
+from tornado.web import RequestHandler
+
+from .aspects.base import set_aspect_timer
+
+###############################################################################
+# Default histogram buckets for durations, in seconds.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+	1.0, 2.5, 5.0, 10.0)
+
+# Default histogram buckets for response sizes, in bytes.
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+
+###############################################################################
+def _format_value(value):
+	""" Formats a sample value for the Prometheus text format.
+	"""
+	if value == float('inf'):
+		return '+Inf'
+	if isinstance(value, float) and value.is_integer():
+		return str(int(value))
+	return str(value)
+
+###############################################################################
+def _format_labels(names, values):
+	""" Formats a set of labels for the Prometheus text format.
+	"""
+	if not names:
+		return ''
+	return '{' + ','.join(
+		'{}="{}"'.format(name, str(value).replace('\\', r'\\') \
+			.replace('"', r'\"').replace('\n', r'\n'))
+		for name, value in zip(names, values)
+	) + '}'
+
+###############################################################################
+class Metric:
+	""" Base class for metrics. A metric has one value (or, for histograms,
+		one set of buckets) per distinct tuple of label values.
+
+		Metrics are only ever updated from the event loop, so plain
+		dictionaries suffice: there are no locks on the request path. Code
+		which runs in other threads (such as aspects of handlers offloaded
+		to an executor) hands its updates to the loop instead.
+	"""
+
+	kind = None
+
+	###########################################################################
+	def __init__(self, name, documentation, labels=()):
+		""" Creates a new metric.
+
+			Arguments
+			---------
+
+			name: str. The metric name.
+			documentation: str. A description of the metric.
+			labels: list of str (default: ()). The names of the metric's
+				labels. Values are passed, in the same order, as a tuple.
+		"""
+		super().__init__()
+		self.name = name
+		self.documentation = documentation
+		self.labels = tuple(labels)
+		self.values = {}
+
+	###########################################################################
+	def clear(self):
+		""" Resets the metric.
+		"""
+		self.values.clear()
+
+	###########################################################################
+	def samples(self):
+		""" Yields (name, label names, label values, value) tuples.
+		"""
+		for labels, value in sorted(self.values.items()):
+			yield self.name, self.labels, labels, value
+
+	###########################################################################
+	def render(self):
+		""" Renders the metric in the Prometheus text format.
+		"""
+		lines = [
+			'# HELP {} {}'.format(self.name, self.documentation),
+			'# TYPE {} {}'.format(self.name, self.kind)
+		]
+		for name, label_names, label_values, value in self.samples():
+			lines.append('{}{} {}'.format(name,
+				_format_labels(label_names, label_values), _format_value(value)))
+		return '\n'.join(lines)
+
+###############################################################################
+class Counter(Metric):
+	""" A value which only goes up.
+	"""
+
+	kind = 'counter'
+
+	###########################################################################
+	def inc(self, labels=(), amount=1):
+		""" Increments the counter.
+		"""
+		self.values[labels] = self.values.get(labels, 0) + amount
+
+###############################################################################
+class Gauge(Metric):
+	""" A value which goes up and down.
+	"""
+
+	kind = 'gauge'
+
+	###########################################################################
+	def inc(self, labels=(), amount=1):
+		""" Increments the gauge.
+		"""
+		self.values[labels] = self.values.get(labels, 0) + amount
+
+	###########################################################################
+	def dec(self, labels=(), amount=1):
+		""" Decrements the gauge.
+		"""
+		self.values[labels] = self.values.get(labels, 0) - amount
+
+	###########################################################################
+	def set(self, labels=(), value=0):
+		""" Sets the gauge.
+		"""
+		self.values[labels] = value
+
+###############################################################################
+class Histogram(Metric):
+	""" Counts observations in buckets, and keeps their sum.
+	"""
+
+	kind = 'histogram'
+
+	###########################################################################
+	def __init__(self, name, documentation, labels=(),
+		buckets=DURATION_BUCKETS):
+		""" Creates a new histogram.
+
+			Arguments
+			---------
+
+			name, documentation, labels: as for ``Metric``.
+			buckets: list of float (default: DURATION_BUCKETS). The upper
+				bounds of the buckets, in increasing order. A ``+Inf`` bucket
+				is always added.
+		"""
+		super().__init__(name, documentation, labels)
+		self.buckets = tuple(sorted(buckets))
+
+	###########################################################################
+	def observe(self, labels, value):
+		""" Records an observation.
+		"""
+		state = self.values.get(labels)
+		if state is None:
+			state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0]
+		state[0][bisect_left(self.buckets, value)] += 1
+		state[1] += value
+
+	###########################################################################
+	def samples(self):
+		""" Yields (name, label names, label values, value) tuples.
+		"""
+		bucket_labels = self.labels + ('le', )
+		for labels, (counts, total) in sorted(self.values.items()):
+			cumulative = 0
+			for bound, count in zip(self.buckets + (float('inf'), ), counts):
+				cumulative += count
+				yield self.name + '_bucket', bucket_labels, \
+					labels + (_format_value(bound), ), cumulative
+			yield self.name + '_sum', self.labels, labels, total
+			yield self.name + '_count', self.labels, labels, cumulative
+
+###############################################################################
+class Registry:
+	""" A collection of metrics.
+	"""
+
+	###########################################################################
+	def __init__(self):
+		""" Creates a new, empty registry.
+		"""
+		super().__init__()
+		self.metrics = {}
+
+	###########################################################################
+	def register(self, metric):
+		""" Adds a metric to the registry.
+		"""
+		if metric.name in self.metrics:
+			raise ValueError('Metric already registered: {}'.format(
+				metric.name))
+		self.metrics[metric.name] = metric
+		return metric
+
+	###########################################################################
+	def counter(self, name, documentation, labels=()):
+		""" Creates and registers a ``Counter``.
+		"""
+		return self.register(Counter(name, documentation, labels))
+
+	###########################################################################
+	def gauge(self, name, documentation, labels=()):
+		""" Creates and registers a ``Gauge``.
+		"""
+		return self.register(Gauge(name, documentation, labels))
+
+	###########################################################################
+	def histogram(self, name, documentation, labels=(),
+		buckets=DURATION_BUCKETS):
+		""" Creates and registers a ``Histogram``.
+		"""
+		return self.register(Histogram(name, documentation, labels, buckets))
+
+	###########################################################################
+	def clear(self):
+		""" Resets every metric in the registry.
+		"""
+		for metric in self.metrics.values():
+			metric.clear()
+
+	###########################################################################
+	def render(self):
+		""" Renders every metric in the Prometheus text format.
+		"""
+		return '\n'.join(
+			metric.render() for metric in self.metrics.values()
+		) + '\n'
+
+###############################################################################
+registry = Registry()							# pylint: disable=invalid-name
+
+# pylint: disable=invalid-name
+requests_total = registry.counter('quack_requests_total',
+	'Requests handled, by route, method and status code.',
+	('route', 'method', 'status'))
+request_duration = registry.histogram('quack_request_duration_seconds',
+	'Time from receiving the request headers to finishing the response.',
+	('route', 'method'))
+requests_in_flight = registry.gauge('quack_requests_in_flight',
+	'Requests currently being handled.', ('route', 'method'))
+response_size = registry.histogram('quack_response_size_bytes',
+	'Size of response bodies, before any content encoding.',
+	('route', 'method'), SIZE_BUCKETS)
+aspect_duration = registry.histogram('quack_aspect_duration_seconds',
+	'Time spent evaluating aspects.', ('aspect', ))
+# pylint: enable=invalid-name
+
+_enabled = False								# pylint: disable=invalid-name
+
+# The event loop which requests are handled on.
+_loop = None									# pylint: disable=invalid-name
+
+###############################################################################
+def _time_aspect(name, seconds):
+	""" Records an aspect evaluation. Aspects of handlers which run in an
+		executor are evaluated off the event loop, so their timings are
+		recorded by the loop.
+	"""
+	try:
+		asyncio.get_running_loop()
+	except RuntimeError:
+		loop = _loop
+		if loop is not None and loop.is_running():
+			loop.call_soon_threadsafe(aspect_duration.observe, (name, ),
+				seconds)
+			return
+	aspect_duration.observe((name, ), seconds)
+
+###############################################################################
+def enable(aspects=True):
+	""" Starts collecting the built-in metrics.
+
+		Arguments
+		---------
+
+		aspects: bool (default: True). Whether to time every aspect
+			evaluation, too.
+	"""
+	global _enabled								# pylint: disable=global-statement
+	_enabled = True
+	if aspects:
+		set_aspect_timer(_time_aspect)
+
+###############################################################################
+def disable():
+	""" Stops collecting the built-in metrics.
+	"""
+	global _enabled								# pylint: disable=global-statement
+	_enabled = False
+	set_aspect_timer(None)
+
+###############################################################################
+def is_enabled():
+	""" Returns True if the built-in metrics are being collected.
+	"""
+	return _enabled
+
+###############################################################################
+# pylint: disable=protected-access
+def request_started(handler):
+	""" Records the start of a request. Called by ``AutoHandler``.
+	"""
+	global _loop								# pylint: disable=global-statement
+	if _loop is None or not _loop.is_running():
+		try:
+			_loop = asyncio.get_running_loop()
+		except RuntimeError:
+			pass
+	handler._metrics_start = time.perf_counter()
+	requests_in_flight.inc((handler._route_name, handler.request.method))
+
+###############################################################################
+def request_finished(handler):
+	""" Records the end of a request. Called by ``AutoHandler``.
+	"""
+	labels = (handler._route_name, handler.request.method)
+	requests_in_flight.dec(labels)
+	request_duration.observe(labels,
+		time.perf_counter() - handler._metrics_start)
+	response_size.observe(labels, handler._metrics_size)
+	requests_total.inc(labels + (str(handler.get_status()), ))
+	handler._metrics_start = None
+# pylint: enable=protected-access
+
+###############################################################################
+class MetricsHandler(RequestHandler):			# pylint: disable=abstract-method
+	""" Serves the metrics in ``registry`` in the Prometheus text format.
+	"""
+
+	###########################################################################
+	def get(self):
+		""" Serves the metrics.
+		"""
+		self.set_header('Content-Type', 'text/plain; version=0.0.4; '
+			'charset=utf-8')
+		self.finish(registry.render())
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,336 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import os
+import io
+import hmac
+import json
+import time
+import types
+import random
+import ipaddress
+import asyncio
+import pstats
+import cProfile
+import logging
+import tempfile
+import itertools
+
+from tornado.web import RequestHandler
+
+from .aspects.base import injected_aspects
+from .executors import run_in_executor
+
+logger = logging.getLogger(__name__)
+
+###############################################################################
+@types.coroutine
+def _profiled(coroutine, profile):
+	""" Runs a coroutine, with ``profile`` enabled only while it is running.
+	"""
+	value = None
+	error = None
+	while True:
+		profile.enable()
+		try:
+			if error is None:
+				future = coroutine.send(value)
+			else:
+				future = coroutine.throw(error)
+		except StopIteration as result:
+			return result.value
+		finally:
+			profile.disable()
+		try:
+			value = yield future
+			error = None
+		except BaseException as exception:	# pylint: disable=broad-except
+			value = None
+			error = exception
+
+###############################################################################
+class RequestProfile:
+	""" The profile of a single request, while it is being handled.
+	"""
+
+	__slots__ = ('profile', 'reason', 'start', 'ran')
+
+	###########################################################################
+	def __init__(self, reason):
+		""" Starts profiling a request.
+
+			Arguments
+			---------
+
+			reason: str. Why the request is profiled: 'header', 'sample' or
+				'threshold'.
+		"""
+		self.profile = cProfile.Profile()
+		self.reason = reason
+		self.start = time.perf_counter()
+		self.ran = False
+
+	###########################################################################
+	def run(self, coroutine):
+		""" Returns an awaitable which runs a coroutine under the profiler.
+		"""
+		self.ran = True
+		return _profiled(coroutine, self.profile)
+
+###############################################################################
+class Profiler:
+	""" Selects requests to profile, and stores their profiles.
+
+		Requests are selected if they have a configured header, at random,
+		or, with a latency threshold, if they turn out to be slow. They are
+		profiled with ``cProfile``. Enable it with
+		``create_server(profiler=...)``, which also serves the saved
+		profiles to the clients that the profiler allows: those which send
+		its ``token``, and, if ``allow_local`` is set, those on the same
+		host:
+
+		.. code-block:: python
+
+			create_server(profiler=Profiler(threshold=0.5,
+				token=os.environ['PROFILER_TOKEN']), profiler_url='/profiles')
+
+		Only the request's own work is profiled: the profiler is switched on
+		each time the request's handler resumes, and off each time it waits,
+		so that other requests handled concurrently on the event loop do not
+		show up in its profile. Work offloaded to executors is not profiled,
+		and neither are handlers which start before a streamed request body
+		has arrived.
+
+		The most recent ``max_profiles`` profiles are kept in ``directory``,
+		each as a ``<id>.prof`` file (readable with ``pstats``) and a
+		``<id>.json`` file with the request's metadata: the route, method,
+		URI, status, duration, body size and the aspects injected into the
+		handler. Older profiles are deleted.
+	"""
+
+	###########################################################################
+	def __init__(self, directory=None, header=None, sample_rate=0.0,
+		threshold=None, max_profiles=100, token=None, allow_local=False):
+		""" Creates a new profiler.
+
+			Arguments
+			---------
+
+			directory: str (default: None). Where to store the profiles. If
+				None, a new temporary directory is used.
+			header: str (default: None). If given, requests with this header
+				(with any value other than '0') are profiled. Clients
+				can use it to profile their own requests, so only configure
+				it where clients are trusted.
+			sample_rate: float (default: 0.0). The fraction of requests to
+				profile, chosen at random.
+			threshold: float (default: None). If given, every request is
+				profiled, and the profiles of those which take at least this
+				many seconds are kept. Profiling every request roughly
+				doubles the time spent in handlers.
+			max_profiles: int (default: 100). The number of profiles to keep.
+			token: str (default: None). If given, clients which send it as a
+				bearer token (``Authorization: Bearer <token>``) may list and
+				download the profiles.
+			allow_local: bool (default: False). Whether clients connecting
+				from a loopback address may list and download the profiles
+				without a token. Behind a proxy on the same host, every
+				client appears to connect from a loopback address, so only
+				enable this where there is no such proxy.
+		"""
+		super().__init__()
+		self.directory = directory or tempfile.mkdtemp(
+			prefix='quack-profiles-')
+		os.makedirs(self.directory, exist_ok=True)
+		self.header = header
+		self.sample_rate = sample_rate
+		self.threshold = threshold
+		self.max_profiles = max_profiles
+		self.token = token
+		self.allow_local = allow_local
+		self._ids = itertools.count()
+
+	###########################################################################
+	def allows(self, request):
+		""" Returns True if a request may list and download the profiles.
+		"""
+		if self.token is not None:
+			scheme, _, credentials = request.headers.get('Authorization',
+				'').partition(' ')
+			if scheme.lower() == 'bearer' and hmac.compare_digest(
+					credentials.strip().encode('utf-8'),
+					self.token.encode('utf-8')):
+				return True
+		if self.allow_local:
+			try:
+				address = ipaddress.ip_address(request.remote_ip)
+			except ValueError:
+				return False
+			address = getattr(address, 'ipv4_mapped', None) or address
+			return address.is_loopback
+		return False
+
+	###########################################################################
+	def start(self, handler):
+		""" Decides whether to profile a request. Returns a
+			``RequestProfile`` to profile it with, or None.
+		"""
+		if self.header is not None and \
+				handler.request.headers.get(self.header, '0') != '0':
+			return RequestProfile('header')
+		if self.sample_rate and random.random() < self.sample_rate:
+			return RequestProfile('sample')
+		if self.threshold is not None:
+			return RequestProfile('threshold')
+		return None
+
+	###########################################################################
+	def finish(self, handler, profile, func=None):
+		""" Called once a profiled request has finished, to save its profile
+			if it is to be kept.
+
+			Arguments
+			---------
+
+			handler: RequestHandler. The request's handler.
+			profile: RequestProfile. The request's profile.
+			func: callable (default: None). The handler method that was
+				called, if any.
+		"""
+		if not profile.ran:
+			# The request was handled without the profiler (for example,
+			# because its body was streamed), so there is nothing to save.
+			return
+		duration = time.perf_counter() - profile.start
+		if profile.reason == 'threshold' and duration < self.threshold:
+			return
+
+		request = handler.request
+		now = time.time()
+		func = getattr(func, '__func__', func)
+		metadata = {
+			'id' : '{:.6f}-{}-{}'.format(now, os.getpid(), next(self._ids)),
+			'timestamp' : now,
+			'pid' : os.getpid(),
+			'reason' : profile.reason,
+			'route' : getattr(handler, '_route_name', None),
+			'method' : request.method,
+			'uri' : request.uri,
+			'status' : handler.get_status(),
+			'duration' : duration,
+			'body_size' : len(request.body) if request.body else \
+				int(request.headers.get('Content-Length') or 0),
+			'aspects' : list(injected_aspects(func))
+		}
+		asyncio.ensure_future(run_in_executor('thread', self._save,
+			profile.profile, metadata))
+
+	###########################################################################
+	def _save(self, profile, metadata):
+		""" Writes a profile to disk, and deletes the oldest ones beyond the
+			limit.
+		"""
+		path = os.path.join(self.directory, metadata['id'])
+		try:
+			profile.dump_stats(path + '.prof')
+			with open(path + '.json', 'w', encoding='utf-8') as fh:
+				json.dump(metadata, fh)
+			for old in self.list()[self.max_profiles:]:
+				self.delete(old['id'])
+		except OSError:
+			logger.exception('Failed to save profile: %s', path)
+
+	###########################################################################
+	def list(self):
+		""" Returns the metadata of the stored profiles, newest first.
+		"""
+		result = []
+		for name in os.listdir(self.directory):
+			if not name.endswith('.json'):
+				continue
+			try:
+				with open(os.path.join(self.directory, name),
+						encoding='utf-8') as fh:
+					result.append(json.load(fh))
+			except (OSError, ValueError):
+				continue
+		result.sort(key=lambda metadata: metadata['timestamp'], reverse=True)
+		return result
+
+	###########################################################################
+	def path(self, profile_id):
+		""" Returns the path of a stored profile, or None if there is no such
+			profile.
+		"""
+		if os.sep in profile_id or profile_id.startswith('.'):
+			return None
+		path = os.path.join(self.directory, profile_id + '.prof')
+		return path if os.path.isfile(path) else None
+
+	###########################################################################
+	def delete(self, profile_id):
+		""" Deletes a stored profile.
+		"""
+		for extension in ('.json', '.prof'):
+			try:
+				os.remove(os.path.join(self.directory, profile_id + extension))
+			except FileNotFoundError:
+				pass
+
+###############################################################################
+class ProfilesHandler(RequestHandler):			# pylint: disable=abstract-method
+	""" Lists and serves the stored profiles, to the clients which the
+		profiler allows (see ``Profiler.allows``); other clients get a 404.
+		The profiler is the ``profiler`` application setting.
+
+		``GET <url>`` lists the profiles' metadata as JSON, newest first.
+		``GET <url>/<id>`` downloads a profile, to be loaded with ``pstats``;
+		with ``?format=text``, it is summarized as text instead, sorted by
+		``sort`` (a ``pstats`` sort key; default: 'cumulative') and limited
+		to ``limit`` lines (default: 50).
+	"""
+
+	###########################################################################
+	def get(self, profile_id=None):					# pylint: disable=arguments-differ
+		""" Serves the profiles.
+		"""
+		profiler = self.application.settings.get('profiler')
+		if profiler is None or not profiler.allows(self.request):
+			self.send_error(404)
+			return
+
+		if profile_id is None:
+			self.finish({'profiles' : profiler.list()})
+			return
+
+		path = profiler.path(profile_id)
+		if path is None:
+			self.send_error(404)
+			return
+
+		if self.get_argument('format', None) == 'text':
+			sort = self.get_argument('sort', 'cumulative')
+			try:
+				limit = int(self.get_argument('limit', 50))
+			except ValueError:
+				limit = -1
+			if sort not in pstats.Stats.sort_arg_dict_default or limit < 0:
+				self.send_error(400)
+				return
+			output = io.StringIO()
+			stats = pstats.Stats(path, stream=output)
+			stats.sort_stats(sort)
+			stats.print_stats(limit)
+			self.set_header('Content-Type', 'text/plain; charset=utf-8')
+			self.finish(output.getvalue())
+			return
+
+		with open(path, 'rb') as fh:
+			data = fh.read()
+		self.set_header('Content-Type', 'application/octet-stream')
+		self.set_header('Content-Disposition',
+			'attachment; filename="{}.prof"'.format(profile_id))
+		self.finish(data)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
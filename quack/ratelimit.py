@@ -0,0 +1,163 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import math
+import time
+import inspect
+import logging
+
+from .cache import LRUCache
+from .aspects import aspect
+from .exceptions import Http429TooManyRequests
+
+logger = logging.getLogger(__name__)
+
+###############################################################################
+@aspect('verified_user')
+@aspect('basic_auth_headers')
+async def _user_key(self, verified_user=None, basic_auth_headers=None):
+	""" Keys a request by its username, once the ``verified_user`` aspect
+		has checked the password, or by its client address otherwise.
+	"""
+	if verified_user is not None:
+		return ('user', basic_auth_headers[0])
+	return ('ip', self.request.remote_ip)
+
+###############################################################################
+def _ip_key(self):
+	""" Keys a request by its client address.
+	"""
+	return ('ip', self.request.remote_ip)
+
+# The built-in ways of keying requests.
+_KEYS = {
+	'user' : _user_key,
+	'ip' : _ip_key
+}
+
+###############################################################################
+class RateLimiter:
+	""" Limits how often each client may make requests, using a token bucket
+		per client.
+
+		Each client may make ``burst`` requests in quick succession, and then
+		``limit`` requests every ``period`` seconds on average. Requests over
+		the limit get a 429 with a ``Retry-After`` header. Every response
+		carries ``RateLimit-Limit``, ``RateLimit-Remaining`` and
+		``RateLimit-Reset`` headers.
+
+		Checking a request costs O(1). At most ``maxsize`` buckets are kept,
+		the least recently used being dropped first; idle buckets also expire
+		once they would have refilled, since a full bucket is the same as a
+		new one.
+
+		Use it as the ``rate_limit`` route option. The same limiter can be
+		shared between routes to give them a common budget:
+
+		.. code-block:: python
+
+			api_limit = RateLimiter(100, period=60)
+
+			@route('/transcribe', rate_limit=api_limit)
+			class Transcribe(Handler):
+				...
+	"""
+
+	###########################################################################
+	def __init__(self, limit, period=1.0, burst=None, key='ip',
+		maxsize=10000, clock=time.monotonic):
+		""" Creates a new rate limiter.
+
+			Arguments
+			---------
+
+			limit: float. The number of requests allowed per ``period``.
+			period: float (default: 1.0). The period, in seconds.
+			burst: int (default: None). The size of the bucket: how many
+				requests can be made at once after an idle spell. Defaults to
+				``limit``.
+			key: str or callable (default: 'ip'). How to tell clients
+				apart: 'ip' (the client address), 'user' (the basic
+				authentication username, if the ``verified_user`` aspect
+				accepts the password, and the client address otherwise; this
+				requires a credential store), or a function which takes the
+				request handler and returns a hashable key. The function
+				may be a coroutine function, and may use aspects. It must
+				only key on what the client cannot choose freely, such as
+				verified credentials: keying on, say, an unverified username
+				lets a client dodge its limit by changing it, or spend
+				another client's budget.
+			maxsize: int (default: 10000). The maximum number of clients to
+				track.
+			clock: callable (default: time.monotonic). Returns the current
+				time, in seconds.
+		"""
+		super().__init__()
+		if limit <= 0 or period <= 0:
+			raise ValueError('Invalid rate limit: {} per {} s'.format(
+				limit, period))
+		self.rate = limit / period
+		self.burst = burst or max(1, int(limit))
+		if isinstance(key, str):
+			try:
+				key = _KEYS[key]
+			except KeyError as error:
+				raise ValueError('Unknown rate limit key: {}'.format(
+					key)) from error
+		self.key = key
+		self.clock = clock
+		self.limited = 0
+		self.buckets = LRUCache(maxsize=maxsize, ttl=self.burst / self.rate,
+			clock=clock)
+
+	###########################################################################
+	def consume(self, key):
+		""" Takes a token from a client's bucket.
+
+			Returns (allowed, tokens), where ``tokens`` is the number of
+			tokens left in the bucket.
+		"""
+		now = self.clock()
+		bucket = self.buckets.get(key)
+		if bucket is None:
+			tokens = float(self.burst)
+		else:
+			tokens = min(float(self.burst),
+				bucket[0] + (now - bucket[1]) * self.rate)
+
+		allowed = tokens >= 1
+		if allowed:
+			tokens -= 1
+		self.buckets.set(key, (tokens, now))
+		return allowed, tokens
+
+	###########################################################################
+	async def check(self, handler):
+		""" Checks a request against the limit, setting the rate limit
+			headers on its response. Raises an ``Http429TooManyRequests``
+			exception if the request is over the limit.
+		"""
+		key = self.key(handler)
+		if inspect.isawaitable(key):
+			key = await key
+		allowed, tokens = self.consume(key)
+		headers = {
+			'RateLimit-Limit' : str(self.burst),
+			'RateLimit-Remaining' : str(int(tokens)),
+			'RateLimit-Reset' : str(math.ceil((self.burst - tokens) / self.rate))
+		}
+		if allowed:
+			for name, value in headers.items():
+				handler.set_header(name, value)
+			return
+
+		self.limited += 1
+		logger.debug('Rate limited request from: %s', handler.request.remote_ip)
+		headers['Retry-After'] = str(math.ceil((1 - tokens) / self.rate))
+		raise Http429TooManyRequests({
+			'result' : 'failure',
+			'reason' : 'Too many requests. Please try again later.'
+		}, headers=headers)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
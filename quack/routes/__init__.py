@@ -2,6 +2,8 @@
 Copyright 2017 Deepgram
 """
 
-from .autoroute import route, get_routes, Handler
+from .autoroute import route, get_routes, get_dispatcher, Handler
+from .caching import ResponseCache, cache_response
+from .coalescing import SingleFlight
 
 ### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -3,11 +3,29 @@ Copyright 2017 Deepgram
 """
 
 import re
+import time
+import inspect
 import logging
-
-from tornado.web import RequestHandler
-
-from .. import aspect, HttpException, Http405MethodNotAllowed
+import functools
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from tornado import gen
+from tornado.iostream import StreamClosedError
+from tornado.web import RequestHandler, stream_request_body
+
+from .. import aspect, HttpException, Http400BadRequest, \
+	Http405MethodNotAllowed, Http413PayloadTooLarge
+from .. import metrics
+from ..headers import add_vary
+from ..admission import ConcurrencyLimiter
+from ..executors import run_in_executor
+from .caching import ResponseCache
+from .coalescing import SingleFlight
+from .dispatch import RouteDispatcher
+from .multipart import MultipartParser, get_boundary
+from .streaming import BodyStream, is_streamed_content_type, \
+	is_response_stream, get_stream_format
 
 logger = logging.getLogger(__name__)
 
@@ -42,8 +60,82 @@ class Handler:						# pylint: disable=too-few-public-methods
 		   ``hasattr(self, '_get')``), but by far the easiest and cleanest way
 		   to do this is to provide a second base class that stubs out the
 		   optional/required methods that endpoint handlers can implement.
+
+		Route options
+		-------------
+
+		The class attributes below can be overridden by subclasses, or
+		per-route by passing them as keyword arguments to ``@route``.
+
+		stream_body: bool (default: False). If True, request bodies of
+			streamed content types (``audio/*``, ``video/*`` and
+			``application/octet-stream``) are not buffered. Instead, the
+			handler is started as soon as the headers arrive and the
+			``payload`` aspect yields a ``BodyStream`` of chunks.
+			``multipart/form-data`` bodies are parsed as they arrive, with
+			large parts spooled to disk, and the ``payload`` aspect yields a
+			``MultipartForm`` of ``Part`` objects. Other content types are
+			buffered as usual.
+		max_body_size: int (default: None). The maximum size, in bytes, of a
+			request body. Requests whose ``Content-Length`` is larger are
+			rejected with a 413 as soon as their headers arrive, before any
+			of the body is read (and without a ``100 Continue`` for clients
+			which wait for one); for bodies without a ``Content-Length``,
+			the connection is closed once they exceed it. It may be smaller
+			or larger than the server-wide ``max_buffer_size``. If None, the
+			server-wide limit applies.
+		stream_buffer_size: int (default: 1 MiB). The number of unconsumed
+			bytes of a streamed body at which reading from the client
+			pauses until the handler catches up.
+		multipart_spool_size: int (default: 1 MiB). On ``stream_body``
+			routes, parts of ``multipart/form-data`` bodies larger than this
+			are written to temporary files instead of being kept in memory.
+		stream_format: str or StreamFormat (default: None). How to send the
+			items when a handler returns an iterator or asynchronous
+			iterator (such as an async generator) instead of a value: 'json'
+			(a JSON array), 'ndjson' (newline-delimited JSON) or 'sse'
+			(server-sent events). Each item is sent as soon as it is
+			produced, using chunked transfer encoding. If None, the format
+			is chosen from the request's ``Accept`` header, defaulting to a
+			JSON array.
+		response_cache: ResponseCache or True (default: None). Caches the
+			responses to GET requests (True uses the ``ResponseCache``
+			defaults). The ``@cache_response`` decorator on ``_get`` does
+			the same.
+		coalesce: SingleFlight or True (default: None). Coalesces identical
+			GET requests which arrive while one is already being handled,
+			so that they share its response instead of repeating the work
+			(True uses the ``SingleFlight`` defaults). With a
+			``response_cache``, this applies to cache misses.
+		concurrency_limit: int or ConcurrencyLimiter (default: None). Limits
+			how many requests to the route are handled at once; excess
+			requests queue briefly and are then shed with a 503. An int is
+			the limit for a ``ConcurrencyLimiter`` with default settings.
+			This applies in addition to the server-wide limit set with
+			``create_server(max_concurrency=...)``.
+		rate_limit: RateLimiter (default: None). Limits how often each
+			client (by default, each client address) may call the route.
+			Requests over the limit get a 429.
+		executor: str or Executor (default: None). If set, handler methods
+			which are regular (not ``async``) functions are run in this
+			executor, instead of on the event loop: 'thread' for the managed
+			thread pool (see ``quack.executors``), or a thread-based
+			``Executor``. To run CPU-bound work in a process pool, decorate
+			a module-level function with ``@offload('process')`` and await
+			it from the handler.
 	"""
 
+	stream_body = False
+	max_body_size = None
+	stream_buffer_size = 1024*1024
+	multipart_spool_size = 1024*1024
+	stream_format = None
+	response_cache = None
+	coalesce = None
+	concurrency_limit = None
+	rate_limit = None
+	executor = None
+
 	# pylint: disable=no-self-use,unused-argument
 
 	#######################################################################
@@ -73,8 +165,17 @@ class Handler:						# pylint: disable=too-few-public-methods
 	# pylint: enable=no-self-use,unused-argument
 
 ###############################################################################
-def _create_tornado_handler(handler_class):
+def _create_tornado_handler(handler_class, options=None, name=None):
 	""" Creates a new Tornado request handler.
+
+		Arguments
+		---------
+
+		handler_class: Handler subclass. The class registered with ``@route``.
+		options: dict (default: None). Route options which override the
+			class attributes of ``handler_class``.
+		name: str (default: None). The name of the route in metrics. Defaults
+			to the name of ``handler_class``.
 	"""
 
 	###########################################################################
@@ -82,6 +183,21 @@ def _create_tornado_handler(handler_class):
 		""" Magically created Tornado handler.
 		"""
 
+		_body_chunks = None
+		_body_stream = None
+		_stream_task = None
+		_multipart = None
+		_admitted = None
+		_route_name = name or handler_class.__name__
+		_metrics_start = None
+		_metrics_size = 0
+		_profile = None
+		_profiled_func = None
+		_cleaned_up = False
+		# Whether the body is received by ``data_received``, so that the
+		# request can be prepared before it arrives.
+		_streaming = False
+
 		#######################################################################
 		def set_default_headers(self):
 			""" Sets the default headers.
@@ -107,69 +223,452 @@ def _create_tornado_handler(handler_class):
 		#######################################################################
 		@aspect('model_renderer')
 		def render_data(self, data, model_renderer=None):
-			""" Renders data.
+			""" Renders data, and sets the response's content type to match.
 			"""
+			content_type = getattr(model_renderer, 'content_type', None)
+			if content_type:
+				self.set_header('Content-Type', content_type)
+				add_vary(self._headers, 'Accept')
 			return model_renderer.render(data)
 
+		#######################################################################
+		def _write_exception(self, exception):
+			""" Turns an HTTP exception into a response.
+			"""
+			if self._finished:
+				return
+			for k, v in exception.headers.items():
+				self.set_header(k, v)
+			self.set_status(exception.code)
+			if exception.response:
+				self.write(self.render_data(exception.response))
+
+		#######################################################################
+		async def _write_stream(self, items):
+			""" Sends the items of an iterator as they are produced, waiting
+				for each one to be flushed to the client before producing the
+				next.
+			"""
+			stream_format = get_stream_format(self.stream_format,
+				self.request.headers.get('Accept'))
+			self.set_header('Content-Type', stream_format.content_type)
+			if self.stream_format is None:
+				# The format was negotiated.
+				add_vary(self._headers, 'Accept')
+			self.set_header('Cache-Control', 'no-cache')
+
+			first = True
+			try:
+				if hasattr(items, '__anext__'):
+					async for item in items:
+						chunk = stream_format.item(item, first)
+						self.write(stream_format.start() + chunk if first else chunk)
+						first = False
+						await self.flush()
+				else:
+					for item in items:
+						chunk = stream_format.item(item, first)
+						self.write(stream_format.start() + chunk if first else chunk)
+						first = False
+						await self.flush()
+			except StreamClosedError:
+				raise
+			except Exception as exception:
+				# Before anything has been sent, a normal error response is
+				# still possible.
+				if first:
+					raise
+				if isinstance(exception, HttpException):
+					logger.warning('Streamed response failed with HTTP %s.',
+						exception.code)
+					response = exception.response
+				else:
+					logger.exception('Streamed response failed.')
+					response = None
+				chunk = stream_format.error(response or {
+					'result' : 'failure',
+					'reason' : 'The response stream failed.'
+				})
+				if chunk is None:
+					self.request.connection.stream.close()
+				else:
+					self.finish(chunk)
+				return
+			finally:
+				close = getattr(items, 'aclose', None)
+				if close is not None:
+					await close()
+				elif hasattr(items, 'close'):
+					items.close()
+
+			if first:
+				self.write(stream_format.start())
+			self.write(stream_format.end())
+
 		#######################################################################
 		async def _handle(self, func, *args, **kwargs):
 			""" Handler for all requests.
 			"""
 			try:
-				result = await func(*args, **kwargs)
-				self.write(self.render_data(result))
+				if self.executor is not None and \
+						not inspect.iscoroutinefunction(func):
+					result = await run_in_executor(self.executor, func,
+						*args, **kwargs)
+				else:
+					result = await func(*args, **kwargs)
+				if is_response_stream(result):
+					await self._write_stream(result)
+				else:
+					self.write(self.render_data(result))
 			except HttpException as exception:
-				for k, v in exception.headers.items():
-					self.set_header(k, v)
-				self.set_status(exception.code)
-				if exception.response:
-					self.finish(self.render_data(exception.response))
+				self._write_exception(exception)
+			except StreamClosedError:
+				logger.debug('Client closed the connection.')
 			except:								# pylint: disable=bare-except
 				logger.exception('Failed to handle request.')
 				self.set_status(500)
 
+		#######################################################################
+		def prepare(self):
+			""" Called once the request headers have arrived. When streaming
+				is enabled, this is before the body has been read.
+			"""
+			if metrics.is_enabled():
+				metrics.request_started(self)
+
+			profiler = self.application.settings.get('profiler')
+			if profiler is not None:
+				self._profile = profiler.start(self)
+
+			rate_limit = self.rate_limit
+			if self.request.method == 'OPTIONS':
+				rate_limit = None
+			limiters = self._get_limiters()
+			if rate_limit is not None or limiters:
+				return self._admit(rate_limit, limiters)
+
+			if self._streaming:
+				self._prepare_stream()
+			return None
+
+		#######################################################################
+		def _get_limiters(self):
+			""" Returns the concurrency limiters which apply to this request.
+			"""
+			if self.request.method == 'OPTIONS':
+				return ()
+			limiters = ()
+			limiter = self.application.settings.get('concurrency_limiter')
+			if limiter is not None:
+				limiters += (limiter, )
+			if self.concurrency_limit is not None:
+				limiters += (self.concurrency_limit, )
+			return limiters
+
+		#######################################################################
+		async def _admit(self, rate_limit, limiters):
+			""" Checks the request against the rate limit, waits for it to be
+				admitted by each concurrency limiter in turn, and then carries
+				on preparing the request.
+			"""
+			self._admitted = []
+			try:
+				if rate_limit is not None:
+					await rate_limit.check(self)
+				for limiter in limiters:
+					await limiter.acquire()
+					if self._cleaned_up:
+						# The client went away while the request was queued.
+						limiter.release()
+						self.finish()
+						return
+					self._admitted.append((limiter, time.monotonic()))
+			except HttpException as exception:
+				self._write_exception(exception)
+				if not self._finished:
+					self.finish()
+				return
+
+			if self._streaming:
+				self._prepare_stream()
+
+		#######################################################################
+		def _release(self):
+			""" Releases the request's concurrency limiter slots.
+			"""
+			admitted, self._admitted = self._admitted, None
+			now = time.monotonic()
+			for limiter, start in reversed(admitted):
+				limiter.release(now - start)
+
+		#######################################################################
+		def _prepare_stream(self):
+			""" Prepares to receive the request body on a streaming route,
+				or on a route with its own body size limit.
+			"""
+			if self.max_body_size is not None:
+				# Tornado enforces the limit as the body arrives, and refuses
+				# to read an oversized body at all (closing the connection).
+				self.request.connection.set_max_body_size(self.max_body_size)
+				try:
+					length = int(self.request.headers.get('Content-Length', 0))
+				except ValueError:
+					# Tornado rejects malformed lengths itself.
+					length = 0
+				if length > self.max_body_size:
+					self._write_exception(Http413PayloadTooLarge())
+					if not self._finished:
+						self.finish()
+					return
+
+			if not self.stream_body:
+				self._body_chunks = []
+				return
+
+			func = getattr(self, '_{}'.format(self.request.method.lower()), None)
+			content_type = self.request.headers.get('Content-Type')
+			boundary = get_boundary(content_type)
+			if func is not None and boundary is not None:
+				self._multipart = MultipartParser(boundary,
+					spool_size=self.multipart_spool_size)
+				return
+			if func is None or not is_streamed_content_type(content_type):
+				self._body_chunks = []
+				return
+
+			# Start the handler now, so that processing overlaps with the
+			# upload. ``convert_yielded`` runs it the same way Tornado would
+			# run an HTTP method.
+			self._body_stream = BodyStream(self.stream_buffer_size)
+			self._stream_task = gen.convert_yielded(
+				self._handle(func, *self.path_args, **self.path_kwargs)
+			)
+			self._stream_task.add_done_callback(
+				lambda _: self._body_stream.discard()
+			)
+
+		#######################################################################
+		def flush(self, include_footers=False, callback=None):
+			""" Sends buffered output to the client.
+			"""
+			if self._metrics_start is not None:
+				# pylint: disable=protected-access
+				self._metrics_size += sum(
+					len(chunk) for chunk in self._write_buffer)
+				# pylint: enable=protected-access
+			return super().flush(include_footers, callback)
+
+		#######################################################################
+		def on_finish(self):
+			""" Called once the response has been sent.
+			"""
+			super().on_finish()
+			self._cleanup()
+			if self._profile is not None:
+				self.application.settings['profiler'].finish(self,
+					self._profile, self._profiled_func)
+				self._profile = None
+
+		#######################################################################
+		def _cleanup(self):
+			""" Releases what the request holds. This runs once, when the
+				response has been sent or when the client goes away, whichever
+				comes first: Tornado does not call ``on_finish`` if the client
+				disconnects while a streamed body is being received.
+			"""
+			if self._cleaned_up:
+				return
+			self._cleaned_up = True
+			if self._multipart is not None:
+				self._multipart.form.close()
+			if self._admitted:
+				self._release()
+			if self._metrics_start is not None:
+				metrics.request_finished(self)
+
+		#######################################################################
+		def data_received(self, chunk):
+			""" Receives a chunk of a streamed request body.
+			"""
+			if self._body_stream is not None:
+				return self._body_stream.feed(chunk)
+			if self._multipart is not None:
+				self._multipart.feed(chunk)
+			elif self._body_chunks is not None:
+				self._body_chunks.append(chunk)
+			return None
+
+		#######################################################################
+		def on_connection_close(self):
+			""" Called if the client goes away before the request finishes.
+			"""
+			super().on_connection_close()
+			if self._body_stream is not None:
+				self._body_stream.abort(StreamClosedError())
+			self._cleanup()
+
+		#######################################################################
+		async def _dispatch(self, func, *args, **kwargs):
+			""" Runs the handler once the request body has been received.
+			"""
+			if self._stream_task is not None:
+				self._body_stream.close()
+				return (await self._stream_task)
+
+			if self._multipart is not None:
+				self.request.body = b''
+				try:
+					self._multipart.close()
+				except ValueError as exception:
+					self._write_exception(Http400BadRequest({
+						'result' : 'failure',
+						'reason' : 'Bad multipart/form-data submitted: {}'.format(
+							exception)
+					}))
+					return None
+
+			if self._body_chunks is not None:
+				# pylint: disable=protected-access
+				self.request.body = b''.join(self._body_chunks)
+				self._body_chunks = None
+				self.request._parse_body()
+				# pylint: enable=protected-access
+
+			if self._profile is not None:
+				self._profiled_func = func
+				return (await self._profile.run(
+					self._handle(func, *args, **kwargs)))
+			return (await self._handle(func, *args, **kwargs))
+
 		#######################################################################
 		async def get(self, *args, **kwargs):
 			""" Handle a GET request.
 			"""
-			return (await self._handle(self._get, *args, **kwargs))
+			dispatch = self._dispatch
+			if self.coalesce is not None:
+				dispatch = functools.partial(self.coalesce.serve, self,
+					self._dispatch)
+			response_cache = self.response_cache or \
+				getattr(self._get, 'response_cache', None)
+			if response_cache is not None:
+				return (await response_cache.serve(
+					self, dispatch, self._get, *args, **kwargs))
+			return (await dispatch(self._get, *args, **kwargs))
 
 		#######################################################################
 		async def post(self, *args, **kwargs):
 			""" Handle a POST request.
 			"""
-			return (await self._handle(self._post, *args, **kwargs))
+			return (await self._dispatch(self._post, *args, **kwargs))
 
 		#######################################################################
 		async def put(self, *args, **kwargs):
 			""" Handle a PUT request.
 			"""
-			return (await self._handle(self._put, *args, **kwargs))
+			return (await self._dispatch(self._put, *args, **kwargs))
 
 		#######################################################################
 		async def delete(self, *args, **kwargs):
 			""" Handle a DELETE request.
 			"""
-			return (await self._handle(self._delete, *args, **kwargs))
+			return (await self._dispatch(self._delete, *args, **kwargs))
+
+	for key, value in (options or {}).items():
+		setattr(AutoHandler, key, value)
+	if AutoHandler.response_cache is True:
+		AutoHandler.response_cache = ResponseCache()
+	if AutoHandler.coalesce is True:
+		AutoHandler.coalesce = SingleFlight()
+	if AutoHandler.executor == 'process' or \
+			isinstance(AutoHandler.executor, ProcessPoolExecutor):
+		raise ValueError('Handler methods cannot run in a process pool; use '
+			'@offload("process") on a module-level function instead.')
+	if isinstance(AutoHandler.concurrency_limit, int):
+		AutoHandler.concurrency_limit = ConcurrencyLimiter(
+			AutoHandler.concurrency_limit)
+	if AutoHandler.stream_body or AutoHandler.max_body_size is not None:
+		AutoHandler._streaming = True			# pylint: disable=protected-access
+		stream_request_body(AutoHandler)
 
 	return AutoHandler
 
+###############################################################################
+# A route registered with ``@route``. ``pattern`` is the route's regular
+# expression; ``template`` is the URL it was declared with, or None for
+# ``regexp=`` routes.
+RouteSpec = namedtuple('RouteSpec', ('pattern', 'handler', 'options',
+	'template'))
+
+# The Tornado handler built for each route, keyed by (pattern, handler class),
+# along with the options it was built with. Routes are only built once, however
+# often ``get_routes`` or ``get_dispatcher`` is called, so that each route's
+# state (such as its concurrency limiter) is shared.
+_tornado_handlers = {}							# pylint: disable=invalid-name
+
+###############################################################################
+def _get_tornado_handler(spec):
+	""" Returns the Tornado handler for a route, building it on first use.
+	"""
+	key = (spec.pattern, spec.handler)
+	cached = _tornado_handlers.get(key)
+	if cached is not None and cached[0] is spec.options:
+		return cached[1]
+	handler = _create_tornado_handler(spec.handler, spec.options,
+		spec.template or spec.pattern)
+	_tornado_handlers[key] = (spec.options, handler)
+	return handler
+
 ###############################################################################
 def get_routes(prefix=None):
 	""" Gets the list of all Tornado routes / endpoints that have been
-		registered.
+		registered, in the order in which they were registered.
 
 		Arguments
 		---------
 
 		prefix: str (default: None). The base URL to prefix all endpoints with.
 	"""
-	return {
-		('{}{}'.format(prefix or '', route), _create_tornado_handler(handler))
-		for route, handler in get_routes.routes
-	}
+	return [
+		(
+			'{}{}'.format(prefix or '', spec.pattern),
+			_get_tornado_handler(spec)
+		)
+		for spec in get_routes.routes
+	]
 get_routes.routes = []
 
+###############################################################################
+def get_dispatcher(prefix=None):
+	""" Compiles all of the registered routes into a ``RouteDispatcher``,
+		which matches requests in time independent of the number of routes.
+
+		The dispatcher is a Tornado router. Before use, its ``application``
+		attribute must be set to the Tornado application it serves:
+
+		.. code-block:: python
+
+			dispatcher = get_dispatcher()
+			app = tornado.web.Application([
+				tornado.routing.Rule(tornado.routing.AnyMatches(), dispatcher)
+			])
+			dispatcher.application = app
+
+		Arguments
+		---------
+
+		prefix: str (default: None). The base URL to prefix all endpoints with.
+	"""
+	prefix = prefix or ''
+	dispatcher = RouteDispatcher(route.param_re)
+	for spec in get_routes.routes:
+		dispatcher.add(
+			_get_tornado_handler(spec),
+			template=None if spec.template is None \
+				else prefix + spec.template,
+			pattern=prefix + spec.pattern
+		)
+	return dispatcher
+
 ###############################################################################
 def _get_param_string(param, valid_type):
 	""" Formats a regex capture group.
@@ -177,14 +676,30 @@ def _get_param_string(param, valid_type):
 	return '(?P<{}>{}+?)'.format(param, r'\d' if valid_type == 'int' else '.')
 
 ###############################################################################
-def route(url=None, regexp=None):
+def route(url=None, regexp=None, **options):
 	""" Registers a route / endpoint.
+
+		Arguments
+		---------
+
+		url: str (default: None). The URL to route, which may contain
+			``<name:type>`` parameters. ``<name:int>`` parameters match a
+			path segment of digits; other parameters match any text,
+			including slashes.
+		regexp: str (default: None). A regular expression to route instead.
+		options: Route options, which override the ``Handler`` class
+			attributes of the same name for this route only. See ``Handler``.
 	"""
+	for key in options:
+		if key.startswith('_') or not hasattr(Handler, key):
+			raise ValueError('Unknown route option: {}'.format(key))
+
 	if url is None and regexp is None:
 		raise ValueError('Must supply either url or regexp')
 	if (url is None) == (regexp is None):
 		raise ValueError('Must supply either url or regexp, not both')
 
+	template = url
 	if url:
 		for match in route.param_re.finditer(url):
 			x = match.groupdict()
@@ -199,7 +714,7 @@ def route(url=None, regexp=None):
 	def decorator(cls):
 		""" Registers the route.
 		"""
-		get_routes.routes.append((url, cls))
+		get_routes.routes.append(RouteSpec(url, cls, options, template))
 		return cls
 	return decorator
 
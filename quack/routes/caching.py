@@ -0,0 +1,233 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import time
+import hashlib
+import email.utils
+from collections import namedtuple
+
+from ..cache import LRUCache
+
+# Response headers which are never replayed from the cache.
+_UNCACHED_HEADERS = frozenset(('date', 'server', 'content-length', 'etag',
+	'last-modified', 'transfer-encoding', 'ratelimit-limit',
+	'ratelimit-remaining', 'ratelimit-reset'))
+
+###############################################################################
+# A cached response. ``headers`` is a list of (name, value) pairs.
+CachedResponse = namedtuple('CachedResponse', ('body', 'headers', 'etag',
+	'last_modified'))
+
+###############################################################################
+def request_key(handler, query=True, headers=(), per_user=False, key=None):
+	""" Computes a key which identifies equivalent requests, or returns None
+		if the request should not be shared with other requests.
+
+		Arguments
+		---------
+
+		handler: RequestHandler. The request's handler.
+		query: bool (default: True). Whether the query string is part of the
+			key.
+		headers: list of str (default: ()). Request headers whose values are
+			part of the key.
+		per_user: bool (default: False). If False, requests with an
+			``Authorization`` header are never shared. If True, their
+			credentials are part of the key.
+		key: callable (default: None). If given, called with the handler to
+			compute an extra component of the key.
+	"""
+	request = handler.request
+	authorization = request.headers.get('Authorization')
+	if authorization and not per_user:
+		return None
+
+	result = [request.method, request.path]
+	if query:
+		result.append(request.query)
+	for header in headers:
+		result.append(request.headers.get(header))
+	if per_user:
+		result.append(hashlib.sha256(
+			(authorization or '').encode('utf-8')).digest())
+	if key is not None:
+		result.append(key(handler))
+	return tuple(result)
+
+###############################################################################
+def capture_response(handler):
+	""" Returns the (status, headers, body) of the response that a handler
+		has buffered, or None if it has already been sent. ``headers`` is a
+		list of (name, value) pairs, omitting those which are specific to
+		the individual response.
+	"""
+	# pylint: disable=protected-access
+	if handler._finished or handler._headers_written:
+		return None
+	body = b''.join(handler._write_buffer)
+	headers = [
+		(name, value) for name, value in handler._headers.get_all()
+		if name.lower() not in _UNCACHED_HEADERS
+	]
+	# pylint: enable=protected-access
+	return handler.get_status(), headers, body
+
+###############################################################################
+def replay_headers(handler, headers):
+	""" Sets the headers of a captured response on another handler.
+	"""
+	for name in {name for name, _ in headers}:
+		handler.clear_header(name)
+	for name, value in headers:
+		handler.add_header(name, value)
+
+###############################################################################
+class ResponseCache:
+	""" Caches the rendered responses of GET requests.
+
+		Successful (200) responses are cached, keyed by the request path and,
+		optionally, its query string and selected request headers. Cached
+		responses carry a strong ``ETag`` and a ``Last-Modified`` date, and
+		conditional requests (``If-None-Match``/``If-Modified-Since``) that
+		match get a 304 without the handler running at all.
+
+		Requests with an ``Authorization`` header bypass the cache unless
+		``per_user`` is set, in which case responses are only shared between
+		requests with identical credentials.
+
+		Use it as a route option, or decorate ``_get`` with
+		``@cache_response``:
+
+		.. code-block:: python
+
+			@route('/dashboard', response_cache=ResponseCache(ttl=5))
+			class Dashboard(Handler):
+				async def _get(self):
+					...
+	"""
+
+	###########################################################################
+	def __init__(self, ttl=60, maxsize=1024, query=True, headers=('Accept', ),
+		per_user=False, key=None):
+		""" Creates a new response cache.
+
+			Arguments
+			---------
+
+			ttl: float (default: 60). How long responses are cached for, in
+				seconds.
+			maxsize: int (default: 1024). The maximum number of cached
+				responses; the least-recently-used are evicted first.
+			query: bool (default: True). Whether the query string is part of
+				the cache key.
+			headers: list of str (default: ('Accept', )). Request headers whose
+				values are part of the cache key.
+			per_user: bool (default: False). Whether to cache responses to
+				authenticated requests, keyed by their credentials.
+			key: callable (default: None). If given, called with the handler
+				to compute an extra component of the cache key.
+		"""
+		super().__init__()
+		self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+		self.query = query
+		self.headers = tuple(headers or ())
+		self.per_user = per_user
+		self.key = key
+
+	###########################################################################
+	def make_key(self, handler):
+		""" Computes the cache key for a request, or returns None if the
+			request should not use the cache.
+		"""
+		return request_key(handler, self.query, self.headers, self.per_user,
+			self.key)
+
+	###########################################################################
+	@staticmethod
+	def _capture(handler):
+		""" Captures the response that a handler has just produced, or returns
+			None if it cannot be cached.
+		"""
+		response = capture_response(handler)
+		if response is None or response[0] != 200:
+			return None
+		_, headers, body = response
+		return CachedResponse(
+			body=body,
+			headers=headers,
+			etag='"{}"'.format(hashlib.sha1(body).hexdigest()),
+			last_modified=time.time()
+		)
+
+	###########################################################################
+	@staticmethod
+	def _set_validators(handler, entry):
+		""" Sets the ``ETag`` and ``Last-Modified`` headers of a response.
+		"""
+		handler.set_header('Etag', entry.etag)
+		handler.set_header('Last-Modified', email.utils.formatdate(
+			entry.last_modified, usegmt=True))
+
+	###########################################################################
+	@staticmethod
+	def _not_modified(handler, entry):
+		""" Returns True if the client's copy of the response is current.
+		"""
+		if handler.request.headers.get('If-None-Match'):
+			return handler.check_etag_header()
+
+		since = handler.request.headers.get('If-Modified-Since')
+		if since:
+			since = email.utils.parsedate_tz(since)
+			if since is not None:
+				return int(entry.last_modified) <= email.utils.mktime_tz(since)
+		return False
+
+	###########################################################################
+	async def serve(self, handler, func, *args, **kwargs):
+		""" Serves a GET request from the cache, calling ``func`` (which
+			writes the response to the handler) only on a cache miss.
+		"""
+		key = self.make_key(handler)
+		if key is None:
+			return (await func(*args, **kwargs))
+
+		entry = self.cache.get(key)
+		if entry is None:
+			result = await func(*args, **kwargs)
+			entry = self._capture(handler)
+			if entry is None:
+				return result
+			self.cache.set(key, entry)
+			fresh = True
+		else:
+			fresh = False
+
+		self._set_validators(handler, entry)
+		if self._not_modified(handler, entry):
+			handler.clear()
+			handler.set_status(304)
+			self._set_validators(handler, entry)
+			return None
+
+		if not fresh:
+			replay_headers(handler, entry.headers)
+			handler.write(entry.body)
+		return None
+
+###############################################################################
+def cache_response(**kwargs):
+	""" Decorator which caches the responses of a ``_get`` method. Takes the
+		same arguments as ``ResponseCache``.
+	"""
+	response_cache = ResponseCache(**kwargs)
+	###########################################################################
+	def decorator(func):
+		""" Attaches the cache to the method.
+		"""
+		func.response_cache = response_cache
+		return func
+	return decorator
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
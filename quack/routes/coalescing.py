@@ -0,0 +1,117 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import asyncio
+import logging
+
+from .caching import request_key, capture_response, replay_headers
+
+logger = logging.getLogger(__name__)
+
+###############################################################################
+class SingleFlight:
+	""" Coalesces identical GET requests which are in flight at the same time.
+
+		The first request for a key (the leader) is handled as usual. Requests
+		for the same key which arrive before it finishes (the followers) wait
+		for it instead of doing the same work again, and then send the
+		leader's response: the same status, headers and body, rendered once.
+		Errors are shared the same way, so if the leader fails with, say, a
+		404, so do its followers.
+
+		Nothing is kept once the leader finishes; to also reuse responses
+		afterwards, combine this with a ``ResponseCache``. If the leader's
+		response cannot be shared (because it was streamed, or the handler
+		finished it itself) or the leader goes away, the followers are
+		handled on their own.
+
+		Enable it on a route with the ``coalesce`` option:
+
+		.. code-block:: python
+
+			@route('/report', coalesce=SingleFlight(headers=('Accept', )))
+			class Report(Handler):
+				async def _get(self):
+					...
+	"""
+
+	###########################################################################
+	def __init__(self, query=True, headers=('Accept', ), per_user=False,
+		key=None):
+		""" Creates a new single-flight group.
+
+			Arguments
+			---------
+
+			query: bool (default: True). Whether the query string is part of
+				the key.
+			headers: list of str (default: ('Accept', )). Request headers whose
+				values are part of the key.
+			per_user: bool (default: False). Whether to coalesce authenticated
+				requests, keyed by their credentials.
+			key: callable (default: None). If given, called with the handler
+				to compute an extra component of the key.
+		"""
+		super().__init__()
+		self.query = query
+		self.headers = tuple(headers or ())
+		self.per_user = per_user
+		self.key = key
+		self.coalesced = 0
+		self._flights = {}
+
+	###########################################################################
+	@property
+	def in_flight(self):
+		""" The number of keys which are currently being computed.
+		"""
+		return len(self._flights)
+
+	###########################################################################
+	def make_key(self, handler):
+		""" Computes the key for a request, or returns None if the request
+			should not be coalesced.
+		"""
+		return request_key(handler, self.query, self.headers, self.per_user,
+			self.key)
+
+	###########################################################################
+	async def serve(self, handler, func, *args, **kwargs):
+		""" Serves a GET request, calling ``func`` (which writes the response
+			to the handler) only if no identical request is in flight.
+		"""
+		key = self.make_key(handler)
+		if key is None:
+			return (await func(*args, **kwargs))
+
+		flight = self._flights.get(key)
+		if flight is not None:
+			self.coalesced += 1
+			response = await asyncio.shield(flight)
+			if response is None:
+				return (await func(*args, **kwargs))
+			status, reason, headers, body = response
+			handler.set_status(status, reason)
+			replay_headers(handler, headers)
+			handler.write(body)
+			return None
+
+		flight = asyncio.get_event_loop().create_future()
+		self._flights[key] = flight
+		response = None
+		try:
+			result = await func(*args, **kwargs)
+			captured = capture_response(handler)
+			if captured is not None:
+				status, headers, body = captured
+				# pylint: disable=protected-access
+				response = (status, handler._reason, headers, body)
+				# pylint: enable=protected-access
+			return result
+		finally:
+			if self._flights.get(key) is flight:
+				del self._flights[key]
+			flight.set_result(response)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,213 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import re
+import logging
+
+from tornado.escape import url_unescape
+from tornado.routing import Router
+
+logger = logging.getLogger(__name__)
+
+# Characters which mean that a URL template is really a regular expression.
+_REGEX_CHARS = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+###############################################################################
+class _Node:						# pylint: disable=too-few-public-methods
+	""" A node of the routing trie, corresponding to one path segment.
+	"""
+
+	__slots__ = ('literals', 'params', 'tails', 'handler')
+
+	###########################################################################
+	def __init__(self):
+		""" Creates a new, empty node.
+		"""
+		self.literals = {}
+		self.params = []
+		self.tails = []
+		self.handler = None
+
+###############################################################################
+class RouteDispatcher(Router):
+	""" Routes requests to the handlers registered with ``@route``.
+
+		Routes declared with ``url=`` are compiled into a trie with one level
+		per path segment, so matching costs time proportional to the length
+		of the path rather than to the number of routes. At each level,
+		literal segments take precedence over parameters, which take
+		precedence over a trailing parameter that consumes the rest of the
+		path; ties go to the route registered first.
+
+		``<name:int>`` parameters match one segment of digits. Other
+		parameters match any text, including slashes, so they only go into
+		the trie in the last position, where they match the remainder of the
+		path. Routes with such a parameter elsewhere, routes declared with
+		``regexp=``, and routes whose URL uses other regular expression
+		syntax are matched with their regular expressions afterwards, in the
+		order in which they were registered.
+
+		Use ``get_dispatcher`` to create one.
+	"""
+
+	###########################################################################
+	def __init__(self, param_re):
+		""" Creates a new, empty dispatcher.
+
+			Arguments
+			---------
+
+			param_re: compiled regex. Matches ``<name:type>`` parameters.
+		"""
+		super().__init__()
+		self.param_re = param_re
+		self.application = None
+		self._root = _Node()
+		self._regexes = []
+
+	###########################################################################
+	def add(self, handler, template=None, pattern=None):
+		""" Adds a route.
+
+			Arguments
+			---------
+
+			handler: RequestHandler subclass. The handler to dispatch to.
+			template: str (default: None). A URL template, possibly with
+				``<name:type>`` parameters.
+			pattern: str (default: None). The equivalent regular expression,
+				used if the template cannot be compiled into the trie (or if
+				there is no template).
+		"""
+		if template is not None and self._add_template(handler, template):
+			return
+		if pattern is None:
+			raise ValueError('Cannot route: {}'.format(template))
+		if not pattern.endswith('$'):
+			pattern += '$'
+		self._regexes.append((re.compile(pattern), handler))
+
+	###########################################################################
+	def _add_template(self, handler, template):
+		""" Adds a route to the trie. Returns False if the template is not a
+			plain sequence of literal and parameter segments, or has a
+			parameter which may span segments before its last segment.
+		"""
+		segments = template.split('/')
+		steps = []
+		for index, segment in enumerate(segments):
+			param = self.param_re.fullmatch(segment)
+			if param is not None:
+				name, valid_type = param.group('param', 'type')
+				if valid_type == 'int':
+					steps.append(('param', name, str.isdecimal))
+				elif index == len(segments) - 1:
+					steps.append(('tail', name, None))
+				else:
+					return False
+			elif '<' in segment or _REGEX_CHARS.search(segment):
+				return False
+			else:
+				steps.append(('literal', segment, None))
+
+		node = self._root
+		for kind, value, matcher in steps:
+			if kind == 'literal':
+				node = node.literals.setdefault(value, _Node())
+			elif kind == 'param':
+				for name, existing_matcher, child in node.params:
+					if name == value and existing_matcher is matcher:
+						node = child
+						break
+				else:
+					child = _Node()
+					node.params.append((value, matcher, child))
+					node = child
+			else:
+				node.tails.append((value, handler))
+				return True
+
+		if node.handler is None:
+			node.handler = handler
+		else:
+			logger.warning('Route is shadowed by an earlier route: %s',
+				template)
+		return True
+
+	###########################################################################
+	def _match_node(self, node, segments, index, params):
+		""" Matches the remaining path segments against a trie node.
+		"""
+		if index == len(segments):
+			return node.handler
+
+		segment = segments[index]
+		child = node.literals.get(segment)
+		if child is not None:
+			handler = self._match_node(child, segments, index + 1, params)
+			if handler is not None:
+				return handler
+
+		for name, matcher, child in node.params:
+			if matcher(segment):
+				params[name] = segment
+				handler = self._match_node(child, segments, index + 1, params)
+				if handler is not None:
+					return handler
+				del params[name]
+
+		if node.tails and segment:
+			name, handler = node.tails[0]
+			params[name] = '/'.join(segments[index:])
+			return handler
+
+		return None
+
+	###########################################################################
+	def match(self, path):
+		""" Finds the handler for a path.
+
+			Returns a (handler, path_kwargs, path_args) tuple, or None if no
+			route matches. Parameter values are still percent-encoded.
+		"""
+		params = {}
+		handler = self._match_node(self._root, path.split('/'), 0, params)
+		if handler is not None:
+			return handler, params, []
+
+		for regex, handler in self._regexes:
+			match = regex.match(path)
+			if match is None:
+				continue
+			if regex.groupindex:
+				return handler, match.groupdict(), []
+			return handler, {}, list(match.groups())
+
+		return None
+
+	###########################################################################
+	def find_handler(self, request, **kwargs):
+		""" Implements ``tornado.routing.Router.find_handler``.
+		"""
+		result = self.match(request.path)
+		if result is None:
+			return None
+		handler, path_kwargs, path_args = result
+		return self.application.get_handler_delegate(
+			request, handler,
+			path_args=[_unquote(value) for value in path_args],
+			path_kwargs={
+				key : _unquote(value) for key, value in path_kwargs.items()
+			}
+		)
+
+###############################################################################
+def _unquote(value):
+	""" Unquotes a path parameter, as Tornado does for regex routes.
+	"""
+	if value is None:
+		return value
+	return url_unescape(value, encoding=None, plus=False)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,310 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import io
+import mmap
+import logging
+import tempfile
+from email.message import Message
+from email.utils import collapse_rfc2231_value
+
+from tornado.httputil import HTTPHeaders
+
+logger = logging.getLogger(__name__)
+
+###############################################################################
+def _parse_header(name, value):
+	""" Parses a MIME header with parameters, such as ``Content-Type``.
+		Returns an ``email.message.Message`` to read the value and the
+		parameters from.
+	"""
+	message = Message()
+	message[name] = value
+	return message
+
+###############################################################################
+def get_boundary(content_type):
+	""" Returns the boundary of a ``multipart/form-data`` content type, as
+		bytes, or None if the content type is not ``multipart/form-data`` or
+		has no boundary.
+	"""
+	if not content_type:
+		return None
+	message = _parse_header('Content-Type', content_type)
+	if message.get_content_type() != 'multipart/form-data':
+		return None
+	boundary = message.get_boundary()
+	if not boundary:
+		return None
+	return boundary.encode('latin-1')
+
+###############################################################################
+class Part:
+	""" One part of a ``multipart/form-data`` body.
+
+		The content is in ``file``: a ``BytesIO`` while it is small, which is
+		replaced by a temporary file on disk once the content grows beyond
+		the spool size.
+	"""
+
+	###########################################################################
+	def __init__(self, headers, spool_size):
+		""" Creates a new, empty part.
+
+			Arguments
+			---------
+
+			headers: HTTPHeaders. The part's headers.
+			spool_size: int. The size above which the content is written to
+				disk.
+		"""
+		super().__init__()
+		self.headers = headers
+		disposition = _parse_header('Content-Disposition',
+			headers.get('Content-Disposition', ''))
+		name = disposition.get_param('name', header='content-disposition')
+		if disposition.get_content_disposition() != 'form-data' or not name:
+			raise ValueError('Invalid multipart/form-data part.')
+		self.name = collapse_rfc2231_value(name)
+		filename = disposition.get_param('filename',
+			header='content-disposition')
+		self.filename = None if filename is None \
+			else collapse_rfc2231_value(filename)
+		self.content_type = headers.get('Content-Type',
+			'application/octet-stream' if self.filename else 'text/plain')
+		self.spool_size = spool_size
+		self.file = io.BytesIO()
+		self.size = 0
+
+	###########################################################################
+	@property
+	def in_memory(self):
+		""" Whether the content is still held in memory, rather than in a
+			file on disk.
+		"""
+		return isinstance(self.file, io.BytesIO)
+
+	###########################################################################
+	def write(self, data):
+		""" Appends data to the part.
+		"""
+		if self.in_memory and self.size + len(data) > self.spool_size:
+			spooled = tempfile.TemporaryFile()
+			with self.file.getbuffer() as buffer:
+				spooled.write(buffer)
+			self.file.close()
+			self.file = spooled
+		self.file.write(data)
+		self.size += len(data)
+
+	###########################################################################
+	def read(self):
+		""" Returns the content of the part, as ``bytes``.
+		"""
+		self.file.seek(0)
+		return self.file.read()
+
+	###########################################################################
+	def text(self, encoding='utf-8'):
+		""" Returns the content of the part, decoded as text.
+		"""
+		return self.read().decode(encoding)
+
+	###########################################################################
+	def view(self):
+		""" Returns a read-only ``memoryview`` of the content of the part,
+			without copying it: a view of the in-memory buffer, or a
+			memory-mapping of the file on disk.
+		"""
+		if not self.size:
+			return memoryview(b'')
+		if self.in_memory:
+			return self.file.getbuffer().toreadonly()
+		self.file.flush()
+		return memoryview(mmap.mmap(self.file.fileno(), 0,
+			access=mmap.ACCESS_READ))
+
+	###########################################################################
+	def close(self):
+		""" Releases the part's buffer or temporary file.
+		"""
+		try:
+			self.file.close()
+		except BufferError:
+			# A view is still in use; the buffer is freed along with it.
+			pass
+
+###############################################################################
+class MultipartForm(list):
+	""" The parts of a ``multipart/form-data`` body, in order.
+	"""
+
+	###########################################################################
+	@property
+	def files(self):
+		""" The parts which are file uploads.
+		"""
+		return [part for part in self if part.filename is not None]
+
+	###########################################################################
+	@property
+	def fields(self):
+		""" The parts which are not file uploads, as a dictionary from each
+			name to its (last) value, decoded as text.
+		"""
+		return {
+			part.name : part.text()
+			for part in self if part.filename is None
+		}
+
+	###########################################################################
+	def get(self, name, default=None):
+		""" Returns the first part with the given name.
+		"""
+		for part in self:
+			if part.name == name:
+				return part
+		return default
+
+	###########################################################################
+	def close(self):
+		""" Releases all of the parts.
+		"""
+		for part in self:
+			part.close()
+
+###############################################################################
+class MultipartParser:
+	""" Incremental ``multipart/form-data`` parser.
+
+		Chunks of the body are passed to ``feed`` as they arrive, and each
+		part's content is written straight to its ``Part`` (and so, beyond
+		``spool_size``, to disk). Apart from the parts themselves, only a
+		few bytes more than the boundary are buffered between chunks, so the
+		memory used does not depend on the size of the upload.
+	"""
+
+	_PREAMBLE, _DELIMITER, _HEADERS, _BODY, _EPILOGUE = range(5)
+
+	###########################################################################
+	def __init__(self, boundary, spool_size=1024*1024, max_parts=100,
+		max_header_size=16*1024):
+		""" Creates a new parser.
+
+			Arguments
+			---------
+
+			boundary: bytes. The boundary from the request's content type.
+			spool_size: int (default: 1 MiB). Parts larger than this are
+				written to temporary files.
+			max_parts: int (default: 100). The maximum number of parts.
+			max_header_size: int (default: 16 KiB). The maximum size of the
+				headers of each part.
+		"""
+		super().__init__()
+		self.spool_size = spool_size
+		self.max_parts = max_parts
+		self.max_header_size = max_header_size
+		self.form = MultipartForm()
+		self.error = None
+		self._delimiter = b'\r\n--' + boundary
+		self._buffer = bytearray()
+		self._state = self._PREAMBLE
+		self._part = None
+
+	###########################################################################
+	def feed(self, chunk):
+		""" Parses the next chunk of the body. Errors are recorded in
+			``error``, after which the rest of the body is ignored.
+		"""
+		if self.error is not None or self._state == self._EPILOGUE:
+			return
+		self._buffer += chunk
+		try:
+			while self._step():
+				pass
+		except ValueError as exception:
+			logger.debug('Invalid multipart/form-data: %s', exception)
+			self.error = exception
+			self._buffer = bytearray()
+
+	###########################################################################
+	def close(self):
+		""" Finishes parsing, and returns the ``MultipartForm``. Raises a
+			``ValueError`` if the body was not valid.
+		"""
+		if self.error is None and self._state != self._EPILOGUE:
+			self.error = ValueError('Incomplete multipart/form-data body.')
+		if self.error is not None:
+			self.form.close()
+			raise self.error
+		self._buffer = bytearray()
+		for part in self.form:
+			part.file.seek(0)
+		return self.form
+
+	###########################################################################
+	def _step(self):
+		""" Makes as much progress as the buffered data allows in the current
+			state. Returns True if parsing should continue.
+		"""
+		buffer = self._buffer
+
+		if self._state == self._PREAMBLE:
+			# The first delimiter need not be preceded by a line break.
+			delimiter = self._delimiter[2:]
+			index = buffer.find(delimiter)
+			if index == -1:
+				del buffer[:max(0, len(buffer) - len(delimiter) + 1)]
+				return False
+			del buffer[:index + len(delimiter)]
+			self._state = self._DELIMITER
+			return True
+
+		if self._state == self._DELIMITER:
+			if len(buffer) < 2:
+				return False
+			if buffer[:2] == b'--':
+				self._state = self._EPILOGUE
+				del buffer[:]
+				return False
+			if buffer[:2] != b'\r\n':
+				raise ValueError('Malformed boundary.')
+			del buffer[:2]
+			self._state = self._HEADERS
+			return True
+
+		if self._state == self._HEADERS:
+			index = buffer.find(b'\r\n\r\n')
+			if index == -1:
+				if len(buffer) > self.max_header_size:
+					raise ValueError('Part headers too large.')
+				return False
+			if len(self.form) >= self.max_parts:
+				raise ValueError('Too many parts.')
+			headers = HTTPHeaders.parse(bytes(buffer[:index]).decode('utf-8'))
+			del buffer[:index + 4]
+			self._part = Part(headers, self.spool_size)
+			self.form.append(self._part)
+			self._state = self._BODY
+			return True
+
+		if self._state == self._BODY:
+			index = buffer.find(self._delimiter)
+			if index == -1:
+				# Keep enough to recognize a delimiter split across chunks.
+				keep = len(self._delimiter) - 1
+				if len(buffer) > keep:
+					self._part.write(buffer[:len(buffer) - keep])
+					del buffer[:len(buffer) - keep]
+				return False
+			self._part.write(buffer[:index])
+			del buffer[:index + len(self._delimiter)]
+			self._part = None
+			self._state = self._DELIMITER
+			return True
+
+		return False
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
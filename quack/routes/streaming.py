@@ -0,0 +1,318 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import asyncio
+from abc import ABCMeta, abstractmethod
+from collections import deque
+
+from ..aspects.model import JSONRenderer
+
+###############################################################################
+# Content types whose request bodies are handed to handlers as a stream of
+# chunks (rather than being buffered) on routes that enable ``stream_body``.
+STREAMED_CONTENT_TYPES = ('audio/', 'video/', 'application/octet-stream')
+
+###############################################################################
+def is_streamed_content_type(content_type):
+	""" Returns True if request bodies with the given content type should be
+		streamed to the handler.
+	"""
+	if not content_type:
+		return False
+	content_type = content_type.split(';', 1)[0].strip().lower()
+	return content_type.startswith(STREAMED_CONTENT_TYPES)
+
+###############################################################################
+class BodyStream:
+	""" Asynchronous iterator over the chunks of a request body, as they
+		arrive from the client.
+
+		.. code-block:: python
+
+			@route('/upload', stream_body=True, max_body_size=1024**3)
+			class Upload(Handler):
+				@aspect('payload')
+				async def _post(self, payload=None):
+					content_type, stream = payload
+					async for chunk in stream:
+						process(chunk)
+
+		At most ``max_buffer_size`` bytes are held in memory at a time. Once
+		that many bytes are waiting to be consumed, the connection stops
+		reading from the socket until the handler catches up.
+	"""
+
+	###########################################################################
+	def __init__(self, max_buffer_size):
+		""" Creates a new body stream.
+
+			Arguments
+			---------
+
+			max_buffer_size: int. The number of unconsumed bytes at which the
+				producer is asked to wait.
+		"""
+		super().__init__()
+		self.max_buffer_size = max_buffer_size
+		self.bytes_received = 0
+		self._chunks = deque()
+		self._buffered = 0
+		self._closed = False
+		self._discarding = False
+		self._error = None
+		self._readable = None
+		self._writable = None
+
+	###########################################################################
+	@staticmethod
+	def _resolve(future):
+		""" Resolves a waiting future, if there is one.
+		"""
+		if future is not None and not future.done():
+			future.set_result(None)
+
+	###########################################################################
+	def feed(self, chunk):
+		""" Adds a newly received chunk to the stream.
+
+			Returns a future that the producer must wait on before feeding
+			more data if the buffer is full, or None otherwise.
+		"""
+		self.bytes_received += len(chunk)
+		if self._discarding:
+			return None
+
+		self._chunks.append(chunk)
+		self._buffered += len(chunk)
+		self._resolve(self._readable)
+
+		if self._buffered >= self.max_buffer_size:
+			if self._writable is None or self._writable.done():
+				self._writable = asyncio.get_event_loop().create_future()
+			return self._writable
+		return None
+
+	###########################################################################
+	def close(self):
+		""" Marks the end of the body.
+		"""
+		self._closed = True
+		self._resolve(self._readable)
+
+	###########################################################################
+	def abort(self, exception):
+		""" Aborts the stream. The consumer will receive ``exception`` on its
+			next read.
+		"""
+		self._error = exception
+		self.discard()
+
+	###########################################################################
+	def discard(self):
+		""" Drops any buffered data, ignores any data that arrives later, and
+			releases the producer. Used once nobody will consume the stream.
+		"""
+		self._discarding = True
+		self._chunks.clear()
+		self._buffered = 0
+		self._resolve(self._readable)
+		self._resolve(self._writable)
+
+	###########################################################################
+	def __aiter__(self):
+		""" Returns the asynchronous iterator.
+		"""
+		return self
+
+	###########################################################################
+	async def __anext__(self):
+		""" Returns the next chunk of the body.
+		"""
+		while not self._chunks:
+			if self._error is not None:
+				raise self._error
+			if self._closed or self._discarding:
+				raise StopAsyncIteration
+			self._readable = asyncio.get_event_loop().create_future()
+			await self._readable
+
+		chunk = self._chunks.popleft()
+		self._buffered -= len(chunk)
+		if self._buffered < self.max_buffer_size:
+			self._resolve(self._writable)
+		return chunk
+
+	###########################################################################
+	async def read(self):
+		""" Reads the remainder of the body into memory and returns it.
+		"""
+		chunks = []
+		async for chunk in self:
+			chunks.append(chunk)
+		return b''.join(chunks)
+
+###############################################################################
+def _to_bytes(value):
+	""" Encodes rendered output as bytes.
+	"""
+	return value if isinstance(value, bytes) else value.encode('utf-8')
+
+###############################################################################
+def is_response_stream(result):
+	""" Returns True if a handler result should be streamed to the client
+		item by item: an asynchronous iterator, or a (synchronous) iterator
+		such as a generator. Containers like lists are rendered as usual.
+	"""
+	return hasattr(result, '__anext__') or hasattr(result, '__next__')
+
+###############################################################################
+class StreamFormat(metaclass=ABCMeta):
+	""" Describes how the items of a streamed response are framed.
+		Subclasses must implement ``item``.
+	"""
+
+	content_type = None
+
+	###########################################################################
+	def __init__(self, renderer=None):
+		""" Creates a new stream format.
+
+			Arguments
+			---------
+
+			renderer: object (default: None). The renderer for individual
+				items. Defaults to compact JSON.
+		"""
+		super().__init__()
+		self.renderer = renderer or JSONRenderer(pretty=False)
+
+	###########################################################################
+	def start(self):						# pylint: disable=no-self-use
+		""" Returns the bytes which open the stream.
+		"""
+		return b''
+
+	###########################################################################
+	@abstractmethod
+	def item(self, data, first):
+		""" Returns the bytes for a single item.
+		"""
+
+	###########################################################################
+	def end(self):							# pylint: disable=no-self-use
+		""" Returns the bytes which close the stream.
+		"""
+		return b''
+
+	###########################################################################
+	def error(self, data):			# pylint: disable=no-self-use,unused-argument
+		""" Returns the bytes which report a failure after the stream has
+			started, or None if the format cannot express one (in which case
+			the connection is dropped, so the client can tell that the stream
+			is incomplete).
+		"""
+		return None
+
+###############################################################################
+class NDJSONFormat(StreamFormat):
+	""" Newline-delimited JSON: one JSON document per line.
+	"""
+
+	content_type = 'application/x-ndjson'
+
+	###########################################################################
+	def item(self, data, first):
+		""" Returns the bytes for a single item.
+		"""
+		return _to_bytes(self.renderer.render(data)) + b'\n'
+
+###############################################################################
+class JSONArrayFormat(StreamFormat):
+	""" A single JSON array, written one element at a time.
+	"""
+
+	content_type = 'application/json'
+
+	###########################################################################
+	def start(self):
+		""" Returns the bytes which open the stream.
+		"""
+		return b'['
+
+	###########################################################################
+	def item(self, data, first):
+		""" Returns the bytes for a single item.
+		"""
+		chunk = _to_bytes(self.renderer.render(data))
+		return chunk if first else b',' + chunk
+
+	###########################################################################
+	def end(self):
+		""" Returns the bytes which close the stream.
+		"""
+		return b']'
+
+###############################################################################
+class SSEFormat(StreamFormat):
+	""" Server-sent events, with one ``data`` event per item.
+	"""
+
+	content_type = 'text/event-stream'
+
+	###########################################################################
+	def item(self, data, first):
+		""" Returns the bytes for a single item.
+		"""
+		return b'data: ' + _to_bytes(self.renderer.render(data)) + b'\n\n'
+
+	###########################################################################
+	def error(self, data):
+		""" Reports a failure as an ``error`` event.
+		"""
+		return b'event: error\ndata: ' + \
+			_to_bytes(self.renderer.render(data)) + b'\n\n'
+
+###############################################################################
+STREAM_FORMATS = {
+	'ndjson' : NDJSONFormat(),
+	'json' : JSONArrayFormat(),
+	'sse' : SSEFormat()
+}
+
+# Media types that select a stream format when a route does not fix one.
+_ACCEPTED_STREAM_FORMATS = (
+	('text/event-stream', 'sse'),
+	('application/x-ndjson', 'ndjson'),
+	('application/jsonl', 'ndjson')
+)
+
+###############################################################################
+def get_stream_format(stream_format, accept):
+	""" Returns the ``StreamFormat`` for a streamed response.
+
+		Arguments
+		---------
+
+		stream_format: str, StreamFormat or None. The format configured for
+			the route, either by name (one of ``STREAM_FORMATS``) or as an
+			instance. If None, the format is chosen from ``accept``.
+		accept: str or None. The request's ``Accept`` header. Clients that
+			accept neither server-sent events nor newline-delimited JSON get
+			a JSON array.
+	"""
+	if isinstance(stream_format, StreamFormat):
+		return stream_format
+	if stream_format is None:
+		stream_format = 'json'
+		for media_type, name in _ACCEPTED_STREAM_FORMATS:
+			if accept and media_type in accept:
+				stream_format = name
+				break
+	try:
+		return STREAM_FORMATS[stream_format]
+	except KeyError as error:
+		raise ValueError('Unknown stream format: {}'.format(
+			stream_format)) from error
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -1,18 +1,193 @@
+import signal
+import asyncio
 import logging
 
 from tornado.ioloop import IOLoop
 from tornado.platform.asyncio import AsyncIOMainLoop
+from tornado.netutil import bind_sockets
 import tornado.web
 import tornado.httpserver
+from tornado.routing import Rule, AnyMatches
 
-from . import get_routes
+from . import aspect
+from .routes import get_dispatcher
+from .workers import resolve_worker_count, fork_workers
+from .compression import compression_transform
+from . import metrics as quack_metrics
+from .admission import ConcurrencyLimiter
+from .executors import configure_executors
+from .profiling import ProfilesHandler
+from .loopmonitor import LoopMonitor
 
 logger = logging.getLogger(__name__)
 
+# Whether this process has finished warming up and is accepting connections.
+_ready = False									# pylint: disable=invalid-name
+
+###############################################################################
+def is_ready():
+	""" Returns True once the server in this process has finished warming up
+		and is accepting connections, until it starts shutting down.
+	"""
+	return _ready
+
+###############################################################################
+def _set_ready(ready):
+	""" Sets whether this process is ready.
+	"""
+	global _ready								# pylint: disable=global-statement
+	_ready = ready
+
+###############################################################################
+class ReadinessHandler(tornado.web.RequestHandler):	# pylint: disable=abstract-method
+	""" Serves the readiness of the server: a 200 once it has warmed up, and
+		a 503 before then or while it is shutting down.
+	"""
+
+	###########################################################################
+	def get(self):
+		""" Serves the readiness.
+		"""
+		ready = is_ready()
+		self.set_status(200 if ready else 503)
+		self.finish({'ready' : ready})
+
+###############################################################################
+def _warmup(names, concurrent, loop=None):
+	""" Evaluates static aspects on an event loop which is not running yet.
+	"""
+	if names is True:
+		names = None
+	loop = loop or asyncio.get_event_loop()
+	if loop.is_running():
+		raise RuntimeError('Cannot warm up while the event loop is running. '
+			'Await aspect.warmup() before calling create_server() instead.')
+	loop.run_until_complete(aspect.warmup(names, concurrent=concurrent))
+
+###############################################################################
+def _install_shutdown_handler(server, timeout):
+	""" Makes SIGTERM stop the server gracefully: stop accepting connections,
+		give open connections up to ``timeout`` seconds to finish, then stop
+		the event loop.
+	"""
+	io_loop = IOLoop.current()
+
+	###########################################################################
+	async def shutdown():
+		""" Drains the server and stops the loop.
+		"""
+		_set_ready(False)
+		server.stop()
+		deadline = io_loop.time() + timeout
+		# pylint: disable=protected-access
+		while server._connections and io_loop.time() < deadline:
+			await asyncio.sleep(0.1)
+		# pylint: enable=protected-access
+		await server.close_all_connections()
+		io_loop.stop()
+
+	###########################################################################
+	def on_signal(signum, frame):				# pylint: disable=unused-argument
+		""" Schedules the shutdown from within a signal handler.
+		"""
+		logger.info('Shutting down worker.')
+		io_loop.add_callback_from_signal(
+			lambda: io_loop.spawn_callback(shutdown)
+		)
+
+	signal.signal(signal.SIGTERM, on_signal)
+
 ###############################################################################
-def create_server(port=8080, base_url=None, max_buffer_size=10*1024*1024, debug=False):
+def create_server(port=8080, base_url=None, max_buffer_size=10*1024*1024,
+	debug=False, workers=1, reuse_port=False, shutdown_timeout=5.0,
+	compress_response=False, compression_level=6, compression_min_size=1024,
+	metrics=False, metrics_url='/metrics', max_concurrency=None,
+	thread_pool_size=None, process_pool_size=None, warmup=None,
+	warmup_concurrently=True, warmup_before_fork=False, readiness_url=None,
+	profiler=None, profiler_url='/profiles', loop_monitor=None,
+	brotli_quality=4):
 	""" Run the main event loop.
 
+		Arguments
+		---------
+
+		port: int (default: 8080). The port to listen on.
+		base_url: str (default: None). The URL prefix for all routes.
+		max_buffer_size: int (default: 10 MiB). The largest request body that
+			will be buffered.
+		debug: bool (default: False). Whether to run Tornado in debug mode.
+			Not compatible with multiple workers.
+		workers: int or 'auto' (default: 1). The number of worker processes
+			to run. If greater than one, worker processes are forked and share
+			the listening socket; this function then only returns in the
+			workers, while the original process supervises them, restarting
+			any that crash and forwarding SIGTERM/SIGINT to them. 'auto' uses
+			one worker per CPU.
+		reuse_port: bool (default: False). If True, each worker binds its own
+			socket with SO_REUSEPORT, letting the kernel balance connections
+			between workers, instead of sharing a socket bound before forking.
+		shutdown_timeout: float (default: 5.0). In worker mode, how long a
+			worker that receives SIGTERM waits for open connections to finish
+			before closing them.
+		compress_response: bool (default: False). Whether to compress
+			responses with brotli (if installed), gzip or deflate, as
+			negotiated with each client. Already-compressed content types,
+			such as ``audio/*``, are sent as they are. Streamed responses are
+			compressed chunk by chunk.
+		compression_level: int (default: 6). The gzip/deflate compression
+			level, from 1 (fastest) to 9 (smallest).
+		compression_min_size: int (default: 1024). Responses smaller than this
+			many bytes are not compressed.
+		brotli_quality: int (default: 4). The brotli compression quality,
+			from 0 (fastest) to 11 (smallest).
+		metrics: bool (default: False). Whether to collect request and aspect
+			metrics (see ``quack.metrics``) and serve them at ``metrics_url``
+			in the Prometheus text format. With multiple workers, each
+			worker reports its own metrics.
+		metrics_url: str (default: '/metrics'). The path at which to serve
+			metrics. It is not affected by ``base_url``.
+		max_concurrency: int or ConcurrencyLimiter (default: None). Limits
+			how many requests (per worker) are handled at once, across all
+			routes. Excess requests wait briefly in a bounded queue, and are
+			then shed with a 503 and a ``Retry-After`` header. Pass a
+			``ConcurrencyLimiter`` to tune the queue or to adapt the limit to
+			the observed latency. Routes can also have their own limits (see
+			the ``concurrency_limit`` route option).
+		thread_pool_size: int (default: None). The size of the managed thread
+			pool (see ``quack.executors``). If None, the ``concurrent.futures``
+			default is used.
+		process_pool_size: int (default: None). The size of the managed
+			process pool, per worker. If None, one process per CPU is used.
+		warmup: bool or list of str (default: None). Static aspects to
+			evaluate before the server starts accepting connections (see
+			``aspect.warmup``), so that the first requests do not pay for
+			them. True warms up every static aspect.
+		warmup_concurrently: bool (default: True). Whether independent
+			asynchronous aspects are warmed up concurrently.
+		warmup_before_fork: bool (default: False). With multiple workers,
+			warm up once, in the original process, before forking, so that
+			the workers share the values (copy-on-write) instead of each
+			loading its own. This uses a temporary event loop, so values
+			tied to an event loop (such as connection pools) must not be
+			warmed up this way.
+		readiness_url: str (default: None). If given, a path at which to
+			serve the server's readiness (see ``is_ready``) for health
+			checks: a 200 once it has warmed up and is accepting
+			connections, and a 503 once it starts shutting down. It is not
+			affected by ``base_url``.
+		profiler: Profiler (default: None). Profiles selected requests (see
+			``quack.profiling``), and serves the stored profiles at
+			``profiler_url`` to the clients that the profiler allows (see
+			its ``token`` and ``allow_local`` options).
+		profiler_url: str (default: '/profiles'). The path at which to list
+			the stored profiles; each one is downloaded from
+			``<profiler_url>/<id>``. It is not affected by ``base_url``.
+		loop_monitor: bool, float or LoopMonitor (default: None). Monitors
+			the lag of the event loop (see ``quack.loopmonitor``), logging
+			the stack, route and aspect of anything that blocks it for
+			longer than a threshold. True uses the ``LoopMonitor`` defaults;
+			a number is the threshold, in seconds.
+
 		Examples
 		--------
 
@@ -34,18 +209,88 @@ def create_server(port=8080, base_url=None, max_buffer_size=10*1024*1024, debug=
 						})
 					return {'user' : basic_auth_headers[0]}
 
-			create_server()
+			create_server(workers='auto')
 			asyncio.get_event_loop().run_forever()
 	"""
+	num_workers = resolve_worker_count(workers)
+	sockets = None
+	if num_workers > 1:
+		if debug:
+			raise ValueError('Debug mode cannot be used with multiple workers.')
+		if IOLoop.initialized():
+			raise RuntimeError('Cannot fork workers: the IOLoop has already '
+				'been initialized.')
+		if warmup and warmup_before_fork:
+			loop = asyncio.new_event_loop()
+			try:
+				_warmup(warmup, warmup_concurrently, loop)
+			finally:
+				loop.close()
+			warmup = None
+		if not reuse_port:
+			sockets = bind_sockets(port)
+		fork_workers(num_workers)
+		# Each worker needs its own event loop; never share the parent's.
+		asyncio.set_event_loop(asyncio.new_event_loop())
+		if reuse_port:
+			sockets = bind_sockets(port, reuse_port=True)
+
 	if not IOLoop.initialized():
 		logger.debug('Installing the Tornado IOLoop.')
 		AsyncIOMainLoop().install()
 
+	transforms = None
+	if compress_response:
+		transforms = [compression_transform(
+			level=compression_level,
+			brotli_quality=brotli_quality,
+			min_size=compression_min_size
+		)]
+
+	if thread_pool_size is not None or process_pool_size is not None:
+		configure_executors(threads=thread_pool_size,
+			processes=process_pool_size)
+
+	if isinstance(max_concurrency, int):
+		max_concurrency = ConcurrencyLimiter(max_concurrency)
+
+	dispatcher = get_dispatcher(base_url)
+	if metrics:
+		quack_metrics.enable()
+		dispatcher.add(quack_metrics.MetricsHandler, template=metrics_url)
+	if readiness_url:
+		dispatcher.add(ReadinessHandler, template=readiness_url)
+	if profiler is not None:
+		dispatcher.add(ProfilesHandler, template=profiler_url)
+		dispatcher.add(ProfilesHandler,
+			template=profiler_url + '/<profile_id:str>')
 	app = tornado.web.Application(
-		get_routes(base_url),
-		debug=debug
+		[Rule(AnyMatches(), dispatcher)],
+		transforms=transforms,
+		debug=debug,
+		concurrency_limiter=max_concurrency,
+		profiler=profiler
 	)
+	dispatcher.application = app
+
+	if warmup:
+		_warmup(warmup, warmup_concurrently)
+
 	server = tornado.httpserver.HTTPServer(app, max_buffer_size=max_buffer_size)
-	server.listen(port)
+	if sockets is None:
+		server.listen(port)
+	else:
+		server.add_sockets(sockets)
+		_install_shutdown_handler(server, shutdown_timeout)
+
+	if loop_monitor is True:
+		loop_monitor = LoopMonitor()
+	elif isinstance(loop_monitor, (int, float)) and \
+			not isinstance(loop_monitor, bool):
+		loop_monitor = LoopMonitor(threshold=loop_monitor)
+	if loop_monitor:
+		loop_monitor.start()
+
+	_set_ready(True)
 
 	return server
@@ -0,0 +1,133 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+
+logger = logging.getLogger(__name__)
+
+_worker_id = None								# pylint: disable=invalid-name
+
+###############################################################################
+def worker_id():
+	""" Returns the index of the current worker process, or None if this is
+		not a worker process.
+	"""
+	return _worker_id
+
+###############################################################################
+def resolve_worker_count(workers):
+	""" Turns the ``workers`` argument of ``create_server`` into a number of
+		processes.
+	"""
+	if workers == 'auto' or workers is None or workers == 0:
+		return os.cpu_count() or 1
+	if isinstance(workers, int) and workers > 0:
+		return workers
+	raise ValueError('Invalid number of workers: {}'.format(workers))
+
+###############################################################################
+def fork_workers(num_workers, max_restarts=100, min_uptime=1.0):
+	""" Forks ``num_workers`` worker processes and supervises them.
+
+		In each worker, this returns the worker's index (between 0 and
+		``num_workers - 1``). In the parent process, this never returns:
+		workers that crash (exit with a signal or a non-zero status) are
+		restarted with the same index, SIGTERM and SIGINT are forwarded to
+		every worker (as SIGTERM), and the parent exits once all of the
+		workers have. Workers ignore SIGINT themselves, so that a Ctrl-C,
+		which reaches the whole process group, drains them through the
+		supervisor instead of killing them.
+
+		Arguments
+		---------
+
+		num_workers: int. The number of worker processes to run.
+		max_restarts: int (default: 100). The number of crashes to tolerate
+			before the supervisor gives up.
+		min_uptime: float (default: 1.0). Workers that crash sooner than this
+			many seconds after starting are restarted after a delay of the
+			same length, so that a broken worker does not spin.
+	"""
+	global _worker_id							# pylint: disable=global-statement
+
+	children = {}
+	state = {'stopping' : False, 'restarts' : 0}
+
+	###########################################################################
+	def start(index):
+		""" Starts a worker. Returns its index in the child, None otherwise.
+		"""
+		pid = os.fork()
+		if pid == 0:
+			signal.signal(signal.SIGTERM, signal.SIG_DFL)
+			signal.signal(signal.SIGINT, signal.SIG_IGN)
+			return index
+		logger.debug('Started worker %d with PID %d.', index, pid)
+		children[pid] = (index, time.monotonic())
+		return None
+
+	###########################################################################
+	def stop(signum, frame):					# pylint: disable=unused-argument
+		""" Forwards a shutdown signal to every worker.
+		"""
+		state['stopping'] = True
+		logger.info('Stopping %d worker(s).', len(children))
+		for pid in list(children):
+			try:
+				os.kill(pid, signal.SIGTERM)
+			except ProcessLookupError:
+				pass
+
+	for index in range(num_workers):
+		if start(index) is not None:
+			_worker_id = index
+			return index
+
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGINT, stop)
+
+	while children:
+		try:
+			pid, status = os.wait()
+		except ChildProcessError:
+			break
+		if pid not in children:
+			continue
+
+		index, started = children.pop(pid)
+		if os.WIFSIGNALED(status):
+			if state['stopping']:
+				continue
+			logger.warning('Worker %d (PID %d) killed by signal %d.',
+				index, pid, os.WTERMSIG(status))
+		elif os.WEXITSTATUS(status) != 0:
+			logger.warning('Worker %d (PID %d) exited with status %d.',
+				index, pid, os.WEXITSTATUS(status))
+		else:
+			logger.info('Worker %d (PID %d) exited.', index, pid)
+			continue
+
+		if state['stopping']:
+			continue
+
+		state['restarts'] += 1
+		if state['restarts'] > max_restarts:
+			stop(signal.SIGTERM, None)
+			raise RuntimeError('Too many worker restarts; giving up.')
+
+		if time.monotonic() - started < min_uptime:
+			time.sleep(min_uptime)
+			if state['stopping']:
+				continue
+		if start(index) is not None:
+			_worker_id = index
+			return index
+
+	sys.exit(0)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
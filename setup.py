@@ -9,8 +9,8 @@ import sys
 PACKAGE = 'quack'
 
 ###############################################################################
-if sys.version_info < (3, 5):
-	print('ERROR: Requires Python 3.5+.', file=sys.stderr)
+if sys.version_info < (3, 8):
+	print('ERROR: Requires Python 3.8+.', file=sys.stderr)
 	sys.exit(1)
 
 ###############################################################################
@@ -92,9 +92,16 @@ setup(
 	},
 
 	# Dependencies
+	python_requires='>=3.8',
 	install_requires=[
 		'tornado>=4.5.2, <5.0'
 	],
+	extras_require={
+		'fast' : ['orjson'],
+		'msgpack' : ['msgpack'],
+		'cbor' : ['cbor2'],
+		'brotli' : ['brotli']
+	},
 	dependency_links=[
 	],
 
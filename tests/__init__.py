@@ -0,0 +1,5 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
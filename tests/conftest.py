@@ -0,0 +1,119 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import socket
+
+import pytest
+import tornado.web
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.platform.asyncio import AsyncIOLoop
+from tornado.routing import Rule, AnyMatches
+from tornado.testing import bind_unused_port
+
+from quack.routes import get_routes, get_dispatcher
+
+###############################################################################
+class TestServer:
+	""" Serves the routes registered by a test on asyncio, as
+		``create_server`` does.
+	"""
+
+	__test__ = False
+
+	###########################################################################
+	def __init__(self):
+		""" Creates a new server, which is not listening yet.
+		"""
+		super().__init__()
+		self.io_loop = AsyncIOLoop()
+		self.io_loop.make_current()
+		self.client = AsyncHTTPClient(self.io_loop, force_instance=True)
+		self.port = None
+		self._server = None
+
+	###########################################################################
+	def start(self, **settings):
+		""" Starts serving the routes registered so far.
+
+			Arguments
+			---------
+
+			settings: The Tornado application settings.
+		"""
+		dispatcher = get_dispatcher()
+		app = tornado.web.Application([Rule(AnyMatches(), dispatcher)],
+			**settings)
+		dispatcher.application = app
+		sock, self.port = bind_unused_port()
+		self._server = HTTPServer(app)
+		self._server.add_sockets([sock])
+		return self
+
+	###########################################################################
+	def url(self, path):
+		""" Returns the URL of a path on the server.
+		"""
+		return 'http://127.0.0.1:{}{}'.format(self.port, path)
+
+	###########################################################################
+	def fetch(self, path, **kwargs):
+		""" Sends a request, returning the response (even for errors).
+		"""
+		return self.fetch_many([path], **kwargs)[0]
+
+	###########################################################################
+	def fetch_many(self, paths, **kwargs):
+		""" Sends requests concurrently, returning their responses in the
+			same order.
+		"""
+		kwargs.setdefault('raise_error', False)
+		return self.io_loop.run_sync(lambda: gen.multi([
+			self.client.fetch(self.url(path), **kwargs) for path in paths
+		]))
+
+	###########################################################################
+	def abort(self, path, headers, body=b''):
+		""" Sends a POST request with a partial body, and then closes the
+			connection, as a client which goes away mid-upload would.
+		"""
+		headers = ''.join('{}: {}\r\n'.format(k, v)
+			for k, v in headers.items())
+		with socket.create_connection(('127.0.0.1', self.port)) as sock:
+			sock.sendall('POST {} HTTP/1.1\r\nHost: localhost\r\n{}\r\n'
+				.format(path, headers).encode() + body)
+			self.wait()
+		self.wait()
+
+	###########################################################################
+	def wait(self, seconds=0.05):
+		""" Runs the event loop for a while.
+		"""
+		self.io_loop.run_sync(lambda: gen.sleep(seconds))
+
+	###########################################################################
+	def close(self):
+		""" Stops the server and closes the event loop.
+		"""
+		self.client.close()
+		if self._server is not None:
+			self._server.stop()
+		self.io_loop.clear_current()
+		self.io_loop.close(all_fds=True)
+
+###############################################################################
+@pytest.fixture
+def server():
+	""" Returns a ``TestServer``. Routes registered during the test are
+		removed afterwards.
+	"""
+	routes = list(get_routes.routes)
+	get_routes.routes[:] = []
+	result = TestServer()
+	yield result
+	result.close()
+	get_routes.routes[:] = routes
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,99 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import asyncio
+
+from quack import aspect
+from quack.admission import ConcurrencyLimiter
+from quack.routes import route, Handler
+
+###############################################################################
+def make_routes(limiter):
+	""" Registers a slow route and a streaming route, which share a
+		concurrency limiter.
+	"""
+	###########################################################################
+	@route('/slow', concurrency_limit=limiter)
+	class Slow(Handler):				# pylint: disable=unused-variable
+		""" Takes a while to respond.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Sleeps, and then responds.
+			"""
+			await asyncio.sleep(0.1)
+			return {'result' : 'success'}
+
+	###########################################################################
+	@route('/upload', stream_body=True, concurrency_limit=limiter)
+	class Upload(Handler):				# pylint: disable=unused-variable
+		""" Streams the request body.
+		"""
+		#######################################################################
+		@aspect('payload')
+		async def _post(self, payload=None):
+			""" Returns the size of the body.
+			"""
+			_, stream = payload
+			size = 0
+			async for chunk in stream:
+				size += len(chunk)
+			return {'size' : size}
+
+###############################################################################
+def test_excess_requests_are_shed(server):
+	""" Requests over the limit, with no room to queue, get a 503.
+	"""
+	limiter = ConcurrencyLimiter(1, queue_size=0, retry_after=3)
+	make_routes(limiter)
+	server.start()
+	first, second = server.fetch_many(['/slow', '/slow'])
+	assert first.code == 200
+	assert second.code == 503
+	assert second.headers['Retry-After'] == '3'
+	assert limiter.active == 0
+	assert limiter.shed == 1
+
+###############################################################################
+def test_queued_requests_are_admitted_in_turn(server):
+	""" Requests which fit in the queue wait for a slot.
+	"""
+	limiter = ConcurrencyLimiter(1, queue_size=2)
+	make_routes(limiter)
+	server.start()
+	responses = server.fetch_many(['/slow', '/slow', '/slow'])
+	assert [response.code for response in responses] == [200, 200, 200]
+	assert limiter.active == 0
+
+###############################################################################
+def test_global_limit(server):
+	""" The server-wide limiter applies to every route.
+	"""
+	make_routes(None)
+	limiter = ConcurrencyLimiter(1, queue_size=0)
+	server.start(concurrency_limiter=limiter)
+	codes = sorted(response.code
+		for response in server.fetch_many(['/slow', '/slow']))
+	assert codes == [200, 503]
+	assert limiter.active == 0
+
+###############################################################################
+def test_aborted_upload_releases_its_slot(server):
+	""" A client which goes away during a streamed upload does not keep its
+		slot.
+	"""
+	limiter = ConcurrencyLimiter(1, queue_size=0)
+	make_routes(limiter)
+	server.start()
+	server.abort('/upload', {
+		'Content-Type' : 'application/octet-stream',
+		'Content-Length' : 1000
+	}, b'x' * 10)
+	assert limiter.active == 0
+	response = server.fetch('/upload', method='POST', body=b'x' * 10,
+		headers={'Content-Type' : 'application/octet-stream'})
+	assert response.code == 200
+	assert response.body == b'{"size":10}'
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
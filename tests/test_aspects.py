@@ -0,0 +1,292 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import asyncio
+
+import pytest
+
+from quack import aspect
+from quack.aspects.base import pop_aspect
+
+###############################################################################
+@pytest.fixture
+def define():
+	""" Defines aspects for a single test, removing them afterwards.
+	"""
+	names = []
+
+	###########################################################################
+	def define_aspect(name, func, kind=aspect.dynamic, **kwargs):
+		""" Defines an aspect.
+		"""
+		kind(name, **kwargs)(func)
+		names.append(name)
+
+	yield define_aspect
+	for name in reversed(names):
+		pop_aspect(name)
+
+###############################################################################
+def test_dependencies_are_resolved_in_order(define):
+	""" Dependencies are evaluated before, and passed to, their dependents.
+	"""
+	calls = []
+
+	###########################################################################
+	def base():
+		""" The dependency.
+		"""
+		calls.append('base')
+		return 2
+
+	###########################################################################
+	def derived(test_base):
+		""" The dependent aspect.
+		"""
+		calls.append('derived')
+		return test_base * 10
+
+	define('test_derived', derived, depends='test_base')
+	define('test_base', base)
+
+	###########################################################################
+	@aspect('test_derived')
+	def func(test_derived=None):
+		""" Receives the dependent aspect.
+		"""
+		return test_derived
+
+	assert func() == 20
+	assert calls == ['base', 'derived']
+
+###############################################################################
+def test_shared_dependency_is_evaluated_once(define):
+	""" A dependency shared by several aspects is evaluated once per call.
+	"""
+	calls = []
+
+	###########################################################################
+	def shared():
+		""" The shared dependency.
+		"""
+		calls.append('shared')
+		return 1
+
+	define('test_shared', shared)
+	define('test_left', lambda test_shared: test_shared + 1,
+		depends='test_shared')
+	define('test_right', lambda test_shared: test_shared + 2,
+		depends='test_shared')
+
+	###########################################################################
+	@aspect('test_left')
+	@aspect('test_right')
+	def func(test_left=None, test_right=None):
+		""" Receives both dependents.
+		"""
+		return test_left, test_right
+
+	assert func() == (2, 3)
+	assert calls == ['shared']
+
+###############################################################################
+def test_circular_dependency_is_rejected(define):
+	""" Circular dependencies are reported when the binding is compiled.
+	"""
+	define('test_cycle_a', lambda test_cycle_b: None, depends='test_cycle_b')
+	define('test_cycle_b', lambda test_cycle_a: None, depends='test_cycle_a')
+
+	###########################################################################
+	@aspect('test_cycle_a')
+	def func(test_cycle_a=None):
+		""" Never called.
+		"""
+		return test_cycle_a
+
+	with pytest.raises(ValueError, match='Circular'):
+		func()
+
+###############################################################################
+def test_undefined_aspect_is_rejected():
+	""" Injecting an undefined aspect fails when the function is called.
+	"""
+	###########################################################################
+	@aspect('test_undefined')
+	def func(test_undefined=None):
+		""" Never called.
+		"""
+		return test_undefined
+
+	with pytest.raises(ValueError, match='No such aspect'):
+		func()
+
+###############################################################################
+def test_async_aspect_in_sync_function_is_rejected(define):
+	""" Asynchronous aspects can only be injected into coroutine functions.
+	"""
+	###########################################################################
+	async def provider():
+		""" An asynchronous aspect.
+		"""
+		return 1
+
+	define('test_async_only', provider)
+
+	###########################################################################
+	@aspect('test_async_only')
+	def func(test_async_only=None):
+		""" Never called.
+		"""
+		return test_async_only
+
+	with pytest.raises(ValueError, match='Asynchronous'):
+		func()
+
+###############################################################################
+def test_independent_async_aspects_run_concurrently(define):
+	""" Independent asynchronous aspects are evaluated at the same time.
+	"""
+	running = []
+
+	###########################################################################
+	def make_provider(value):
+		""" Creates an asynchronous aspect which waits for the other one to
+			start.
+		"""
+		#######################################################################
+		async def provider():
+			""" Waits until both aspects are running.
+			"""
+			running.append(value)
+			for _ in range(100):
+				if len(running) == 2:
+					return value
+				await asyncio.sleep(0)
+			raise AssertionError('Aspects were evaluated one at a time.')
+		return provider
+
+	define('test_first', make_provider(1))
+	define('test_second', make_provider(2))
+	define('test_sum',
+		lambda test_first, test_second: test_first + test_second,
+		depends=('test_first', 'test_second'))
+
+	###########################################################################
+	@aspect('test_sum')
+	async def func(test_sum=None):
+		""" Receives the sum of both aspects.
+		"""
+		return test_sum
+
+	assert asyncio.run(func()) == 3
+
+###############################################################################
+def test_failure_cancels_pending_aspects(define):
+	""" If a synchronous aspect fails, the asynchronous aspects which were
+		already started are cancelled.
+	"""
+	###########################################################################
+	async def provider():
+		""" An asynchronous aspect which never finishes.
+		"""
+		await asyncio.Event().wait()
+
+	define('test_pending_first', provider)
+	define('test_pending_second', provider)
+	define('test_failing', lambda: 1 / 0)
+
+	###########################################################################
+	@aspect('test_pending_first')
+	@aspect('test_pending_second')
+	@aspect('test_failing')
+	async def func(test_pending_first=None, test_pending_second=None,
+		test_failing=None):
+		""" Never called.
+		"""
+
+	###########################################################################
+	async def run():
+		""" Calls the function, and returns the tasks left behind.
+		"""
+		with pytest.raises(ZeroDivisionError):
+			await func()
+		await asyncio.sleep(0)
+		return asyncio.all_tasks() - {asyncio.current_task()}
+
+	assert asyncio.run(run()) == set()
+
+###############################################################################
+def test_binding_is_invalidated_by_stack_changes(define):
+	""" Bindings follow changes to the aspect stacks, including changes to
+		the dependencies of the injected aspects.
+	"""
+	define('test_inner', lambda: 'original')
+	define('test_outer', lambda test_inner: test_inner.upper(),
+		depends='test_inner')
+
+	###########################################################################
+	@aspect('test_outer')
+	def func(test_outer=None):
+		""" Receives the outer aspect.
+		"""
+		return test_outer
+
+	assert func() == 'ORIGINAL'
+	with aspect.context('test_inner', lambda: 'override'):
+		assert func() == 'OVERRIDE'
+		with aspect.context('test_outer', lambda: 'replaced'):
+			assert func() == 'replaced'
+		assert func() == 'OVERRIDE'
+	assert func() == 'ORIGINAL'
+
+###############################################################################
+def test_aspects_may_receive_self(define):
+	""" Aspects which take "self" receive the instance of the method they
+		are injected into.
+	"""
+	define('test_owner', lambda self: self.value)
+
+	###########################################################################
+	class Owner:					# pylint: disable=too-few-public-methods
+		""" Has a method with an aspect.
+		"""
+		value = 'owner'
+
+		#######################################################################
+		@aspect('test_owner')
+		def method(self, test_owner=None):
+			""" Receives the aspect.
+			"""
+			return test_owner
+
+	assert Owner().method() == 'owner'
+
+	###########################################################################
+	@aspect('test_owner')
+	def func(test_owner=None):
+		""" Cannot receive the aspect.
+		"""
+		return test_owner
+
+	with pytest.raises(ValueError, match='requires "self"'):
+		func()
+
+###############################################################################
+def test_warmup_skips_aspects_which_require_self(define):
+	""" Warming up every static aspect leaves out those which need "self",
+		and warming one up explicitly is an error.
+	"""
+	calls = []
+	define('test_warm', lambda: calls.append('warm'), kind=aspect.static)
+	define('test_needs_self', lambda self: None, kind=aspect.static)
+
+	warmed = asyncio.run(aspect.warmup())
+	assert 'test_warm' in warmed
+	assert 'test_needs_self' not in warmed
+	assert calls == ['warm']
+
+	with pytest.raises(ValueError, match='Cannot warm up'):
+		asyncio.run(aspect.warmup(['test_needs_self']))
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
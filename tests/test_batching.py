@@ -0,0 +1,116 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from quack.batching import Batcher, batched
+
+###############################################################################
+def run_all(batcher, items):
+	""" Submits items concurrently, returning their results (or exceptions).
+	"""
+	###########################################################################
+	async def run():
+		""" Submits the items.
+		"""
+		return (await asyncio.gather(*[batcher(item) for item in items],
+			return_exceptions=True))
+	return asyncio.run(run())
+
+###############################################################################
+def test_concurrent_items_are_batched():
+	""" Items submitted together are processed in batches of up to
+		``max_batch_size``, each caller getting its own result.
+	"""
+	batches = []
+
+	###########################################################################
+	@batched(max_batch_size=3, max_wait_ms=50)
+	def double(items):
+		""" Doubles each item.
+		"""
+		batches.append(list(items))
+		return [item * 2 for item in items]
+
+	assert run_all(double, range(7)) == [0, 2, 4, 6, 8, 10, 12]
+	assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+	assert (double.batches, double.items) == (3, 7)
+	assert double.__name__ == 'double'
+
+###############################################################################
+def test_partial_batches_wait_at_most_max_wait():
+	""" A batch which does not fill up starts once its first item has waited
+		``max_wait_ms``.
+	"""
+	batcher = Batcher(lambda items: items, max_batch_size=100, max_wait_ms=1)
+
+	###########################################################################
+	async def run():
+		""" Submits a single item.
+		"""
+		return (await asyncio.wait_for(batcher('x'), 1))
+
+	assert asyncio.run(run()) == 'x'
+
+###############################################################################
+def test_failures():
+	""" Returning an exception fails one item; raising one fails the batch.
+	"""
+	###########################################################################
+	async def check(items):
+		""" Fails odd items, and every item of batches containing 99.
+		"""
+		if 99 in items:
+			raise RuntimeError('bad batch')
+		return [ValueError(item) if item % 2 else item for item in items]
+
+	results = run_all(Batcher(check, max_batch_size=2), [0, 1, 99, 2])
+	assert results[0] == 0
+	assert isinstance(results[1], ValueError)
+	assert all(isinstance(result, RuntimeError) for result in results[2:])
+
+	results = run_all(Batcher(lambda items: items[1:]), [1, 2])
+	assert all(isinstance(result, ValueError) for result in results)
+
+###############################################################################
+def test_executor():
+	""" Regular batch functions can run in an executor.
+	"""
+	batcher = Batcher(lambda items: [threading.get_ident()] * len(items),
+		executor='thread')
+	assert run_all(batcher, [1, 2]) != [threading.get_ident()] * 2
+
+###############################################################################
+def test_cancelled_batch_cancels_its_items():
+	""" If a running batch is cancelled, its callers are cancelled too,
+		instead of waiting forever.
+	"""
+	###########################################################################
+	async def forever(items):
+		""" Never finishes.
+		"""
+		await asyncio.Event().wait()
+
+	batcher = Batcher(forever, max_wait_ms=0)
+
+	###########################################################################
+	async def run():
+		""" Cancels the batch of two submitted items.
+		"""
+		callers = [asyncio.ensure_future(batcher(item)) for item in (1, 2)]
+		await asyncio.sleep(0.01)
+		for task in asyncio.all_tasks():
+			if task.get_coro().__qualname__ == 'Batcher._run':
+				task.cancel()
+		for caller in callers:
+			with pytest.raises(asyncio.CancelledError):
+				await asyncio.wait_for(caller, 1)
+		return batcher._running				# pylint: disable=protected-access
+
+	assert asyncio.run(run()) == 0
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,113 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import pytest
+
+from quack import aspect
+from quack.admission import ConcurrencyLimiter
+from quack.routes import route, Handler
+
+LIMIT = 100
+
+###############################################################################
+@pytest.fixture
+def limiter():
+	""" Returns the concurrency limiter shared by the routes.
+	"""
+	return ConcurrencyLimiter(1, queue_size=0)
+
+###############################################################################
+@pytest.fixture
+def post(server, limiter):
+	""" Serves a buffered and a streaming route, each with a body size limit,
+		and returns a function which sends them a POST request.
+	"""
+	###########################################################################
+	@route('/buffered', max_body_size=LIMIT, concurrency_limit=limiter)
+	class Buffered(Handler):			# pylint: disable=unused-variable
+		""" Buffers the request body.
+		"""
+		#######################################################################
+		async def _post(self):
+			""" Returns the size of the body.
+			"""
+			return {'size' : len(self.request.body)}
+
+	###########################################################################
+	@route('/streamed', stream_body=True, max_body_size=LIMIT,
+		concurrency_limit=limiter)
+	class Streamed(Handler):			# pylint: disable=unused-variable
+		""" Streams the request body.
+		"""
+		#######################################################################
+		@aspect('payload')
+		async def _post(self, payload=None):
+			""" Returns the size of the body.
+			"""
+			_, stream = payload
+			size = 0
+			async for chunk in stream:
+				size += len(chunk)
+			return {'size' : size}
+
+	server.start()
+
+	###########################################################################
+	def send(url, body, content_type='application/octet-stream'):
+		""" Sends a POST request, returning the response.
+		"""
+		return server.fetch(url, method='POST', body=body,
+			headers={'Content-Type' : content_type})
+
+	return send
+
+###############################################################################
+def test_buffered_within_limit(post):
+	""" Bodies up to the limit are accepted.
+	"""
+	response = post('/buffered', b'x' * LIMIT)
+	assert response.code == 200
+	assert response.body == b'{"size":100}'
+
+###############################################################################
+def test_buffered_over_limit(post):
+	""" Bodies over the limit are rejected.
+	"""
+	assert post('/buffered', b'x' * (LIMIT + 1)).code == 413
+
+###############################################################################
+def test_streamed_within_limit(post):
+	""" Streamed bodies up to the limit are accepted.
+	"""
+	response = post('/streamed', b'x' * LIMIT)
+	assert response.code == 200
+	assert response.body == b'{"size":100}'
+
+###############################################################################
+def test_streamed_over_limit(post):
+	""" Streamed bodies over the limit are rejected before the handler runs.
+	"""
+	assert post('/streamed', b'x' * (LIMIT * 10)).code == 413
+
+###############################################################################
+def test_buffered_content_type_on_streaming_route(post):
+	""" The limit also applies to bodies which a streaming route buffers.
+	"""
+	assert post('/streamed', b'{}' * LIMIT,
+		content_type='application/json').code == 413
+
+###############################################################################
+@pytest.mark.parametrize('url', ['/buffered', '/streamed'])
+def test_aborted_upload(server, limiter, post, url):
+	""" A client which goes away during an upload to a route with a limit
+		does not keep its concurrency slot.
+	"""
+	server.abort(url, {
+		'Content-Type' : 'application/octet-stream',
+		'Content-Length' : LIMIT
+	}, b'x' * 10)
+	assert limiter.active == 0
+	assert post(url, b'x' * 10).code == 200
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,108 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import pytest
+
+from quack.routes import route, Handler, ResponseCache, cache_response
+
+###############################################################################
+@pytest.fixture
+def calls(server):
+	""" Serves cached routes, and returns how often each one has run.
+	"""
+	result = {'cached' : 0, 'decorated' : 0, 'failing' : 0}
+
+	###########################################################################
+	@route('/cached', response_cache=ResponseCache(ttl=60))
+	class Cached(Handler):				# pylint: disable=unused-variable
+		""" A cached route.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Returns the number of times it has run.
+			"""
+			result['cached'] += 1
+			self.set_header('X-Custom', 'yes')
+			return {'calls' : result['cached']}
+
+	###########################################################################
+	@route('/decorated')
+	class Decorated(Handler):			# pylint: disable=unused-variable
+		""" A route cached with a decorator.
+		"""
+		#######################################################################
+		@cache_response(ttl=60)
+		async def _get(self):
+			""" Returns the number of times it has run.
+			"""
+			result['decorated'] += 1
+			return {'calls' : result['decorated']}
+
+	###########################################################################
+	@route('/failing', response_cache=True)
+	class Failing(Handler):				# pylint: disable=unused-variable
+		""" A cached route which fails.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Sets an error status.
+			"""
+			result['failing'] += 1
+			self.set_status(404)
+			return {'result' : 'failure'}
+
+	server.start()
+	return result
+
+###############################################################################
+@pytest.mark.parametrize('path', ['/cached', '/decorated'])
+def test_responses_are_replayed(server, calls, path):
+	""" Repeated requests are answered from the cache, with the same body
+		and headers, while other query strings are cached separately.
+	"""
+	first = server.fetch(path)
+	second = server.fetch(path)
+	assert first.code == second.code == 200
+	assert first.body == second.body == b'{"calls":1}'
+	assert first.headers['Etag'] == second.headers['Etag']
+	assert first.headers.get('X-Custom') == second.headers.get('X-Custom')
+	assert server.fetch(path + '?x=1').body == b'{"calls":2}'
+	assert calls[path[1:]] == 2
+
+###############################################################################
+def test_conditional_requests(server, calls):
+	""" Clients with a current copy get a 304, without the handler running.
+	"""
+	etag = server.fetch('/cached').headers['Etag']
+	response = server.fetch('/cached', headers={'If-None-Match' : etag})
+	assert response.code == 304
+	assert response.body == b''
+	assert response.headers['Etag'] == etag
+
+	response = server.fetch('/cached', headers={'If-None-Match' : '"other"'})
+	assert response.code == 200
+	assert calls['cached'] == 1
+
+	last_modified = response.headers['Last-Modified']
+	response = server.fetch('/cached',
+		headers={'If-Modified-Since' : last_modified})
+	assert response.code == 304
+
+###############################################################################
+def test_authorized_requests_bypass_the_cache(server, calls):
+	""" Responses are not shared between users.
+	"""
+	server.fetch('/cached')
+	response = server.fetch('/cached', headers={'Authorization' : 'Bearer x'})
+	assert response.body == b'{"calls":2}'
+
+###############################################################################
+def test_errors_are_not_cached(server, calls):
+	""" Only successful responses are cached.
+	"""
+	assert server.fetch('/failing').code == 404
+	assert server.fetch('/failing').code == 404
+	assert calls['failing'] == 2
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
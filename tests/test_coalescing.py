@@ -0,0 +1,82 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import asyncio
+
+import pytest
+
+from quack import Http404NotFound
+from quack.routes import route, Handler, SingleFlight
+
+###############################################################################
+@pytest.fixture
+def group():
+	""" Returns the single-flight group of the test route.
+	"""
+	return SingleFlight()
+
+###############################################################################
+@pytest.fixture
+def calls(server, group):
+	""" Serves a slow, coalesced route, and returns the arguments of each
+		call to it.
+	"""
+	result = []
+
+	###########################################################################
+	@route('/slow', coalesce=group)
+	class Slow(Handler):				# pylint: disable=unused-variable
+		""" Takes a while to respond.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Returns the call number, or fails on request.
+			"""
+			result.append(self.request.query)
+			call = len(result)
+			await asyncio.sleep(0.05)
+			if self.get_argument('missing', None):
+				raise Http404NotFound({'result' : 'failure'})
+			self.set_header('X-Call', str(call))
+			return {'call' : call}
+
+	server.start()
+	return result
+
+###############################################################################
+def test_identical_requests_share_one_call(server, group, calls):
+	""" Concurrent identical requests get the leader's response, headers
+		included, while different requests are handled separately.
+	"""
+	responses = server.fetch_many(['/slow'] * 3 + ['/slow?x=1'])
+	assert [response.code for response in responses] == [200] * 4
+	assert len({response.body for response in responses[:3]}) == 1
+	assert len({response.headers['X-Call'] for response in responses[:3]}) == 1
+	assert responses[3].body != responses[0].body
+	assert sorted(calls) == ['', 'x=1']
+	assert (group.coalesced, group.in_flight) == (2, 0)
+
+###############################################################################
+def test_errors_are_shared(server, calls):
+	""" Followers get the leader's error response.
+	"""
+	responses = server.fetch_many(['/slow?missing=1'] * 2)
+	assert [response.code for response in responses] == [404, 404]
+	assert len(calls) == 1
+
+###############################################################################
+def test_requests_after_the_leader_are_not_coalesced(server, calls):
+	""" Nothing is kept once the leader has finished.
+	"""
+	assert server.fetch('/slow').body == b'{"call":1}'
+	assert server.fetch('/slow').body == b'{"call":2}'
+
+###############################################################################
+def test_authorized_requests_are_not_coalesced(server, calls):
+	""" Requests with credentials are handled on their own.
+	"""
+	server.fetch_many(['/slow'] * 2, headers={'Authorization' : 'Bearer x'})
+	assert len(calls) == 2
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
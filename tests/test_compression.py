@@ -0,0 +1,119 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import zlib
+
+import pytest
+
+from quack.routes import route, Handler
+from quack.compression import choose_encoding, compression_transform, \
+	is_compressible_content_type
+
+BODY = b'"' + b'x' * 2046 + b'"'
+
+###############################################################################
+@pytest.fixture
+def fetch(server):
+	""" Serves a buffered and a streamed response, and returns a
+		function which requests them with a given ``Accept-Encoding``.
+	"""
+	###########################################################################
+	@route('/data/<size:int>')
+	class Data(Handler):				# pylint: disable=unused-variable
+		""" Returns a body of the requested size.
+		"""
+		#######################################################################
+		async def _get(self, size):
+			""" Returns the body.
+			"""
+			return 'x' * (int(size) - 2)
+
+	###########################################################################
+	@route('/chunks', stream_format='ndjson')
+	class Chunks(Handler):				# pylint: disable=unused-variable
+		""" Streams a body in several flushed chunks.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Returns the chunks.
+			"""
+			return iter(['abc'] * 3)
+
+	server.start(transforms=[compression_transform(min_size=1024)])
+
+	###########################################################################
+	def send(path, accept_encoding=None):
+		""" Sends a GET request, returning the undecoded response.
+		"""
+		headers = {}
+		if accept_encoding is not None:
+			headers['Accept-Encoding'] = accept_encoding
+		return server.fetch(path, headers=headers, decompress_response=False)
+
+	return send
+
+###############################################################################
+def test_choose_encoding():
+	""" The most preferred encoding which the client accepts best wins.
+	"""
+	assert choose_encoding(None) is None
+	assert choose_encoding('gzip, deflate') == 'gzip'
+	assert choose_encoding('gzip;q=0.5, deflate') == 'deflate'
+	assert choose_encoding('br, gzip', ('gzip', 'deflate')) == 'gzip'
+	assert choose_encoding('*') == 'br'
+	assert choose_encoding('*, br;q=0') == 'gzip'
+	assert choose_encoding('identity') is None
+
+###############################################################################
+def test_compressible_content_types():
+	""" Content types which are already compressed are left alone.
+	"""
+	assert is_compressible_content_type('application/json; charset=UTF-8')
+	assert is_compressible_content_type('image/svg+xml')
+	assert not is_compressible_content_type('image/png')
+	assert not is_compressible_content_type(None)
+
+###############################################################################
+def test_compression_transform_options():
+	""" Invalid settings are rejected.
+	"""
+	with pytest.raises(ValueError):
+		compression_transform(level=0)
+	with pytest.raises(ValueError):
+		compression_transform(brotli_quality=12)
+
+###############################################################################
+def test_gzip(fetch):
+	""" Large responses are compressed, and vary by ``Accept-Encoding``.
+	"""
+	response = fetch('/data/2048', 'gzip')
+	assert response.headers['Content-Encoding'] == 'gzip'
+	assert 'Accept-Encoding' in response.headers['Vary']
+	assert response.headers['Etag'].startswith('W/')
+	assert zlib.decompress(response.body, 16 + zlib.MAX_WBITS) == BODY
+
+###############################################################################
+@pytest.mark.parametrize('path, accept_encoding', [
+	('/data/100', 'gzip'),
+	('/data/2048', None),
+	('/data/2048', 'identity')
+], ids=['small', 'no-header', 'identity'])
+def test_uncompressed(fetch, path, accept_encoding):
+	""" Small responses, and responses to clients which do not accept an
+		encoding, are sent as they are.
+	"""
+	response = fetch(path, accept_encoding)
+	assert 'Content-Encoding' not in response.headers
+	assert response.body == b'"' + b'x' * (len(response.body) - 2) + b'"'
+
+###############################################################################
+def test_chunks_are_flushed(fetch):
+	""" Responses written in several chunks are compressed incrementally,
+		whatever their size.
+	"""
+	response = fetch('/chunks', 'deflate')
+	assert response.headers['Content-Encoding'] == 'deflate'
+	assert zlib.decompress(response.body) == b'"abc"\n' * 3
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,135 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import re
+
+from quack.routes import route, get_routes
+from quack.routes.dispatch import RouteDispatcher
+
+###############################################################################
+def get_pattern(template):
+	""" Returns the regular expression that ``@route`` makes of a template.
+	"""
+	route(template)(object)
+	return get_routes.routes.pop().pattern
+
+###############################################################################
+def make_dispatcher(*routes):
+	""" Creates a dispatcher from (name, template) pairs, routing each
+		template to its name.
+	"""
+	dispatcher = RouteDispatcher(route.param_re)
+	for name, template in routes:
+		dispatcher.add(name, template=template, pattern=get_pattern(template))
+	return dispatcher
+
+###############################################################################
+def match(dispatcher, path):
+	""" Returns the (name, parameters) that a path is routed to, or None.
+	"""
+	result = dispatcher.match(path)
+	if result is None:
+		return None
+	handler, path_kwargs, _ = result
+	return handler, path_kwargs
+
+###############################################################################
+def test_literal_routes():
+	""" Literal routes only match their own path.
+	"""
+	dispatcher = make_dispatcher(('root', '/'), ('users', '/users'),
+		('admins', '/users/admins'))
+	assert match(dispatcher, '/') == ('root', {})
+	assert match(dispatcher, '/users') == ('users', {})
+	assert match(dispatcher, '/users/admins') == ('admins', {})
+	assert match(dispatcher, '/users/') is None
+	assert match(dispatcher, '/groups') is None
+
+###############################################################################
+def test_int_parameters_match_digits():
+	""" ``<name:int>`` matches one segment of digits, in any position.
+	"""
+	dispatcher = make_dispatcher(('user', '/users/<id:int>'),
+		('posts', '/users/<id:int>/posts'))
+	assert match(dispatcher, '/users/42') == ('user', {'id' : '42'})
+	assert match(dispatcher, '/users/42/posts') == ('posts', {'id' : '42'})
+	assert match(dispatcher, '/users/abc') is None
+	assert match(dispatcher, '/users/') is None
+
+###############################################################################
+def test_inner_str_parameter_matches_like_its_regex():
+	""" A ``<name:str>`` parameter which is not last matches any non-empty
+		text, including slashes, as the route's regular expression does.
+	"""
+	pattern = get_pattern('/files/<name:str>/meta')
+	dispatcher = make_dispatcher(('file', '/files/<name:str>/meta'))
+	for path, name in [
+		('/files/report/meta', 'report'),
+		('/files/a/b/meta', 'a/b'),
+		('/files//meta', None),
+		('/files/meta', None)
+	]:
+		expected = None if name is None else ('file', {'name' : name})
+		assert match(dispatcher, path) == expected
+		regex = re.match(pattern + '$', path)
+		assert (regex and regex.group('name')) == name
+
+###############################################################################
+def test_last_str_parameter_matches_rest_of_path():
+	""" A ``<name:str>`` parameter in the last position matches the rest of
+		the path, including slashes, but not an empty remainder.
+	"""
+	dispatcher = make_dispatcher(('static', '/static/<path:str>'))
+	assert match(dispatcher, '/static/css/site.css') == \
+		('static', {'path' : 'css/site.css'})
+	assert match(dispatcher, '/static/x') == ('static', {'path' : 'x'})
+	assert match(dispatcher, '/static/') is None
+
+###############################################################################
+def test_precedence():
+	""" Literals beat parameters, which beat trailing parameters, regardless
+		of the order in which they were registered.
+	"""
+	dispatcher = make_dispatcher(
+		('tail', '/items/<rest:str>'),
+		('param', '/items/<id:int>'),
+		('literal', '/items/new')
+	)
+	assert match(dispatcher, '/items/new') == ('literal', {})
+	assert match(dispatcher, '/items/7') == ('param', {'id' : '7'})
+	assert match(dispatcher, '/items/x/y') == ('tail', {'rest' : 'x/y'})
+
+###############################################################################
+def test_backtracking():
+	""" If a literal branch fails further down the path, the parameter
+		branches are tried instead.
+	"""
+	dispatcher = make_dispatcher(('literal', '/a/1/c'),
+		('param', '/a/<x:int>/d'))
+	assert match(dispatcher, '/a/1/c') == ('literal', {})
+	assert match(dispatcher, '/a/1/d') == ('param', {'x' : '1'})
+
+###############################################################################
+def test_first_registered_route_wins():
+	""" Of two identical routes, the first one registered is used.
+	"""
+	dispatcher = make_dispatcher(('first', '/same/<id:int>'),
+		('second', '/same/<id:int>'))
+	assert match(dispatcher, '/same/1') == ('first', {'id' : '1'})
+
+###############################################################################
+def test_regex_routes_are_tried_afterwards():
+	""" Routes which cannot be compiled into the trie fall back to regular
+		expressions, in registration order, after the trie.
+	"""
+	dispatcher = RouteDispatcher(route.param_re)
+	dispatcher.add('regex', pattern=r'/v[0-9]+/(?P<name>\w+)')
+	dispatcher.add('positional', pattern=r'/raw/(\d+)')
+	dispatcher.add('literal', template='/v1/status')
+	assert match(dispatcher, '/v1/status') == ('literal', {})
+	assert match(dispatcher, '/v2/status') == ('regex', {'name' : 'status'})
+	assert dispatcher.match('/raw/12') == ('positional', {}, ['12'])
+	assert match(dispatcher, '/raw/x') is None
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
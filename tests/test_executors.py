@@ -0,0 +1,68 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import os
+import asyncio
+import threading
+
+import pytest
+
+from quack.executors import offload, configure_executors, \
+	shutdown_executors
+
+###############################################################################
+@pytest.fixture
+def pools():
+	""" Configures small pools, which pass anything over 16 bytes through
+		shared memory, for a single test.
+	"""
+	configure_executors(threads=2, processes=1, shared_memory_threshold=16)
+	yield
+	configure_executors(shared_memory_threshold=1024*1024)
+	shutdown_executors()
+
+###############################################################################
+@offload('thread')
+def where():
+	""" Returns the thread it runs in.
+	"""
+	return threading.get_ident()
+
+###############################################################################
+@offload('process')
+def describe(data, suffix=b''):
+	""" Returns the process it runs in, and what it was called with.
+	"""
+	return os.getpid(), type(data).__name__, data + suffix
+
+###############################################################################
+def test_thread_offload(pools):
+	""" Functions offloaded to the thread pool run off the calling thread.
+	"""
+	assert asyncio.run(where()) != threading.get_ident()
+
+###############################################################################
+@pytest.mark.parametrize('data', [
+	b'small',
+	bytes(range(100)),
+	bytearray(range(100)),
+	memoryview(bytes(range(200)))[::2]
+], ids=['small', 'bytes', 'bytearray', 'strided'])
+def test_process_offload(pools, data):
+	""" Arguments reach process pool workers intact, including large ones
+		passed through shared memory and non-contiguous buffers.
+	"""
+	pid, kind, value = asyncio.run(describe(data, suffix=b'!' * 20))
+	assert pid != os.getpid()
+	assert value == bytes(data) + b'!' * 20
+	assert kind == ('bytes' if len(bytes(data)) >= 16 else type(data).__name__)
+
+###############################################################################
+def test_coroutine_functions_cannot_be_offloaded():
+	""" Only regular functions can be offloaded.
+	"""
+	with pytest.raises(ValueError, match='coroutine'):
+		offload()(asyncio.sleep)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
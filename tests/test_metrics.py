@@ -0,0 +1,78 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import pytest
+
+from quack import aspect, metrics
+from quack.routes import route, Handler
+
+###############################################################################
+@pytest.fixture
+def collect():
+	""" Collects metrics for a single test.
+	"""
+	metrics.registry.clear()
+	metrics.enable(aspects=False)
+	yield metrics
+	metrics.disable()
+	metrics.registry.clear()
+
+###############################################################################
+def make_routes():
+	""" Registers a buffered and a streaming route.
+	"""
+	###########################################################################
+	@route('/hello')
+	class Hello(Handler):				# pylint: disable=unused-variable
+		""" Says hello.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Returns a greeting.
+			"""
+			return {'hello' : 'world'}
+
+	###########################################################################
+	@route('/upload', stream_body=True)
+	class Upload(Handler):				# pylint: disable=unused-variable
+		""" Streams the request body.
+		"""
+		#######################################################################
+		@aspect('payload')
+		async def _post(self, payload=None):
+			""" Returns the size of the body.
+			"""
+			_, stream = payload
+			size = 0
+			async for chunk in stream:
+				size += len(chunk)
+			return {'size' : size}
+
+###############################################################################
+def test_requests_are_counted(server, collect):
+	""" Finished requests are counted by route, method and status.
+	"""
+	make_routes()
+	server.start()
+	assert server.fetch('/hello').code == 200
+	assert server.fetch('/hello').code == 200
+	assert collect.requests_total.values == {('/hello', 'GET', '200') : 2}
+	assert collect.requests_in_flight.values == {('/hello', 'GET') : 0}
+	assert 'quack_request_duration_seconds_count{route="/hello",' \
+		'method="GET"} 2' in collect.registry.render()
+
+###############################################################################
+def test_aborted_upload_is_not_left_in_flight(server, collect):
+	""" A request whose client goes away during the upload stops counting
+		as in flight.
+	"""
+	make_routes()
+	server.start()
+	server.abort('/upload', {
+		'Content-Type' : 'application/octet-stream',
+		'Content-Length' : 1000
+	}, b'x' * 10)
+	assert collect.requests_in_flight.values == {('/upload', 'POST') : 0}
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,119 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import types
+import datetime
+
+import pytest
+from tornado.httputil import HTTPHeaders
+
+from quack import aspect
+from quack.aspects import model
+from quack.headers import parse_qualities, add_vary
+
+DATA = {'name' : 'x', 'values' : [1, 2.5, None, True],
+	'when' : datetime.datetime(2017, 1, 2, 3, 4, 5)}
+
+###############################################################################
+@pytest.fixture(params=['orjson', 'json'])
+def renderer(request, monkeypatch):
+	""" Returns a compact JSON renderer, with and without ``orjson``.
+	"""
+	if request.param == 'orjson':
+		if model.orjson is None:
+			pytest.skip('orjson is not installed.')
+	else:
+		monkeypatch.setattr(model, 'orjson', None)
+	return model.JSONRenderer(pretty=False)
+
+###############################################################################
+def test_compact_json(renderer):
+	""" Compact JSON has no spaces, and renders datetimes as strings, with or
+		without ``orjson``.
+	"""
+	rendered = renderer.render(DATA)
+	if isinstance(rendered, bytes):
+		rendered = rendered.decode('utf-8')
+	assert rendered == '{"name":"x","values":[1,2.5,null,true],' \
+		'"when":"2017-01-02 03:04:05"}'
+
+###############################################################################
+def test_non_finite_floats():
+	""" With ``orjson``, non-finite floats are rendered as null.
+	"""
+	if model.orjson is None:
+		pytest.skip('orjson is not installed.')
+	renderer = model.JSONRenderer(pretty=False)
+	assert renderer.render([float('nan'), float('inf')]) == b'[null,null]'
+
+###############################################################################
+def test_pretty_json():
+	""" Pretty JSON is indented, with sorted keys.
+	"""
+	renderer = model.JSONRenderer(pretty=True)
+	assert renderer.render({'b' : 1, 'a' : [2]}) == \
+		'{\n    "a": [\n        2\n    ],\n    "b": 1\n}'
+
+###############################################################################
+def test_unknown_types_are_rejected():
+	""" Values which are not JSON serializable are an error.
+	"""
+	with pytest.raises((TypeError, ValueError)):
+		model.JSONRenderer(pretty=False).render({'x' : object()})
+
+###############################################################################
+def test_negotiation():
+	""" The best renderer is chosen by media type and quality, falling back
+		to the default.
+	"""
+	registry = model.RendererRegistry()
+	json_renderer = registry.register(model.JSONRenderer(pretty=False))
+	binary = types.SimpleNamespace(content_type='application/x-binary')
+	registry.register(binary)
+
+	assert registry.negotiate(None) is json_renderer
+	assert registry.negotiate('application/x-binary') is binary
+	assert registry.negotiate('application/json;q=0.5, '
+		'application/x-binary') is binary
+	assert registry.negotiate('application/json, '
+		'application/x-binary;q=0.5') is json_renderer
+	assert registry.negotiate('application/*;q=0.2, '
+		'application/json;q=0.1') is binary
+	assert registry.negotiate('text/html') is json_renderer
+	assert registry.negotiate('application/x-binary;q=0') is json_renderer
+
+###############################################################################
+def test_renderer_outside_of_handlers():
+	""" The ``model_renderer`` aspect is the default renderer in functions
+		which are not request handler methods.
+	"""
+	###########################################################################
+	@aspect('model_renderer')
+	def func(model_renderer=None):
+		""" Receives the renderer.
+		"""
+		return model_renderer
+
+	assert func() is model.renderers.default
+
+###############################################################################
+def test_parse_qualities():
+	""" Values are lower-cased, with qualities defaulting to 1.
+	"""
+	assert parse_qualities('Text/HTML;level=1, gzip;q=0.5,, br;q=x') == [
+		('text/html', 1.0), ('gzip', 0.5), ('br', 0.0)
+	]
+
+###############################################################################
+def test_add_vary():
+	""" ``Vary`` values are merged into one header, without duplicates.
+	"""
+	headers = HTTPHeaders()
+	add_vary(headers, 'Accept')
+	headers.add('Vary', 'Origin')
+	add_vary(headers, 'accept')
+	add_vary(headers, 'Accept-Encoding')
+	assert headers.get_list('Vary') == ['Accept, Origin, Accept-Encoding']
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,227 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import tempfile
+
+import pytest
+
+from quack import aspect
+from quack.routes import route, Handler
+from quack.routes.multipart import MultipartParser, get_boundary
+
+BOUNDARY = b'----boundary1234'
+
+###############################################################################
+def make_body(parts, preamble=b'', epilogue=b''):
+	""" Encodes a ``multipart/form-data`` body from (name, filename, content)
+		tuples.
+	"""
+	body = preamble
+	for name, filename, content in parts:
+		body += b'--' + BOUNDARY + b'\r\n'
+		disposition = 'form-data; name="{}"'.format(name)
+		if filename is not None:
+			disposition += '; filename="{}"'.format(filename)
+		body += 'Content-Disposition: {}\r\n'.format(disposition).encode()
+		if filename is not None:
+			body += b'Content-Type: application/octet-stream\r\n'
+		body += b'\r\n' + content + b'\r\n'
+	return body + b'--' + BOUNDARY + b'--\r\n' + epilogue
+
+###############################################################################
+def parse(body, chunk_size=None, **kwargs):
+	""" Parses a body, fed to the parser in chunks of ``chunk_size`` bytes
+		(or all at once).
+	"""
+	parser = MultipartParser(BOUNDARY, **kwargs)
+	chunk_size = chunk_size or len(body) or 1
+	for start in range(0, len(body), chunk_size):
+		parser.feed(body[start:start + chunk_size])
+	return parser.close()
+
+###############################################################################
+def test_get_boundary():
+	""" The boundary is only taken from ``multipart/form-data`` types.
+	"""
+	assert get_boundary('multipart/form-data; boundary=abc') == b'abc'
+	assert get_boundary('Multipart/Form-Data; boundary="a b;c"') == b'a b;c'
+	assert get_boundary('multipart/form-data') is None
+	assert get_boundary('multipart/mixed; boundary=abc') is None
+	assert get_boundary('application/json') is None
+	assert get_boundary(None) is None
+
+###############################################################################
+def test_part_names():
+	""" Quoted and RFC 2231 encoded names and filenames are decoded.
+	"""
+	body = (b'--' + BOUNDARY + b'\r\n'
+		b'Content-Disposition: form-data; name="a \\"b\\""; '
+		b"filename*=UTF-8''r%C3%A9sum%C3%A9.txt\r\n\r\n"
+		b'x\r\n--' + BOUNDARY + b'--')
+	form = parse(body)
+	try:
+		assert form[0].name == 'a "b"'
+		assert form[0].filename == 'r\u00e9sum\u00e9.txt'
+	finally:
+		form.close()
+
+###############################################################################
+def test_fields_and_files():
+	""" Fields and file uploads are told apart.
+	"""
+	form = parse(make_body([
+		('title', None, b'hello'),
+		('upload', 'data.bin', b'\x00\x01\x02'),
+		('empty', None, b'')
+	]))
+	try:
+		assert form.fields == {'title' : 'hello', 'empty' : ''}
+		assert [part.name for part in form.files] == ['upload']
+		upload = form.get('upload')
+		assert upload.filename == 'data.bin'
+		assert upload.content_type == 'application/octet-stream'
+		assert upload.read() == b'\x00\x01\x02'
+		assert upload.size == 3
+		assert form.get('title').content_type == 'text/plain'
+		assert form.get('missing') is None
+	finally:
+		form.close()
+
+###############################################################################
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 17, 18, 19, 64])
+def test_chunk_boundaries(chunk_size):
+	""" The result does not depend on where the body is split into chunks,
+		including splits inside a delimiter.
+	"""
+	# Content which looks like the start of a delimiter, but is not one.
+	tricky = b'a\r\n--' + BOUNDARY[:-1] + b'X\r\n-' + b'\r\n'
+	body = make_body([('first', None, tricky), ('second', 'f', b'x' * 100)],
+		preamble=b'ignored preamble\r\n', epilogue=b'ignored epilogue')
+	form = parse(body, chunk_size)
+	try:
+		assert [part.name for part in form] == ['first', 'second']
+		assert form.get('first').read() == tricky
+		assert form.get('second').read() == b'x' * 100
+	finally:
+		form.close()
+
+###############################################################################
+@pytest.mark.parametrize('size', [0, 1, 1023, 1024, 1025, 10000])
+def test_spooling(size):
+	""" Parts are read back intact, whether they are kept in memory or
+		written to disk.
+	"""
+	content = bytes(range(256)) * (size // 256) + bytes(range(size % 256))
+	form = parse(make_body([('file', 'f', content)]), chunk_size=100,
+		spool_size=1024)
+	try:
+		part = form.get('file')
+		assert part.size == size
+		assert part.in_memory == (size <= 1024)
+		assert part.read() == content
+		view = part.view()
+		try:
+			assert view.readonly
+			assert bytes(view) == content
+		finally:
+			view.release()
+	finally:
+		form.close()
+
+###############################################################################
+@pytest.mark.parametrize('body', [
+	b'',
+	b'--' + BOUNDARY + b'\r\n',
+	b'--' + BOUNDARY + b'\r\nContent-Disposition: form-data; name="a"\r\n\r\n'
+		b'unterminated'
+])
+def test_incomplete_body(body):
+	""" Bodies which end before the closing delimiter are rejected.
+	"""
+	with pytest.raises(ValueError, match='Incomplete'):
+		parse(body)
+
+###############################################################################
+def test_malformed_bodies():
+	""" Invalid delimiters and parts are rejected.
+	"""
+	with pytest.raises(ValueError, match='boundary'):
+		parse(b'--' + BOUNDARY + b'XX\r\n')
+	with pytest.raises(ValueError, match='Invalid'):
+		parse(b'--' + BOUNDARY + b'\r\nContent-Type: text/plain\r\n\r\n'
+			b'x\r\n--' + BOUNDARY + b'--')
+
+###############################################################################
+def test_limits():
+	""" The number of parts and the size of their headers are limited.
+	"""
+	body = make_body([('field{}'.format(i), None, b'x') for i in range(3)])
+	with pytest.raises(ValueError, match='Too many parts'):
+		parse(body, max_parts=2)
+	with pytest.raises(ValueError, match='too large'):
+		parse(b'--' + BOUNDARY + b'\r\n' + b'X' * 100, max_header_size=50)
+
+###############################################################################
+def make_route():
+	""" Registers a route which receives uploads.
+	"""
+	###########################################################################
+	@route('/upload', stream_body=True, multipart_spool_size=100)
+	class Upload(Handler):				# pylint: disable=unused-variable
+		""" Receives uploads.
+		"""
+		#######################################################################
+		@aspect('payload')
+		async def _post(self, payload=None):
+			""" Returns the size of each part.
+			"""
+			_, form = payload
+			return {part.name : part.size for part in form}
+
+###############################################################################
+def test_upload(server):
+	""" Uploads are parsed as they arrive.
+	"""
+	make_route()
+	server.start()
+	response = server.fetch('/upload', method='POST',
+		body=make_body([('title', None, b'hello'), ('file', 'f', b'x' * 500)]),
+		headers={'Content-Type' : 'multipart/form-data; boundary={}'.format(
+			BOUNDARY.decode())})
+	assert response.code == 200
+	assert response.body == b'{"title":5,"file":500}'
+
+	response = server.fetch('/upload', method='POST', body=b'--nonsense',
+		headers={'Content-Type' : 'multipart/form-data; boundary={}'.format(
+			BOUNDARY.decode())})
+	assert response.code == 400
+
+###############################################################################
+def test_aborted_upload_closes_its_files(server, monkeypatch):
+	""" The temporary files of an upload are closed if the client goes away
+		before finishing it.
+	"""
+	files = []
+
+	###########################################################################
+	def temporary_file(*args, **kwargs):
+		""" Creates a temporary file, and keeps track of it.
+		"""
+		result = make_temporary_file(*args, **kwargs)
+		files.append(result)
+		return result
+
+	make_temporary_file = tempfile.TemporaryFile
+	monkeypatch.setattr(tempfile, 'TemporaryFile', temporary_file)
+	make_route()
+	server.start()
+	server.abort('/upload', {
+		'Content-Type' : 'multipart/form-data; boundary={}'.format(
+			BOUNDARY.decode()),
+		'Content-Length' : 10000
+	}, make_body([('file', 'f', b'x' * 500)])[:-20])
+	assert len(files) == 1
+	assert files[0].closed
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,132 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import json
+import types
+import importlib
+
+import pytest
+
+from quack import aspect, Http400BadRequest
+from quack.routes import route, Handler
+from quack.aspects.payload import Payload
+
+payload_module = importlib.import_module('quack.aspects.payload')
+
+###############################################################################
+def make_payload(body, content_type, files=None):
+	""" Returns the payload of a stand-in for a request.
+	"""
+	request = types.SimpleNamespace(body=body, files=files or {})
+	return Payload(request, content_type)
+
+###############################################################################
+@pytest.fixture
+def loads(monkeypatch):
+	""" Counts how often JSON bodies are parsed.
+	"""
+	calls = []
+	original = payload_module._loads		# pylint: disable=protected-access
+
+	###########################################################################
+	def counted(body):
+		""" Parses a body, counting the call.
+		"""
+		calls.append(body)
+		return original(body)
+
+	monkeypatch.setattr(payload_module, '_loads', counted)
+	return calls
+
+###############################################################################
+def test_json_is_parsed_once_on_first_use(loads):
+	""" The body is only parsed when the data is needed, and only once.
+	"""
+	payload = make_payload(b'{"a": [1, 2]}', 'application/json')
+	assert payload.content_type == 'application/json'
+	assert payload.raw == b'{"a": [1, 2]}'
+	assert bytes(payload.view[1:4]) == b'"a"'
+	assert not loads
+
+	content_type, data = payload
+	assert (content_type, data) == ('application/json', {'a' : [1, 2]})
+	assert payload[1] is payload.data
+	assert len(loads) == 1
+
+###############################################################################
+def test_tuple_compatibility():
+	""" Payloads compare, index and unpack like (content_type, data).
+	"""
+	payload = make_payload(b'abc', 'application/octet-stream')
+	assert payload == ('application/octet-stream', b'abc')
+	assert payload == make_payload(b'abc', 'application/octet-stream')
+	assert len(payload) == 2
+	assert payload[-1] == b'abc'
+	assert list(payload) == ['application/octet-stream', b'abc']
+	with pytest.raises(TypeError):
+		hash(payload)
+
+###############################################################################
+@pytest.mark.parametrize('body, content_type, expected', [
+	(b'[1]', 'text/plain', ('application/json', [1])),
+	(b'hello', 'text/plain; charset=utf-8',
+		('text/plain; charset=utf-8', b'hello')),
+	(b'\xff\xfe', 'text/plain', ('text/plain', b'\xff\xfe')),
+	(b'RIFF', 'audio/wav; rate=16000', ('audio/wav', b'RIFF'))
+])
+def test_content_types(body, content_type, expected):
+	""" Other content types are treated as JSON if they can be, and media
+		bodies are passed through.
+	"""
+	assert tuple(make_payload(body, content_type)) == expected
+
+###############################################################################
+def test_strict_json():
+	""" Bodies declared to be JSON must be valid.
+	"""
+	payload = make_payload(b'{', 'application/json')
+	assert payload.content_type == 'application/json'
+	with pytest.raises(Http400BadRequest) as info:
+		payload.data					# pylint: disable=pointless-statement
+	assert isinstance(info.value.__cause__, ValueError)
+
+###############################################################################
+def test_file_uploads():
+	""" Multipart bodies are a single (filename, body) file.
+	"""
+	files = {'file' : [{'filename' : 'a.txt', 'body' : b'abc'}]}
+	payload = make_payload(b'', 'multipart/form-data; boundary=x', files)
+	assert payload.data == ('a.txt', b'abc')
+	with pytest.raises(Http400BadRequest):
+		make_payload(b'', 'multipart/form-data; boundary=x').data
+
+###############################################################################
+def test_payload_aspect(server):
+	""" Handlers receive the payload, and invalid JSON is a 400.
+	"""
+	###########################################################################
+	@route('/echo')
+	class Echo(Handler):				# pylint: disable=unused-variable
+		""" Echoes the payload.
+		"""
+		#######################################################################
+		@aspect('payload')
+		async def _post(self, payload=None):
+			""" Returns the payload.
+			"""
+			content_type, data = payload
+			return {'content_type' : content_type, 'data' : data}
+
+	server.start()
+	response = server.fetch('/echo', method='POST', body=b'{"x": 1}',
+		headers={'Content-Type' : 'application/json'})
+	assert json.loads(response.body) == {
+		'content_type' : 'application/json', 'data' : {'x' : 1}
+	}
+
+	response = server.fetch('/echo', method='POST', body=b'{',
+		headers={'Content-Type' : 'application/json'})
+	assert response.code == 400
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
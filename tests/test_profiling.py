@@ -0,0 +1,65 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import types
+
+import pytest
+from tornado.httputil import HTTPHeaders
+
+from quack.profiling import Profiler
+
+###############################################################################
+def make_request(remote_ip, authorization=None):
+	""" Returns a stand-in for a request.
+	"""
+	headers = HTTPHeaders()
+	if authorization is not None:
+		headers['Authorization'] = authorization
+	return types.SimpleNamespace(remote_ip=remote_ip, headers=headers)
+
+###############################################################################
+@pytest.fixture
+def directory(tmp_path):
+	""" Returns a directory to store profiles in.
+	"""
+	return str(tmp_path)
+
+###############################################################################
+def test_profiles_are_private_by_default(directory):
+	""" Without a token or ``allow_local``, no client may see the profiles,
+		not even a local one.
+	"""
+	profiler = Profiler(directory)
+	assert not profiler.allows(make_request('127.0.0.1'))
+	assert not profiler.allows(make_request('::1'))
+
+###############################################################################
+def test_token(directory):
+	""" Clients which send the token are allowed, wherever they are.
+	"""
+	profiler = Profiler(directory, token='s3cret')
+	assert profiler.allows(make_request('203.0.113.1', 'Bearer s3cret'))
+	assert profiler.allows(make_request('203.0.113.1', 'bearer s3cret'))
+	assert not profiler.allows(make_request('203.0.113.1', 'Bearer wrong'))
+	assert not profiler.allows(make_request('203.0.113.1', 's3cret'))
+	assert not profiler.allows(make_request('127.0.0.1'))
+
+###############################################################################
+@pytest.mark.parametrize('remote_ip, allowed', [
+	('127.0.0.1', True),
+	('127.0.0.2', True),
+	('::1', True),
+	('::ffff:127.0.0.1', True),
+	('10.0.0.1', False),
+	('::ffff:10.0.0.1', False),
+	('not an address', False)
+])
+def test_allow_local(directory, remote_ip, allowed):
+	""" With ``allow_local``, clients on loopback addresses are allowed,
+		including IPv4 addresses mapped to IPv6.
+	"""
+	profiler = Profiler(directory, allow_local=True)
+	assert profiler.allows(make_request(remote_ip)) == allowed
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,158 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import base64
+
+import pytest
+
+from quack import aspect
+from quack.aspects.basic_auth import PBKDF2CredentialStore
+from quack.ratelimit import RateLimiter
+from quack.routes import route, Handler
+
+###############################################################################
+class Clock:						# pylint: disable=too-few-public-methods
+	""" A clock which only moves when told to.
+	"""
+
+	###########################################################################
+	def __init__(self):
+		""" Creates a new clock.
+		"""
+		super().__init__()
+		self.now = 0.0
+
+	###########################################################################
+	def __call__(self):
+		""" Returns the current time.
+		"""
+		return self.now
+
+###############################################################################
+def make_route(limiter):
+	""" Registers a route with a rate limit.
+	"""
+	###########################################################################
+	@route('/limited', rate_limit=limiter)
+	class Limited(Handler):				# pylint: disable=unused-variable
+		""" A rate limited route.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Responds.
+			"""
+			return {'result' : 'success'}
+
+###############################################################################
+def auth(username, password='password'):
+	""" Returns basic authentication headers.
+	"""
+	credentials = '{}:{}'.format(username, password).encode('utf-8')
+	return {'Authorization' : 'Basic {}'.format(
+		base64.b64encode(credentials).decode('ascii'))}
+
+###############################################################################
+def test_token_bucket():
+	""" A client may use its burst at once, and then gets tokens back at the
+		limit's rate.
+	"""
+	clock = Clock()
+	limiter = RateLimiter(2, period=1.0, burst=3, clock=clock)
+	assert [limiter.consume('a')[0] for _ in range(4)] == \
+		[True, True, True, False]
+	assert limiter.consume('b')[0]
+	clock.now = 0.5
+	assert limiter.consume('a') == (True, 0.0)
+	assert not limiter.consume('a')[0]
+
+###############################################################################
+def test_unknown_key_is_rejected():
+	""" Only the built-in keys can be named.
+	"""
+	with pytest.raises(ValueError, match='Unknown rate limit key'):
+		RateLimiter(1, key='user_agent')
+
+###############################################################################
+def test_requests_over_the_limit_get_a_429(server):
+	""" Requests over the limit are rejected, with the rate limit headers.
+	"""
+	clock = Clock()
+	make_route(RateLimiter(2, period=10, clock=clock))
+	server.start()
+
+	response = server.fetch('/limited')
+	assert response.code == 200
+	assert response.headers['RateLimit-Limit'] == '2'
+	assert response.headers['RateLimit-Remaining'] == '1'
+	assert response.headers['RateLimit-Reset'] == '5'
+	assert server.fetch('/limited').code == 200
+
+	response = server.fetch('/limited')
+	assert response.code == 429
+	assert response.headers['Retry-After'] == '5'
+	assert response.headers['RateLimit-Remaining'] == '0'
+
+	clock.now = 5
+	assert server.fetch('/limited').code == 200
+
+###############################################################################
+def test_ip_key_ignores_claimed_usernames(server):
+	""" By default, clients are told apart by address, so that claiming a
+		different username neither escapes the limit nor uses up the budget
+		of that user.
+	"""
+	limiter = RateLimiter(1, period=60)
+	make_route(limiter)
+	server.start()
+	assert server.fetch('/limited', headers=auth('mallory')).code == 200
+	assert server.fetch('/limited', headers=auth('alice')).code == 429
+	assert len(limiter.buckets) == 1
+	assert ('ip', '127.0.0.1') in limiter.buckets
+
+###############################################################################
+def test_user_key_only_trusts_verified_users(server):
+	""" With the 'user' key, verified users get their own budgets, and
+		requests whose credentials fail verification are keyed by address,
+		so that they can neither escape the limit nor use up the budget of
+		the user they claim to be.
+	"""
+	store = PBKDF2CredentialStore({
+		'alice' : PBKDF2CredentialStore.hash_password('secret', 1000)
+	})
+	make_route(RateLimiter(1, period=60, key='user'))
+	server.start()
+	with aspect.context('credential_store', lambda: store):
+		assert server.fetch('/limited', headers=auth('alice')).code == 200
+		assert server.fetch('/limited', headers=auth('alice')).code == 429
+		assert server.fetch('/limited', headers=auth('bob')).code == 429
+		assert server.fetch('/limited').code == 429
+		assert server.fetch('/limited',
+			headers=auth('alice', 'secret')).code == 200
+		assert server.fetch('/limited',
+			headers=auth('alice', 'secret')).code == 429
+
+###############################################################################
+def test_custom_key(server):
+	""" Custom keys may be coroutine functions which use aspects.
+	"""
+	###########################################################################
+	@aspect('basic_auth_headers')
+	async def tenant_key(self, basic_auth_headers=None):
+		""" Keys requests by a header which a proxy is trusted to set, and
+			by whether they claim to be authenticated.
+		"""
+		return (self.request.headers.get('X-Tenant'),
+			basic_auth_headers is not None)
+
+	make_route(RateLimiter(1, period=60, key=tenant_key))
+	server.start()
+	first = {'X-Tenant' : 'first'}
+	second = {'X-Tenant' : 'second'}
+	assert server.fetch('/limited', headers=first).code == 200
+	assert server.fetch('/limited', headers=first).code == 429
+	assert server.fetch('/limited', headers=second).code == 200
+	second.update(auth('alice'))
+	assert server.fetch('/limited', headers=second).code == 200
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
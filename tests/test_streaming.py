@@ -0,0 +1,134 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import pytest
+
+from quack import Http400BadRequest
+from quack.routes import route, Handler
+from quack.routes.streaming import get_stream_format, SSEFormat
+
+###############################################################################
+async def count(limit, fail_at=None):
+	""" Yields the numbers up to ``limit``, failing at ``fail_at``.
+	"""
+	for value in range(limit):
+		if value == fail_at:
+			raise Http400BadRequest({'result' : 'failure', 'at' : value})
+		yield {'value' : value}
+
+###############################################################################
+@pytest.fixture
+def streams(server):
+	""" Serves routes which stream their results.
+	"""
+	###########################################################################
+	@route('/negotiated')
+	class Negotiated(Handler):			# pylint: disable=unused-variable
+		""" Streams in whichever format the client accepts.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Returns an asynchronous iterator.
+			"""
+			return count(3)
+
+	###########################################################################
+	@route('/generator', stream_format='ndjson')
+	class Generator(Handler):			# pylint: disable=unused-variable
+		""" Streams a regular generator as newline-delimited JSON.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Returns a generator.
+			"""
+			return ([value] for value in range(2))
+
+	###########################################################################
+	@route('/empty')
+	class Empty(Handler):				# pylint: disable=unused-variable
+		""" Streams nothing.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Returns an empty iterator.
+			"""
+			return count(0)
+
+	###########################################################################
+	@route('/failing', stream_format='sse')
+	class Failing(Handler):				# pylint: disable=unused-variable
+		""" Fails after some items have been sent.
+		"""
+		#######################################################################
+		async def _get(self):
+			""" Returns an iterator which fails on its second item.
+			"""
+			return count(3, fail_at=int(self.get_argument('at')))
+
+	server.start()
+	return server
+
+###############################################################################
+@pytest.mark.parametrize('accept, content_type, body', [
+	(None, 'application/json',
+		b'[{"value":0},{"value":1},{"value":2}]'),
+	('application/x-ndjson', 'application/x-ndjson',
+		b'{"value":0}\n{"value":1}\n{"value":2}\n'),
+	('text/event-stream', 'text/event-stream',
+		b'data: {"value":0}\n\ndata: {"value":1}\n\ndata: {"value":2}\n\n')
+])
+def test_negotiated_format(streams, accept, content_type, body):
+	""" Without a ``stream_format``, the format follows the ``Accept``
+		header, and responses vary by it.
+	"""
+	headers = {} if accept is None else {'Accept' : accept}
+	response = streams.fetch('/negotiated', headers=headers)
+	assert response.code == 200
+	assert response.headers['Content-Type'] == content_type
+	assert response.headers['Vary'] == 'Accept'
+	assert response.body == body
+
+###############################################################################
+def test_fixed_format(streams):
+	""" A route's ``stream_format`` applies whatever the client accepts, and
+		regular generators are streamed too.
+	"""
+	response = streams.fetch('/generator',
+		headers={'Accept' : 'text/event-stream'})
+	assert response.headers['Content-Type'] == 'application/x-ndjson'
+	assert 'Vary' not in response.headers
+	assert response.body == b'[0]\n[1]\n'
+
+###############################################################################
+def test_empty_stream(streams):
+	""" An empty stream is still a complete document.
+	"""
+	assert streams.fetch('/empty').body == b'[]'
+
+###############################################################################
+def test_failures(streams):
+	""" Errors before the first item are normal error responses; later ones
+		are reported in the stream.
+	"""
+	response = streams.fetch('/failing?at=0')
+	assert response.code == 400
+	assert response.headers['Content-Type'].startswith('application/json')
+
+	response = streams.fetch('/failing?at=1')
+	assert response.code == 200
+	assert response.body == b'data: {"value":0}\n\n' \
+		b'event: error\ndata: {"result":"failure","at":1}\n\n'
+
+###############################################################################
+def test_get_stream_format():
+	""" Formats are looked up by name, or used as they are.
+	"""
+	sse = SSEFormat()
+	assert get_stream_format(sse, None) is sse
+	assert get_stream_format('ndjson', 'text/event-stream').content_type == \
+		'application/x-ndjson'
+	with pytest.raises(ValueError):
+		get_stream_format('xml', None)
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF
@@ -0,0 +1,55 @@
+"""
+Copyright 2017 Deepgram
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+from quack.workers import resolve_worker_count
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Forks two workers, the first of which crashes once. Each worker records its
+# index and the number of times it has run.
+SUPERVISED = '''
+import os, sys
+from quack.workers import fork_workers, worker_id
+directory = sys.argv[1]
+index = fork_workers(2, min_uptime=0)
+path = os.path.join(directory, str(index))
+with open(path, 'a', encoding='utf-8') as fh:
+	fh.write('{}\\n'.format(worker_id()))
+with open(path, encoding='utf-8') as fh:
+	runs = len(fh.readlines())
+sys.exit(1 if index == 0 and runs == 1 else 0)
+'''
+
+###############################################################################
+def test_resolve_worker_count():
+	""" ``auto`` is one worker per CPU; anything else must be a positive
+		integer.
+	"""
+	assert resolve_worker_count('auto') == (os.cpu_count() or 1)
+	assert resolve_worker_count(3) == 3
+	for workers in (-1, 1.5, 'many'):
+		with pytest.raises(ValueError):
+			resolve_worker_count(workers)
+
+###############################################################################
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Requires fork().')
+def test_crashed_workers_are_restarted(tmp_path):
+	""" A worker which crashes is restarted with the same index, and the
+		supervisor exits once every worker has exited cleanly.
+	"""
+	process = subprocess.run([sys.executable, '-c', SUPERVISED,
+		str(tmp_path)], cwd=ROOT, timeout=30, check=False,
+		env=dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+			ROOT, os.environ.get('PYTHONPATH')]))))
+	assert process.returncode == 0
+	assert (tmp_path / '0').read_text(encoding='utf-8') == '0\n0\n'
+	assert (tmp_path / '1').read_text(encoding='utf-8') == '1\n'
+
+### EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF.EOF